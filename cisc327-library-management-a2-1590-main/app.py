@@ -6,8 +6,54 @@ Routes are organized in separate blueprint modules in the routes package.
 """
 
 from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+import instrumentation
 from database import init_database, add_sample_data
+from models import Record
 from routes import register_blueprints
+from services import fee_sweeper
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; responses fall back to the standard json module
+    orjson = None
+
+
+class LibraryJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that serializes Book/Loan records as plain objects.
+
+    Compact responses are encoded with orjson when it is installed. Dates and
+    anything else orjson does not handle natively go through default(). Bodies
+    orjson cannot encode (integers beyond 64 bits) fall back to the standard
+    encoder, and so, while ensure_ascii is on (Flask's default), do bodies with
+    non-ASCII text, which orjson cannot escape. Other output matches the
+    standard encoder byte for byte except for floats: orjson writes 1e16 for
+    json's 1e+16, and null for NaN and Infinity.
+    """
+
+    @staticmethod
+    def default(o):
+        if isinstance(o, Record):
+            return o._asdict()
+        return DefaultJSONProvider.default(o)
+
+    def response(self, *args, **kwargs):
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        obj = args[0] if len(args) == 1 else (args or kwargs or None)
+        options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_APPEND_NEWLINE
+        if self.sort_keys:
+            options |= orjson.OPT_SORT_KEYS
+        try:
+            body = orjson.dumps(obj, default=self.default, option=options)
+        except orjson.JSONEncodeError:
+            return super().response(obj)
+        if self.ensure_ascii and not body.isascii():
+            return super().response(obj)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 
 def create_app():
@@ -19,6 +65,7 @@ def create_app():
     """
     app = Flask(__name__)
     app.secret_key = "super secret key"
+    app.json = LibraryJSONProvider(app)
     
     # Initialize the database
     init_database()
@@ -29,9 +76,14 @@ def create_app():
     # Register all route blueprints
     register_blueprints(app)
     
+    # Per-request SQL counts, Server-Timing, /metrics and sampled profiling
+    instrumentation.init_app(app)
+    
     return app
 
 
 if __name__ == '__main__':
     app = create_app()
+    # Keep materialized late fees current and expire unclaimed holds in the background
+    fee_sweeper.start_scheduler()
     app.run(debug=True, host='0.0.0.0', port=5000)
@@ -0,0 +1,4 @@
+"""
+Benchmarks for the Library Management System
+Standalone scripts measuring hot paths; run with `python -m benchmarks.<name>`
+"""
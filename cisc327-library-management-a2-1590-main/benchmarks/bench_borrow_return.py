@@ -0,0 +1,95 @@
+"""
+Borrow/return throughput: per-helper commits vs. one unit-of-work transaction
+
+Usage:
+    python -m benchmarks.bench_borrow_return [--books N] [--rounds N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import (
+    init_database, get_book_by_id, get_patron_borrow_count, insert_borrow_record,
+    update_book_availability, update_borrow_record_return_date, get_patron_borrowed_books,
+    borrow_book_atomic, return_book_atomic, close_pools
+)
+
+
+def _seed(books: int) -> None:
+    with database.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+            [(f'Book {i}', f'Author {i}', f'{i:013d}', 1, 1) for i in range(1, books + 1)]
+        )
+
+
+def _legacy_borrow(patron_id, book_id, borrow_date, due_date):
+    book = get_book_by_id(book_id)
+    if book['available_copies'] <= 0 or get_patron_borrow_count(patron_id) > 5:
+        return False
+    insert_borrow_record(patron_id, book_id, borrow_date, due_date)
+    update_book_availability(book_id, -1)
+    return True
+
+
+def _legacy_return(patron_id, book_id, return_date):
+    get_book_by_id(book_id)
+    get_patron_borrowed_books(patron_id)
+    get_patron_borrowed_books(patron_id)
+    update_borrow_record_return_date(patron_id, book_id, return_date)
+    update_book_availability(book_id, +1)
+    return True
+
+
+def _atomic_borrow(patron_id, book_id, borrow_date, due_date):
+    return borrow_book_atomic(patron_id, book_id, borrow_date, due_date, 5)[0] == 'ok'
+
+
+def _atomic_return(patron_id, book_id, return_date):
+    return return_book_atomic(patron_id, book_id, return_date)[0] == 'ok'
+
+
+def run(borrow, give_back, books: int, rounds: int) -> float:
+    """Borrow and return every book `rounds` times; returns operations per second."""
+    now = datetime.now()
+    due = now + timedelta(days=14)
+    ops = 0
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for book_id in range(1, books + 1):
+            patron_id = f'{book_id % 1000:06d}'
+            borrow(patron_id, book_id, now, due)
+            give_back(patron_id, book_id, now)
+            ops += 2
+    return ops / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    results = {}
+    saved = database.DATABASE
+    for name, borrow, give_back in (('per-helper', _legacy_borrow, _legacy_return),
+                                    ('unit-of-work', _atomic_borrow, _atomic_return)):
+        with tempfile.TemporaryDirectory() as tmp:
+            database.DATABASE = os.path.join(tmp, 'bench.db')
+            init_database()
+            _seed(args.books)
+            results[name] = run(borrow, give_back, args.books, args.rounds)
+            close_pools()
+        print(f'{name:>13}: {results[name]:10.1f} ops/s')
+    database.DATABASE = saved
+
+    print(f'      speedup: {results["unit-of-work"] / results["per-helper"]:10.2f}x')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Bulk late-fee throughput in loans per second: scalar rule vs. the bulk fee engine
+
+Usage:
+    python -m benchmarks.bench_fee_engine [--loans N] [--batch N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import date, timedelta
+
+import database
+from database import init_database, iter_open_loans, close_pools
+from services import fee_engine
+from services.library_service import late_fee_for_due_date
+
+
+def seed(loans: int, batch: int = 50000) -> None:
+    rng = random.Random(327)
+    today = date.today()
+    with database.transaction() as conn:
+        conn.execute('INSERT INTO books (title, author, isbn, total_copies, available_copies) '
+                     "VALUES ('Book', 'Author', '0000000000001', ?, 0)", (loans,))
+    for start in range(0, loans, batch):
+        rows = []
+        for i in range(start, min(start + batch, loans)):
+            due = today - timedelta(days=rng.randint(-14, 60))
+            rows.append((f'{i % 999999:06d}', 1, (due - timedelta(days=14)).isoformat(), due.isoformat()))
+        with database.transaction() as conn:
+            conn.executemany('INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) '
+                             'VALUES (?, ?, ?, ?)', rows)
+
+
+def scalar_total(batch: int) -> float:
+    today = date.today()
+    total = 0.0
+    for rows in iter_open_loans(batch):
+        for row in rows:
+            total += late_fee_for_due_date(row['due_date'], today)['fee_amount']
+    return round(total, 2)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--loans', type=int, default=1_000_000)
+    parser.add_argument('--batch', type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    engines = [('scalar', lambda: scalar_total(args.batch)),
+               ('engine', lambda: fee_engine.summarize_late_fees(batch_size=args.batch)['total_fees'])]
+
+    saved = database.DATABASE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        init_database()
+        seed(args.loans)
+        totals = set()
+        for name, run in engines:
+            start = time.perf_counter()
+            totals.add(run())
+            elapsed = time.perf_counter() - start
+            print(f'{name:>7}: {args.loans / elapsed:12.0f} loans/s')
+        assert len(totals) == 1, totals
+        close_pools()
+    database.DATABASE = saved
+
+
+if __name__ == '__main__':
+    main()
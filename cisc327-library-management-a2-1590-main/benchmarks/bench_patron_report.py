@@ -0,0 +1,91 @@
+"""
+Patron status report latency: per-loan fee lookups (N+1) vs. the batched report
+
+Usage:
+    python -m benchmarks.bench_patron_report [--history N] [--active N] [--repeat N]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import database
+from database import init_database, get_patron_borrowed_books, db_connection, close_pools
+from services.library_service import calculate_late_fee_for_book, get_patron_status_report
+
+PATRON = '123456'
+
+
+def seed(history: int, active: int) -> None:
+    now = datetime.now()
+    with database.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+            [(f'Book {i}', 'Author', f'{i:013d}', 1, 1) for i in range(1, active + 2)]
+        )
+        conn.executemany(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) '
+            'VALUES (?, ?, ?, ?, ?)',
+            [(PATRON, active + 1, (now - timedelta(days=400 + i)).isoformat(),
+              (now - timedelta(days=386 + i)).isoformat(), (now - timedelta(days=380)).isoformat())
+             for i in range(history)]
+        )
+        conn.executemany(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            [(PATRON, i, (now - timedelta(days=10 + i)).isoformat(), (now + timedelta(days=4 - i)).isoformat())
+             for i in range(1, active + 1)]
+        )
+
+
+def legacy_report(patron_id: str):
+    """The report as it was before batching: one fee lookup per active loan."""
+    active = get_patron_borrowed_books(patron_id) or []
+    items, total_fees = [], 0.0
+    for rec in active:
+        fee_info = calculate_late_fee_for_book(patron_id, rec['book_id'])
+        fee = float(fee_info.get('fee_amount', 0.0)) if fee_info.get('status') == 'ok' else 0.0
+        total_fees += fee
+        items.append({'book_id': rec['book_id'], 'due_date': rec['due_date'].isoformat(),
+                      'late_fee_accrued': round(fee, 2)})
+    with db_connection() as conn:
+        history = conn.execute('SELECT COUNT(*) AS c FROM borrow_records WHERE patron_id = ?',
+                               (patron_id,)).fetchone()['c']
+    return {'patron_id': patron_id, 'currently_borrowed': items, 'total_late_fees_owed': round(total_fees, 2),
+            'number_currently_borrowed': len(active), 'borrowing_history_count': history}
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn(PATRON)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--history', type=int, default=100_000)
+    parser.add_argument('--active', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    saved = database.DATABASE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        init_database()
+        seed(args.history, args.active)
+        assert legacy_report(PATRON) == get_patron_status_report(PATRON)
+
+        legacy = timed(legacy_report, args.repeat)
+        batched = timed(get_patron_status_report, args.repeat)
+        print(f'patron with {args.active} active loans, {args.history} historical loans')
+        print(f'   per-loan: {legacy:9.2f} ms/report')
+        print(f'    batched: {batched:9.2f} ms/report')
+        print(f'    speedup: {legacy / batched:9.2f}x')
+        close_pools()
+    database.DATABASE = saved
+
+
+if __name__ == '__main__':
+    main()
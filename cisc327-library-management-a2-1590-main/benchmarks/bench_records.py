@@ -0,0 +1,110 @@
+"""
+Row materialization on large result sets: dict per row vs. slotted Book/Loan records
+
+Usage:
+    python -m benchmarks.bench_records [--rows N] [--repeat N]
+"""
+
+import argparse
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import database
+from database import init_database, read_connection, get_all_books, get_patron_borrowed_books, close_pools
+
+
+def _seed(rows: int) -> None:
+    now = datetime.now()
+    with database.transaction() as conn:
+        conn.executemany(
+            'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+            [(f'Book {i}', f'Author {i % 997}', f'{i:013d}', 1, 1) for i in range(1, rows + 1)]
+        )
+        conn.executemany(
+            'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) VALUES (?, ?, ?, ?)',
+            [('123456', i, (now - timedelta(days=i % 30)).isoformat(),
+              (now + timedelta(days=14 - i % 30)).isoformat()) for i in range(1, rows + 1)]
+        )
+
+
+def _dict_books():
+    # get_all_books before records: one dict per row
+    with read_connection() as conn:
+        books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
+    return [dict(book) for book in books]
+
+
+def _dict_loans(patron_id='123456'):
+    # get_patron_borrowed_books before records: eager parsing, datetime.now() per row
+    with read_connection() as conn:
+        records = conn.execute('''
+            SELECT br.*, b.title, b.author FROM borrow_records br JOIN books b ON br.book_id = b.id
+            WHERE br.patron_id = ? AND br.return_date IS NULL ORDER BY br.borrow_date
+        ''', (patron_id,)).fetchall()
+    return [{
+        'book_id': record['book_id'],
+        'title': record['title'],
+        'author': record['author'],
+        'borrow_date': datetime.fromisoformat(record['borrow_date']),
+        'due_date': datetime.fromisoformat(record['due_date']),
+        'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
+    } for record in records]
+
+
+def _record_loans():
+    return get_patron_borrowed_books('123456')
+
+
+def measure(fn, repeat: int):
+    """Return (best wall time in ms, peak bytes allocated while building the result)."""
+    best = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+        del result
+    gc.collect()
+    tracemalloc.start()
+    result = fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return best * 1000, peak
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    cases = (('books  dict', _dict_books), ('books  Book', get_all_books),
+             ('loans  dict', _dict_loans), ('loans  Loan', _record_loans))
+    results = {}
+    saved = database.DATABASE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        try:
+            init_database()
+            _seed(args.rows)
+            for name, fn in cases:
+                results[name] = measure(fn, args.repeat)
+                ms, peak = results[name]
+                print(f'{name}: {ms:9.1f} ms  peak {peak / 1024 / 1024:8.1f} MiB')
+        finally:
+            close_pools()
+            database.DATABASE = saved
+
+    for kind, legacy, record in (('books', 'books  dict', 'books  Book'), ('loans', 'loans  dict', 'loans  Loan')):
+        print(f'{kind}: {results[legacy][0] / results[record][0]:5.2f}x faster, '
+              f'{results[legacy][1] / results[record][1]:5.2f}x less memory')
+    return results
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""
+Catalog search latency: in-Python filter over get_all_books() vs. the SQL search backend
+
+Usage:
+    python -m benchmarks.bench_search [--books N] [--repeat N]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+
+import database
+from database import init_database, get_all_books, close_pools
+from services.library_service import search_books_in_catalog
+
+WORDS = ['great', 'code', 'river', 'night', 'garden', 'shadow', 'empire', 'silent',
+         'winter', 'stone', 'glass', 'harbor', 'letters', 'machine', 'forest', 'crown']
+QUERIES = [('title', 'shadow'), ('title', 'er ga'), ('title', 'zzz'),
+           ('author', 'smith'), ('author', 'xq'), ('isbn', '0000000500000')]
+
+
+def seed(books: int, batch: int = 50000) -> None:
+    """Insert `books` synthetic rows (FTS triggers fire as they would in production)."""
+    rng = random.Random(327)
+    surnames = ['Smith', 'Lee', 'Garcia', 'Chan', 'Okafor', 'Novak', 'Haddad', 'Kim']
+    for start in range(0, books, batch):
+        rows = []
+        for i in range(start, min(start + batch, books)):
+            title = ' '.join(rng.choice(WORDS) for _ in range(3)).title() + f' {i}'
+            author = f'{rng.choice(surnames)} {rng.choice(WORDS).title()}'
+            rows.append((title, author, f'{i:013d}', 1, 1))
+        with database.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+
+def legacy_search(term: str, field: str):
+    books = get_all_books()
+    if field == 'isbn':
+        return [b for b in books if b.get('isbn') == term]
+    q = term.lower().strip()
+    return [b for b in books if q in (b.get(field) or '').lower()]
+
+
+def timed(fn, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=1_000_000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    saved = database.DATABASE
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        init_database()
+        start = time.perf_counter()
+        seed(args.books)
+        print(f'seeded {args.books} books in {time.perf_counter() - start:.1f}s')
+
+        print(f'{"query":>22} {"legacy ms":>12} {"sql ms":>10} {"hits":>8}')
+        for field, term in QUERIES:
+            hits = len(search_books_in_catalog(term, field))
+            legacy = timed(lambda: legacy_search(term, field), max(1, args.repeat // 3))
+            sql = timed(lambda: search_books_in_catalog(term, field), args.repeat)
+            print(f'{field + ":" + term:>22} {legacy:12.2f} {sql:10.2f} {hits:8d}')
+        close_pools()
+    database.DATABASE = saved
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""
+Synthetic data generator for the benchmarks: N books, M loans over P patrons
+
+Usage:
+    python -m benchmarks.datagen [--books N] [--loans M] [--patrons P] [--db PATH]
+"""
+
+import argparse
+import random
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+import database
+from database import init_database, rebuild_patron_counters
+
+WORDS = ['great', 'code', 'river', 'night', 'garden', 'shadow', 'empire', 'silent',
+         'winter', 'stone', 'glass', 'harbor', 'letters', 'machine', 'forest', 'crown']
+SURNAMES = ['Smith', 'Lee', 'Garcia', 'Chan', 'Okafor', 'Novak', 'Haddad', 'Kim']
+
+
+def patron_ids(patrons: int) -> List[str]:
+    """The 6-digit patron IDs the generator assigns loans to."""
+    return [f'{100000 + i:06d}' for i in range(patrons)]
+
+
+def generate(books: int, loans: int, patrons: int = 1000, overdue_fraction: float = 0.2,
+             returned_fraction: float = 0.5, seed: int = 327, batch: int = 50000) -> Dict:
+    """
+    Seed the current DATABASE (already initialised) with synthetic books and loans.
+
+    Each book has 1-5 copies. Loans are spread over `patrons` patrons. Open
+    loans never exceed a book's copies, and available_copies is set to match.
+    About `overdue_fraction` of open loans are past due, and `returned_fraction`
+    of all loans are already closed.
+
+    Returns:
+        dict: counts of books, loans, open loans and overdue loans, plus the patron IDs
+    """
+    rng = random.Random(seed)
+    copies = [rng.randint(1, 5) for _ in range(books)]
+    for start in range(0, books, batch):
+        rows = []
+        for i in range(start, min(start + batch, books)):
+            title = ' '.join(rng.choice(WORDS) for _ in range(3)).title() + f' {i}'
+            author = f'{rng.choice(SURNAMES)} {rng.choice(WORDS).title()}'
+            rows.append((title, author, f'{i + 1:013d}', copies[i], copies[i]))
+        with database.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO books (title, author, isbn, total_copies, available_copies) VALUES (?, ?, ?, ?, ?)',
+                rows
+            )
+
+    ids = patron_ids(patrons)
+    now = datetime.now()
+    on_loan = [0] * books
+    open_loans = overdue = 0
+    rows = []
+
+    def flush():
+        with database.transaction() as conn:
+            conn.executemany(
+                'INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date, return_date) '
+                'VALUES (?, ?, ?, ?, ?)', rows
+            )
+        rows.clear()
+
+    for _ in range(loans):
+        book = rng.randrange(books) if books else 0
+        returned = rng.random() < returned_fraction or on_loan[book] >= copies[book]
+        late = rng.random() < overdue_fraction
+        borrowed = now - timedelta(days=rng.randint(15, 45) if late else rng.randint(0, 13))
+        due = borrowed + timedelta(days=14)
+        return_date = (borrowed + timedelta(days=rng.randint(1, 14))).isoformat() if returned else None
+        if not returned:
+            on_loan[book] += 1
+            open_loans += 1
+            overdue += due < now
+        rows.append((rng.choice(ids), book + 1, borrowed.isoformat(), due.isoformat(), return_date))
+        if len(rows) >= batch:
+            flush()
+    if rows:
+        flush()
+
+    with database.transaction() as conn:
+        conn.executemany('UPDATE books SET available_copies = total_copies - ? WHERE id = ?',
+                         [(n, i + 1) for i, n in enumerate(on_loan) if n])
+        rebuild_patron_counters(conn)
+    database._invalidate_book()
+
+    return {'books': books, 'loans': loans, 'open_loans': open_loans, 'overdue_loans': overdue,
+            'patrons': ids}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=10000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--patrons', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=327)
+    parser.add_argument('--db', default=database.DATABASE)
+    args = parser.parse_args(argv)
+
+    saved = database.DATABASE
+    database.DATABASE = args.db
+    try:
+        init_database()
+        summary = generate(args.books, args.loans, args.patrons, seed=args.seed)
+    finally:
+        database.close_pools()
+        database.DATABASE = saved
+    print(f"{args.db}: {summary['books']} books, {summary['loans']} loans "
+          f"({summary['open_loans']} open, {summary['overdue_loans']} overdue)")
+    return summary
+
+
+if __name__ == '__main__':
+    main()
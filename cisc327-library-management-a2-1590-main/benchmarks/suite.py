@@ -0,0 +1,197 @@
+"""
+Hot-path benchmark suite with JSON results and baseline regression checks
+
+Seeds a temporary database with benchmarks.datagen, times each case below and
+writes the results as JSON. With --baseline, every case whose median latency
+grew by more than --threshold is reported as a regression, and the exit status
+is 1.
+
+Usage:
+    python -m benchmarks.suite [--books N] [--loans M] [--iterations N] [--output results.json]
+    python -m benchmarks.suite --baseline baseline.json [--threshold 0.25]
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+import database
+from database import init_database, close_pools
+from benchmarks.datagen import generate
+from services import library_service as svc
+
+DEFAULT_THRESHOLD = 0.25   # flag a case when its p50 is 25% slower than the baseline
+DEFAULT_MIN_DELTA_MS = 0.05  # ...and at least this much slower, so timer noise on tiny cases is ignored
+
+
+def time_case(fn: Callable[[int], object], iterations: int, warmup: int = 5) -> Dict:
+    """Call fn(i) `iterations` times and summarise the per-call latency in milliseconds."""
+    for i in range(warmup):
+        fn(i)
+    samples: List[float] = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        fn(i)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    total = sum(samples)
+    return {
+        'iterations': iterations,
+        'mean_ms': round(total / iterations, 4),
+        'p50_ms': round(statistics.median(samples), 4),
+        'p95_ms': round(samples[min(iterations - 1, int(iterations * 0.95))], 4),
+        'max_ms': round(samples[-1], 4),
+        'ops_per_s': round(iterations / (total / 1000), 1) if total else 0.0,
+    }
+
+
+def build_cases(data: Dict, client, seed: int = 327) -> Dict[str, Callable[[int], object]]:
+    """Map case name -> fn(i); cases only read, or undo their own writes."""
+    rng = random.Random(seed)
+    books = data['books']
+    patrons = data['patrons']
+    terms = ('shadow', 'river', 'garden', 'crown', 'stone')
+    picks = [rng.randrange(1, books + 1) for _ in range(1024)]
+    patron_picks = [rng.choice(patrons) for _ in range(1024)]
+
+    with database.read_connection() as conn:
+        loans = conn.execute('SELECT patron_id, book_id FROM borrow_records WHERE return_date IS NULL '
+                             'LIMIT 1024').fetchall()
+    loans = [tuple(loan) for loan in loans] or [(patrons[0], 1)]
+    with database.read_connection() as conn:
+        free = [row[0] for row in conn.execute(
+            'SELECT id FROM books WHERE available_copies > 0 LIMIT 1024').fetchall()] or [1]
+
+    def borrow_return(i):
+        # A patron outside the generated set, so the borrow limit never interferes
+        patron, book = f'{900000 + i % 1000:06d}', free[i % len(free)]
+        ok, msg = svc.borrow_book_by_patron(patron, book)
+        if ok:
+            svc.return_book_by_patron(patron, book)
+
+    return {
+        'search_title': lambda i: svc.search_books_in_catalog(terms[i % len(terms)], 'title'),
+        'search_author': lambda i: svc.search_books_in_catalog('smith', 'author'),
+        'search_isbn': lambda i: svc.search_books_in_catalog(f'{picks[i % 1024]:013d}', 'isbn'),
+        'borrow_and_return': borrow_return,
+        'calculate_late_fee_for_book': lambda i: svc.calculate_late_fee_for_book(*loans[i % len(loans)]),
+        'get_patron_status_report': lambda i: svc.get_patron_status_report(patron_picks[i % 1024]),
+        'route_catalog': lambda i: client.get('/catalog?page_size=50'),
+        'route_search': lambda i: client.get(f'/search?q={terms[i % len(terms)]}&type=title'),
+        'route_api_search': lambda i: client.get(f'/api/search?q={terms[i % len(terms)]}'),
+        'route_api_books': lambda i: client.get('/api/books?page_size=100'),
+        'route_api_late_fee': lambda i: client.get('/api/late_fee/%s/%d' % loans[i % len(loans)]),
+    }
+
+
+def run_suite(books: int, loans: int, patrons: int, iterations: int,
+              only: Optional[List[str]] = None, caches: bool = True) -> Dict:
+    """Seed a temporary database, run every (or every selected) case and return the results."""
+    from app import create_app
+    from routes import response_cache
+
+    saved = database.DATABASE
+    results = {
+        'meta': {
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'python': sys.version.split()[0],
+            'sqlite': sqlite3.sqlite_version,
+            'platform': platform.platform(),
+            'books': books, 'loans': loans, 'patrons': patrons,
+            'iterations': iterations, 'caches': caches,
+        },
+        'cases': {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        database.DATABASE = os.path.join(tmp, 'bench.db')
+        database.configure_book_cache(enabled=caches)
+        response_cache.configure_render_cache(enabled=caches)
+        try:
+            init_database()
+            data = generate(books, loans, patrons)
+            app = create_app()
+            app.config['TESTING'] = True
+            cases = build_cases(data, app.test_client())
+            for name, fn in cases.items():
+                if only and name not in only:
+                    continue
+                results['cases'][name] = time_case(fn, iterations)
+        finally:
+            close_pools()
+            database.DATABASE = saved
+            database.configure_book_cache(enabled=True)
+            response_cache.configure_render_cache(enabled=True)
+    return results
+
+
+def compare(results: Dict, baseline: Dict, threshold: float = DEFAULT_THRESHOLD,
+            min_delta_ms: float = DEFAULT_MIN_DELTA_MS) -> List[Dict]:
+    """
+    Compare p50 latencies against a baseline run.
+
+    Returns:
+        list: One dict per case present in both runs with its change ratio and
+              'regression' set when the slowdown exceeds both `threshold` and `min_delta_ms`
+    """
+    rows = []
+    for name, current in results['cases'].items():
+        base = baseline.get('cases', {}).get(name)
+        if not base or not base.get('p50_ms'):
+            continue
+        ratio = current['p50_ms'] / base['p50_ms']
+        rows.append({'case': name, 'baseline_p50_ms': base['p50_ms'], 'p50_ms': current['p50_ms'],
+                     'ratio': round(ratio, 3),
+                     'regression': ratio > 1 + threshold and current['p50_ms'] - base['p50_ms'] > min_delta_ms})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--books', type=int, default=20000)
+    parser.add_argument('--loans', type=int, default=50000)
+    parser.add_argument('--patrons', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=200)
+    parser.add_argument('--case', action='append', dest='cases', help='run only this case (repeatable)')
+    parser.add_argument('--no-cache', action='store_true', help='disable the book and render caches')
+    parser.add_argument('--output', help='write results JSON here')
+    parser.add_argument('--baseline', help='compare against this results JSON')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD)
+    parser.add_argument('--min-delta-ms', type=float, default=DEFAULT_MIN_DELTA_MS)
+    args = parser.parse_args(argv)
+
+    results = run_suite(args.books, args.loans, args.patrons, args.iterations,
+                        args.cases, caches=not args.no_cache)
+    print(f'{"case":>28} {"p50 ms":>9} {"p95 ms":>9} {"ops/s":>10}')
+    for name, r in results['cases'].items():
+        print(f'{name:>28} {r["p50_ms"]:9.3f} {r["p95_ms"]:9.3f} {r["ops_per_s"]:10.1f}')
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f'results written to {args.output}')
+
+    if not args.baseline:
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    comparison = compare(results, baseline, args.threshold, args.min_delta_ms)
+    regressions = [row for row in comparison if row['regression']]
+    print(f'\n{"case":>28} {"base p50":>9} {"p50":>9} {"ratio":>7}')
+    for row in comparison:
+        flag = '  REGRESSION' if row['regression'] else ''
+        print(f'{row["case"]:>28} {row["baseline_p50_ms"]:9.3f} {row["p50_ms"]:9.3f} {row["ratio"]:7.2f}{flag}')
+    print(f'{len(regressions)} regression(s) over {args.threshold:.0%}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
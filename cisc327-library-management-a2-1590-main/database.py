@@ -3,199 +3,1831 @@ Database module for Library Management System
 Handles all database operations and connections
 """
 
+import functools
+import json
+import os
+import queue
+import random
 import sqlite3
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Tuple
+import threading
+import time
+import urllib.parse
+import weakref
+import zlib
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from models import Book, Loan, OverdueLoan
+from instrumentation import InstrumentedConnection, record_checkout
 
 # Database configuration
 DATABASE = 'library.db'
 
+# Connection pool configuration
+POOL_SIZE = 5          # maximum open connections per database file
+POOL_TIMEOUT = 5.0     # seconds to wait for a free connection before giving up
+
+# Retry policy for units of work that hit SQLITE_BUSY/SQLITE_LOCKED after busy_timeout expires
+BUSY_RETRIES = 4           # extra attempts after the first
+BUSY_BACKOFF_BASE = 0.01   # seconds; full-jitter exponential backoff
+BUSY_BACKOFF_MAX = 0.5
+
+# Open pooled connections as InstrumentedConnection so requests can count their SQL
+INSTRUMENT_SQL = True
+
+# Book row cache configuration (see BookCache)
+BOOK_CACHE_ENABLED = True
+BOOK_CACHE_SIZE = 1024     # maximum cached book rows per database file
+BOOK_CACHE_TTL = 60.0      # seconds before a cached row is re-read
+
+# Storage profiles: pragmas applied once, when a pooled connection is first opened.
+# 'wal' lets readers run alongside a writer; 'rollback' keeps SQLite's defaults.
+STORAGE_PROFILES = {
+    'wal': {
+        'busy_timeout': 5000,
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -16000,      # KiB, i.e. ~16 MB of page cache per connection
+        'temp_store': 'MEMORY',
+    },
+    'rollback': {
+        'busy_timeout': 5000,
+        'journal_mode': 'DELETE',
+        'synchronous': 'FULL',
+        'temp_store': 'MEMORY',
+    },
+}
+STORAGE_PROFILE = 'wal'
+PRAGMAS = STORAGE_PROFILES[STORAGE_PROFILE]
+
+# Column list matching the Book record, so rows unpack positionally into it
+BOOK_COLUMNS = 'id, title, author, isbn, total_copies, available_copies'
+
+# borrow_records dates are also exposed as integer days since 1970-01-01 (see migration 6)
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# A loan's materialized fee as of a day: a row priced that day, or a final (capped)
+# row priced by then, whose days overdue keep counting. Together the two fragments
+# bind the as-of day three times (once in the columns, twice in the join).
+LOAN_FEE_JOIN = 'lf.borrow_record_id = br.id AND (lf.swept_day = ? OR (lf.final AND lf.swept_day <= ?))'
+LOAN_FEE_COLUMNS = ('CASE WHEN lf.final THEN ? - lf.due_day ELSE lf.days_overdue END AS days_overdue, '
+                    'lf.fee_amount')
+
+# Pragmas that change the database file and so are only set by writers
+WRITER_ONLY_PRAGMAS = ('journal_mode',)
+
+
+def _py_lower(value):
+    return value.lower() if isinstance(value, str) else value
+
+
+class ConnectionPool:
+    """
+    Bounded pool of SQLite connections for a single database file.
+
+    Connections are created lazily up to `size`, configured once with PRAGMAS
+    and handed out through a queue, so they may move between threads but are
+    only ever used by one caller at a time. A `readonly` pool opens its
+    connections with a mode=ro URI, so they can never take the write lock.
+    """
+
+    def __init__(self, path: str, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT,
+                 readonly: bool = False):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+        # Set by search_books once books_fts is seen; no migration drops it
+        self.has_books_fts = False
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.wait_time = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        factory = InstrumentedConnection if INSTRUMENT_SQL else sqlite3.Connection
+        if self.readonly:
+            uri = 'file:' + urllib.parse.quote(self.path) + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=factory)
+        else:
+            conn = sqlite3.connect(self.path, check_same_thread=False, factory=factory)
+        conn.row_factory = sqlite3.Row  # This enables column access by name
+        # Python's str.lower, which folds non-ASCII letters that SQL lower()/LIKE leave alone
+        conn.create_function('py_lower', 1, _py_lower, deterministic=True)
+        for name, value in PRAGMAS.items():
+            if self.readonly and name in WRITER_ONLY_PRAGMAS:
+                continue
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Take an idle connection, open a new one, or wait for one to be released."""
+        try:
+            conn = self._idle.get_nowait()
+            with self._lock:
+                self.hits += 1
+            record_checkout(False)
+            return conn
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_create = self._created < self.size
+            if can_create:
+                self._created += 1
+                self.misses += 1
+        if can_create:
+            try:
+                conn = self._connect()
+                record_checkout(True)
+                return conn
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        start = time.perf_counter()
+        try:
+            conn = self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError(
+                f'connection pool exhausted after {self.timeout}s ({self.size} connections in use)'
+            )
+        with self._lock:
+            self.waits += 1
+            self.wait_time += time.perf_counter() - start
+        record_checkout(False)
+        return conn
+
+    def release(self, conn: sqlite3.Connection) -> None:
+        """
+        Return a connection to the pool, discarding any uncommitted work.
+        Connections released after close() are closed rather than kept idle.
+        """
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+        if self._closed:
+            self._discard(conn)
+            return
+        self._idle.put(conn)
+        if self._closed:
+            # close() may have drained the queue between the check and the put
+            self.close()
+
+    def _discard(self, conn: sqlite3.Connection) -> None:
+        conn.close()
+        with self._lock:
+            self._created -= 1
+
+    def close(self) -> None:
+        """
+        Close every idle connection held by the pool. Connections still checked
+        out are closed when they are released.
+        """
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'path': self.path,
+                'readonly': self.readonly,
+                'size': self.size,
+                'open': self._created,
+                'idle': self._idle.qsize(),
+                'hits': self.hits,
+                'misses': self.misses,
+                'waits': self.waits,
+                'wait_time': round(self.wait_time, 6),
+            }
+
+
+class PooledConnection:
+    """
+    Proxy for a pooled connection; close() hands it back to the pool instead of closing it.
+
+    Used as a context manager it commits (or rolls back on error) and then
+    releases the connection. A proxy that is garbage collected without being
+    closed releases its connection too, so a leaked proxy never pins a pool slot.
+    """
+
+    __slots__ = ('_conn', '_release', '__weakref__')
+
+    def __init__(self, conn: sqlite3.Connection, pool: ConnectionPool):
+        self._conn = conn
+        self._release = weakref.finalize(self, pool.release, conn)
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return getattr(self._conn, name)
+
+    def __enter__(self) -> 'PooledConnection':
+        if self._conn is None:
+            raise sqlite3.ProgrammingError('Cannot operate on a closed database.')
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        try:
+            if self._conn is not None:
+                if exc_type is None:
+                    self._conn.commit()
+                else:
+                    self._conn.rollback()
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        if self._conn is not None:
+            self._conn = None
+            self._release()
+
+
+_pools: Dict[Tuple[str, bool], ConnectionPool] = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(readonly: bool = False) -> ConnectionPool:
+    """Get the read-write (or read-only) connection pool for the current DATABASE path."""
+    key = (os.path.abspath(DATABASE), readonly)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(key[0], POOL_SIZE, POOL_TIMEOUT, readonly)
+    return pool
+
+
+def configure_pool(size: Optional[int] = None, timeout: Optional[float] = None) -> None:
+    """Change the pool size/timeout; existing pools are closed and rebuilt on next use."""
+    global POOL_SIZE, POOL_TIMEOUT
+    if size is not None:
+        if size < 1:
+            raise ValueError('Pool size must be at least 1.')
+        POOL_SIZE = size
+    if timeout is not None:
+        POOL_TIMEOUT = timeout
+    close_pools()
+
+
+def close_pools() -> None:
+    """Close idle connections in every pool and forget the pools."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.close()
+
+
+def configure_storage(profile: str) -> None:
+    """Switch to another STORAGE_PROFILES entry; existing pools are closed and rebuilt on next use."""
+    global STORAGE_PROFILE, PRAGMAS
+    if profile not in STORAGE_PROFILES:
+        raise ValueError(f'Unknown storage profile: {profile}')
+    STORAGE_PROFILE = profile
+    PRAGMAS = STORAGE_PROFILES[profile]
+    close_pools()
+
+
+def get_pool_stats(readonly: bool = False) -> Dict:
+    """Get hit/miss/wait statistics for the current database's read-write (or read-only) pool."""
+    return get_pool(readonly).stats()
+
+
+class BookCache:
+    """
+    In-process LRU/TTL cache of book rows for one database file, keyed by id
+    with a secondary ISBN index.
+
+    Writers call invalidate() after committing. Each invalidation bumps a
+    version, and put() drops rows read under an older version. A read that
+    raced a write therefore cannot put a stale row back into the cache.
+    """
+
+    def __init__(self, max_size: int = BOOK_CACHE_SIZE, ttl: float = BOOK_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._rows: 'OrderedDict[int, Tuple[float, Book]]' = OrderedDict()
+        self._isbn: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _lookup(self, book_id: Optional[int]) -> Optional[Dict]:
+        entry = self._rows.get(book_id) if book_id is not None else None
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, row = entry
+        if expires < time.monotonic():
+            self._drop(book_id)
+            self.misses += 1
+            return None
+        self._rows.move_to_end(book_id)
+        self.hits += 1
+        return row
+
+    def get(self, book_id: int) -> Optional[Book]:
+        with self._lock:
+            return self._lookup(book_id)
+
+    def get_by_isbn(self, isbn: str) -> Optional[Book]:
+        with self._lock:
+            return self._lookup(self._isbn.get(isbn))
+
+    def put(self, row: Book, version: int) -> None:
+        """Cache a row read while the cache was at `version`."""
+        with self._lock:
+            if version != self.version:
+                return
+            self._drop(row['id'])
+            self._rows[row['id']] = (time.monotonic() + self.ttl, row)
+            self._isbn[row['isbn']] = row['id']
+            while len(self._rows) > self.max_size:
+                self._drop(next(iter(self._rows)))
+                self.evictions += 1
+
+    def _drop(self, book_id: int) -> None:
+        entry = self._rows.pop(book_id, None)
+        if entry is not None:
+            self._isbn.pop(entry[1]['isbn'], None)
+
+    def invalidate(self, book_id: Optional[int] = None) -> None:
+        """Forget one book, or every book when book_id is None."""
+        with self._lock:
+            self.version += 1
+            self.invalidations += 1
+            if book_id is None:
+                self._rows.clear()
+                self._isbn.clear()
+            else:
+                self._drop(book_id)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'enabled': BOOK_CACHE_ENABLED,
+                'size': len(self._rows),
+                'max_size': self.max_size,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+            }
+
+
+_book_caches: Dict[str, BookCache] = {}
+
+
+def get_book_cache() -> BookCache:
+    """Get the book cache for the current DATABASE path."""
+    path = os.path.abspath(DATABASE)
+    cache = _book_caches.get(path)
+    if cache is None:
+        with _pools_lock:
+            cache = _book_caches.setdefault(path, BookCache(BOOK_CACHE_SIZE, BOOK_CACHE_TTL))
+    return cache
+
+
+def configure_book_cache(enabled: Optional[bool] = None, max_size: Optional[int] = None,
+                         ttl: Optional[float] = None) -> None:
+    """Turn the book cache on/off or resize it; existing cached rows are dropped."""
+    global BOOK_CACHE_ENABLED, BOOK_CACHE_SIZE, BOOK_CACHE_TTL
+    if enabled is not None:
+        BOOK_CACHE_ENABLED = enabled
+    if max_size is not None:
+        BOOK_CACHE_SIZE = max_size
+    if ttl is not None:
+        BOOK_CACHE_TTL = ttl
+    with _pools_lock:
+        _book_caches.clear()
+
+
+def get_book_cache_stats() -> Dict:
+    """Get hit-rate statistics for the current database's book cache."""
+    return get_book_cache().stats()
+
+
+def _invalidate_book(book_id: Optional[int] = None) -> None:
+    """Drop a book (or all books) from the cache after a committed write."""
+    _bump_catalog_version()
+    if BOOK_CACHE_ENABLED:
+        get_book_cache().invalidate(book_id)
+
+
+# Catalog version: bumped after every committed write to books, per database
+# file. It lives in this process only; PROCESS_TOKEN keeps version keys from
+# two processes (or two runs) from ever comparing equal.
+PROCESS_TOKEN = os.urandom(4).hex()
+_catalog_versions: Dict[str, int] = {}
+
+
+def _bump_catalog_version() -> None:
+    path = os.path.abspath(DATABASE)
+    with _pools_lock:
+        _catalog_versions[path] = _catalog_versions.get(path, 0) + 1
+
+
+def get_catalog_version() -> int:
+    """Get how many catalog writes this process has committed to the current database."""
+    return _catalog_versions.get(os.path.abspath(DATABASE), 0)
+
+
+def get_catalog_version_key() -> str:
+    """
+    Get an opaque token that changes whenever the catalog does, suitable for
+    ETags and cache keys. Distinct per process and per database file.
+    """
+    path = os.path.abspath(DATABASE)
+    return f'{PROCESS_TOKEN}-{zlib.crc32(path.encode()):08x}-{_catalog_versions.get(path, 0)}'
+
+
 def get_db_connection():
-    """Get a database connection."""
-    conn = sqlite3.connect(DATABASE)
-    conn.row_factory = sqlite3.Row  # This enables column access by name
-    return conn
+    """Get a database connection from the pool. Calling close() returns it to the pool."""
+    pool = get_pool()
+    return PooledConnection(pool.acquire(), pool)
+
+
+@contextmanager
+def db_connection():
+    """Borrow a pooled connection for the duration of a with-block."""
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def read_connection():
+    """
+    Borrow a pooled read-only connection for the duration of a with-block.
+    Under the WAL profile these readers never wait on, or block, a writer.
+    """
+    pool = get_pool(readonly=True)
+    conn = pool.acquire()
+    try:
+        yield conn
+    finally:
+        pool.release(conn)
+
+
+@contextmanager
+def transaction():
+    """
+    Run a unit of work on one pooled connection inside BEGIN IMMEDIATE.
+
+    The write lock is taken up front, so reads made inside the block cannot be
+    invalidated by another writer. Commits once on success, rolls back on error.
+    """
+    with db_connection() as conn:
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            yield conn
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+
+
+def _is_busy(exc: BaseException) -> bool:
+    """True for the "database is locked" family of errors, which are safe to retry."""
+    if not isinstance(exc, sqlite3.OperationalError):
+        return False
+    code = getattr(exc, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    message = str(exc)
+    return 'locked' in message or 'busy' in message
+
+
+def retry_on_busy(fn):
+    """
+    Re-run a unit of work when SQLite reports the database busy or locked.
+
+    Only wrap functions whose writes all happen inside one transaction(): the
+    failed attempt has been rolled back, so running it again is safe. Sleeps
+    uniform(0, min(BUSY_BACKOFF_MAX, BUSY_BACKOFF_BASE * 2**attempt)) between
+    attempts and re-raises once BUSY_RETRIES is exhausted.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return fn(*args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if attempt >= BUSY_RETRIES or not _is_busy(e):
+                    raise
+            time.sleep(random.uniform(0, min(BUSY_BACKOFF_MAX, BUSY_BACKOFF_BASE * (2 ** attempt))))
+            attempt += 1
+    return wrapper
+
+
+def reserve_copy(conn, book_id: int) -> bool:
+    """
+    Take one available copy of a book on the given connection.
+
+    The guard lives in the UPDATE itself, so available_copies can never go
+    below zero however the caller's earlier reads were interleaved with other
+    writers. Returns False (and changes nothing) when no copy is left.
+    """
+    cursor = conn.execute(
+        'UPDATE books SET available_copies = available_copies - 1 WHERE id = ? AND available_copies > 0',
+        (book_id,)
+    )
+    return cursor.rowcount == 1
+
+
+def release_copy(conn, book_id: int) -> bool:
+    """Put one copy back on the shelf; never raises available_copies above total_copies."""
+    cursor = conn.execute(
+        'UPDATE books SET available_copies = available_copies + 1 '
+        'WHERE id = ? AND available_copies < total_copies',
+        (book_id,)
+    )
+    return cursor.rowcount == 1
 
 def init_database():
     """Initialize the database with required tables."""
-    conn = get_db_connection()
+    with db_connection() as conn:
+        # Create books table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                author TEXT NOT NULL,
+                isbn TEXT UNIQUE NOT NULL,
+                total_copies INTEGER NOT NULL,
+                available_copies INTEGER NOT NULL
+            )
+        ''')
+        
+        # Create borrow_records table
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS borrow_records (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                patron_id TEXT NOT NULL,
+                book_id INTEGER NOT NULL,
+                borrow_date TEXT NOT NULL,
+                due_date TEXT NOT NULL,
+                return_date TEXT,
+                FOREIGN KEY (book_id) REFERENCES books (id)
+            )
+        ''')
+        
+        conn.commit()
     
-    # Create books table
+    run_migrations()
+
+def _create_books_fts(conn) -> None:
+    """
+    Create a trigram FTS5 index over books(title, author), kept in sync by triggers.
+    Skipped when the SQLite build lacks FTS5 or the trigram tokenizer; search
+    then falls back to a LIKE scan.
+    """
+    try:
+        conn.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                title, author, content='books', content_rowid='id', tokenize='trigram'
+            )
+        ''')
+    except sqlite3.OperationalError:
+        return
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_insert AFTER INSERT ON books BEGIN
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS books_fts_delete AFTER DELETE ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+        END
+    ''')
+    # Only title/author edits touch the index, not availability updates
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            author TEXT NOT NULL,
-            isbn TEXT UNIQUE NOT NULL,
-            total_copies INTEGER NOT NULL,
-            available_copies INTEGER NOT NULL
-        )
+        CREATE TRIGGER IF NOT EXISTS books_fts_update AFTER UPDATE OF title, author ON books BEGIN
+            INSERT INTO books_fts (books_fts, rowid, title, author)
+            VALUES ('delete', old.id, old.title, old.author);
+            INSERT INTO books_fts (rowid, title, author) VALUES (new.id, new.title, new.author);
+        END
     ''')
+    conn.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+
+# Schema migrations, applied in order on top of the base tables above.
+# PRAGMA user_version records the last version applied to a database file.
+# Each step is either an SQL statement or a callable taking the connection.
+def _add_epoch_day_columns(conn) -> None:
+    """
+    Add borrow_day/due_day/return_day as virtual columns computed by SQLite
+    from the ISO text, so every writer keeps them in sync and indexes on them
+    hold plain integers.
+    """
+    existing = {row['name'] for row in conn.execute('PRAGMA table_xinfo(borrow_records)')}
+    for column in ('borrow', 'due', 'return'):
+        if f'{column}_day' not in existing:
+            conn.execute(f'''
+                ALTER TABLE borrow_records ADD COLUMN {column}_day INTEGER
+                GENERATED ALWAYS AS (CAST(julianday(date({column}_date)) - 2440587.5 AS INTEGER)) VIRTUAL
+            ''')
+
+def _add_loan_fee_final_column(conn) -> None:
+    """Add loan_fees.final, set once a row's fee has reached the cap and can no longer change."""
+    existing = {row['name'] for row in conn.execute('PRAGMA table_info(loan_fees)')}
+    if 'final' not in existing:
+        conn.execute('ALTER TABLE loan_fees ADD COLUMN final INTEGER NOT NULL DEFAULT 0')
+
+def rebuild_patron_counters(conn=None) -> int:
+    """
+    Recompute every patrons row from borrow_records.
     
-    # Create borrow_records table
+    Returns:
+        int: Number of patrons with at least one borrow record
+    """
+    if conn is None:
+        with transaction() as conn:
+            return rebuild_patron_counters(conn)
+    conn.execute('DELETE FROM patrons')
     conn.execute('''
-        CREATE TABLE IF NOT EXISTS borrow_records (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            patron_id TEXT NOT NULL,
-            book_id INTEGER NOT NULL,
-            borrow_date TEXT NOT NULL,
-            due_date TEXT NOT NULL,
-            return_date TEXT,
-            FOREIGN KEY (book_id) REFERENCES books (id)
-        )
+        INSERT INTO patrons (patron_id, active_loans, lifetime_loans)
+        SELECT patron_id, SUM(return_date IS NULL), COUNT(*) FROM borrow_records GROUP BY patron_id
     ''')
+    return conn.execute('SELECT COUNT(*) FROM patrons').fetchone()[0]
+
+def check_patron_counters() -> List[Dict]:
+    """
+    Compare the patrons counters with a full recount of borrow_records.
+    
+    Returns:
+        list: One dict per patron whose stored counters differ from the recount
+    """
+    with read_connection() as conn:
+        rows = conn.execute('''
+            WITH actual AS (
+                SELECT patron_id, SUM(return_date IS NULL) AS active_loans, COUNT(*) AS lifetime_loans
+                FROM borrow_records GROUP BY patron_id
+            )
+            SELECT a.patron_id, p.active_loans AS stored_active, a.active_loans AS actual_active,
+                   p.lifetime_loans AS stored_lifetime, a.lifetime_loans AS actual_lifetime
+            FROM actual a LEFT JOIN patrons p ON p.patron_id = a.patron_id
+            WHERE p.patron_id IS NULL OR p.active_loans != a.active_loans
+               OR p.lifetime_loans != a.lifetime_loans
+            UNION ALL
+            SELECT p.patron_id, p.active_loans, 0, p.lifetime_loans, 0
+            FROM patrons p
+            WHERE (p.active_loans != 0 OR p.lifetime_loans != 0)
+              AND NOT EXISTS (SELECT 1 FROM borrow_records br WHERE br.patron_id = p.patron_id)
+            ORDER BY 1
+        ''').fetchall()
+    return [dict(row) for row in rows]
+
+MIGRATIONS = [
+    (1, 'Indexes for borrow_records hot queries', [
+        # Active loans per patron: borrowed list, borrow count, return lookup
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_patron_active
+           ON borrow_records (patron_id, borrow_date) WHERE return_date IS NULL''',
+        # Full history per patron (status report history count)
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_patron
+           ON borrow_records (patron_id)''',
+        # Loans per book, open or closed
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_book_return
+           ON borrow_records (book_id, return_date)''',
+    ]),
+    (2, 'Full-text search index on books', [
+        _create_books_fts,
+    ]),
+    (3, 'Indexes for keyset pagination of the catalog', [
+        '''CREATE INDEX IF NOT EXISTS idx_books_title_id
+           ON books (title, id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_books_title_id_available
+           ON books (title, id) WHERE available_copies > 0''',
+    ]),
+    (4, 'Per-book allocation of late fee payments', [
+        '''CREATE TABLE IF NOT EXISTS payment_allocations (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               transaction_id TEXT NOT NULL,
+               patron_id TEXT NOT NULL,
+               borrow_record_id INTEGER NOT NULL,
+               book_id INTEGER NOT NULL,
+               amount REAL NOT NULL,
+               created_at TEXT NOT NULL,
+               FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id),
+               FOREIGN KEY (book_id) REFERENCES books (id)
+           )''',
+        '''CREATE INDEX IF NOT EXISTS idx_payment_allocations_txn
+           ON payment_allocations (transaction_id, book_id)''',
+    ]),
+    (5, 'Idempotent payments ledger', [
+        # One row per logical charge or refund; retries reuse the idempotency key
+        '''CREATE TABLE IF NOT EXISTS payments (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               idempotency_key TEXT UNIQUE NOT NULL,
+               kind TEXT NOT NULL CHECK (kind IN ('charge', 'refund')),
+               patron_id TEXT,
+               book_id INTEGER,
+               borrow_record_id INTEGER,
+               amount REAL NOT NULL,
+               status TEXT NOT NULL CHECK (status IN ('pending', 'completed', 'failed', 'error')),
+               transaction_id TEXT,
+               parent_transaction_id TEXT,
+               message TEXT,
+               created_at TEXT NOT NULL,
+               updated_at TEXT NOT NULL,
+               FOREIGN KEY (book_id) REFERENCES books (id),
+               FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+           )''',
+        '''CREATE INDEX IF NOT EXISTS idx_payments_txn
+           ON payments (transaction_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_payments_parent_txn
+           ON payments (parent_transaction_id) WHERE parent_transaction_id IS NOT NULL''',
+        '''CREATE INDEX IF NOT EXISTS idx_payments_borrow_record
+           ON payments (borrow_record_id) WHERE borrow_record_id IS NOT NULL''',
+    ]),
+    (6, 'Integer epoch-day date columns and an overdue index', [
+        _add_epoch_day_columns,
+        # Open loans by due day; queries must spell the key as (return_date IS NULL) = 1
+        '''CREATE INDEX IF NOT EXISTS idx_borrow_records_open_due
+           ON borrow_records ((return_date IS NULL), due_day)''',
+    ]),
+    (7, 'Per-patron loan counters', [
+        '''CREATE TABLE IF NOT EXISTS patrons (
+               patron_id TEXT PRIMARY KEY,
+               active_loans INTEGER NOT NULL DEFAULT 0,
+               lifetime_loans INTEGER NOT NULL DEFAULT 0
+           ) WITHOUT ROWID''',
+        # Triggers keep the counters in the same transaction as any borrow_records write
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_insert AFTER INSERT ON borrow_records BEGIN
+               INSERT INTO patrons (patron_id, active_loans, lifetime_loans)
+               VALUES (new.patron_id, new.return_date IS NULL, 1)
+               ON CONFLICT (patron_id) DO UPDATE SET
+                   active_loans = active_loans + excluded.active_loans,
+                   lifetime_loans = lifetime_loans + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_update
+           AFTER UPDATE OF patron_id, return_date ON borrow_records BEGIN
+               UPDATE patrons SET active_loans = active_loans - (old.return_date IS NULL),
+                                  lifetime_loans = lifetime_loans - 1
+               WHERE patron_id = old.patron_id;
+               INSERT INTO patrons (patron_id, active_loans, lifetime_loans)
+               VALUES (new.patron_id, new.return_date IS NULL, 1)
+               ON CONFLICT (patron_id) DO UPDATE SET
+                   active_loans = active_loans + excluded.active_loans,
+                   lifetime_loans = lifetime_loans + 1;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patrons_loan_delete AFTER DELETE ON borrow_records BEGIN
+               UPDATE patrons SET active_loans = active_loans - (old.return_date IS NULL),
+                                  lifetime_loans = lifetime_loans - 1
+               WHERE patron_id = old.patron_id;
+           END''',
+        rebuild_patron_counters,
+    ]),
+    (8, 'Hold queue for unavailable books', [
+        # position grows per book; a 'ready' hold has a returned copy set aside for its patron
+        '''CREATE TABLE IF NOT EXISTS holds (
+               id INTEGER PRIMARY KEY AUTOINCREMENT,
+               book_id INTEGER NOT NULL,
+               patron_id TEXT NOT NULL,
+               position INTEGER NOT NULL,
+               status TEXT NOT NULL
+                   CHECK (status IN ('waiting', 'ready', 'fulfilled', 'cancelled', 'expired')),
+               created_at TEXT NOT NULL,
+               ready_at TEXT,
+               expires_at TEXT,
+               FOREIGN KEY (book_id) REFERENCES books (id)
+           )''',
+        # Allocating the next position: MAX(position) for a book
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_book_position
+           ON holds (book_id, position)''',
+        # Head of the queue, without stepping over a book's finished holds
+        """CREATE INDEX IF NOT EXISTS idx_holds_waiting
+           ON holds (book_id, position) WHERE status = 'waiting'""",
+        # One live hold per patron and book; also the borrow-time lookup
+        '''CREATE UNIQUE INDEX IF NOT EXISTS idx_holds_patron_active
+           ON holds (patron_id, book_id) WHERE status IN ('waiting', 'ready')''',
+        """CREATE INDEX IF NOT EXISTS idx_holds_ready_expiry
+           ON holds (expires_at) WHERE status = 'ready'""",
+    ]),
+    (9, 'Materialized late fees kept current by the fee sweep', [
+        # Priced open, overdue loans; swept_day is the epoch day the row was priced for
+        '''CREATE TABLE IF NOT EXISTS loan_fees (
+               borrow_record_id INTEGER PRIMARY KEY,
+               patron_id TEXT NOT NULL,
+               book_id INTEGER NOT NULL,
+               due_day INTEGER NOT NULL,
+               days_overdue INTEGER NOT NULL,
+               fee_amount REAL NOT NULL,
+               swept_day INTEGER NOT NULL,
+               FOREIGN KEY (borrow_record_id) REFERENCES borrow_records (id)
+           )''',
+        '''CREATE INDEX IF NOT EXISTS idx_loan_fees_patron
+           ON loan_fees (patron_id)''',
+        '''CREATE INDEX IF NOT EXISTS idx_loan_fees_swept
+           ON loan_fees (swept_day)''',
+        # Loans written since the last sweep; the sweep reprices exactly these.
+        # An edited loan also loses its row at once, so readers never see a stale fee
+        '''CREATE TABLE IF NOT EXISTS loan_fee_changes (
+               borrow_record_id INTEGER PRIMARY KEY
+           )''',
+        '''CREATE TRIGGER IF NOT EXISTS loan_fees_loan_insert AFTER INSERT ON borrow_records BEGIN
+               INSERT OR IGNORE INTO loan_fee_changes (borrow_record_id) VALUES (new.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS loan_fees_loan_update
+           AFTER UPDATE OF due_date, return_date ON borrow_records BEGIN
+               DELETE FROM loan_fees WHERE borrow_record_id = old.id;
+               INSERT OR IGNORE INTO loan_fee_changes (borrow_record_id) VALUES (new.id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS loan_fees_loan_delete AFTER DELETE ON borrow_records BEGIN
+               DELETE FROM loan_fees WHERE borrow_record_id = old.id;
+               DELETE FROM loan_fee_changes WHERE borrow_record_id = old.id;
+           END''',
+        # Single row: the epoch day the last complete sweep priced fees for
+        '''CREATE TABLE IF NOT EXISTS fee_sweeps (
+               id INTEGER PRIMARY KEY CHECK (id = 1),
+               swept_day INTEGER NOT NULL,
+               swept_at TEXT NOT NULL
+           )''',
+    ]),
+    (10, 'Materialized patron status reports', [
+        # report is the JSON of get_patron_status_report, good from as_of_day until
+        # stale_day (the first day one of its fees changes; NULL if none ever will)
+        '''CREATE TABLE IF NOT EXISTS patron_summary (
+               patron_id TEXT PRIMARY KEY,
+               report TEXT NOT NULL,
+               as_of_day INTEGER NOT NULL,
+               stale_day INTEGER,
+               updated_at TEXT NOT NULL
+           ) WITHOUT ROWID''',
+        '''CREATE INDEX IF NOT EXISTS idx_patron_summary_stale
+           ON patron_summary (stale_day) WHERE stale_day IS NOT NULL''',
+        # Any write to a patron's loans drops their summary in the same transaction
+        '''CREATE TRIGGER IF NOT EXISTS patron_summary_loan_insert AFTER INSERT ON borrow_records BEGIN
+               DELETE FROM patron_summary WHERE patron_id = new.patron_id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patron_summary_loan_update AFTER UPDATE ON borrow_records BEGIN
+               DELETE FROM patron_summary WHERE patron_id IN (old.patron_id, new.patron_id);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS patron_summary_loan_delete AFTER DELETE ON borrow_records BEGIN
+               DELETE FROM patron_summary WHERE patron_id = old.patron_id;
+           END''',
+    ]),
+    (11, 'Capped late fees are final and skipped by the daily repricing', [
+        _add_loan_fee_final_column,
+        'DROP INDEX IF EXISTS idx_loan_fees_swept',
+        '''CREATE INDEX IF NOT EXISTS idx_loan_fees_unswept
+           ON loan_fees (swept_day) WHERE final = 0''',
+    ]),
+    (12, 'Look up batch payment allocations by loan', [
+        '''CREATE INDEX IF NOT EXISTS idx_payment_allocations_loan
+           ON payment_allocations (borrow_record_id)''',
+    ]),
+]
+
+def get_schema_version() -> int:
+    """Get the schema version recorded in the database file."""
+    with db_connection() as conn:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def run_migrations(target: Optional[int] = None) -> int:
+    """
+    Apply pending migrations up to `target` (default: latest), one transaction each.
     
-    conn.commit()
-    conn.close()
+    Returns:
+        int: The schema version after migrating
+    """
+    version = get_schema_version()
+    for number, description, steps in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        with transaction() as conn:
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute(f'PRAGMA user_version = {int(number)}')
+        version = number
+    return version
 
 def add_sample_data():
     """Add sample data to the database if it's empty."""
-    conn = get_db_connection()
-    book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
-    
-    if book_count == 0:
-        # Add sample books
-        sample_books = [
-            ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
-            ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
-            ('1984', 'George Orwell', '9780451524935', 1)
-        ]
+    with db_connection() as conn:
+        book_count = conn.execute('SELECT COUNT(*) as count FROM books').fetchone()['count']
         
-        for title, author, isbn, copies in sample_books:
+        if book_count == 0:
+            # Add sample books
+            sample_books = [
+                ('The Great Gatsby', 'F. Scott Fitzgerald', '9780743273565', 3),
+                ('To Kill a Mockingbird', 'Harper Lee', '9780061120084', 2),
+                ('1984', 'George Orwell', '9780451524935', 1)
+            ]
+            
+            for title, author, isbn, copies in sample_books:
+                conn.execute('''
+                    INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                    VALUES (?, ?, ?, ?, ?)
+                ''', (title, author, isbn, copies, copies))
+            
+            # Make 1984 unavailable by adding a borrow record
             conn.execute('''
-                INSERT INTO books (title, author, isbn, total_copies, available_copies)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (title, author, isbn, copies, copies))
-        
-        # Make 1984 unavailable by adding a borrow record
-        conn.execute('''
-            INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
-            VALUES (?, ?, ?, ?)
-        ''', ('123456', 3, 
-              (datetime.now() - timedelta(days=5)).isoformat(),
-              (datetime.now() + timedelta(days=9)).isoformat()))
-        
-        # Update available copies for 1984
-        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
-        
-        conn.commit()
-    
-    conn.close()
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', ('123456', 3, 
+                  (datetime.now() - timedelta(days=5)).isoformat(),
+                  (datetime.now() + timedelta(days=9)).isoformat()))
+            
+            # Update available copies for 1984
+            conn.execute('UPDATE books SET available_copies = 0 WHERE id = 3')
+            
+            conn.commit()
+            _invalidate_book()
 
 # Helper Functions for Database Operations
 
-def get_all_books() -> List[Dict]:
+def get_all_books() -> List[Book]:
     """Get all books from the database."""
-    conn = get_db_connection()
-    books = conn.execute('SELECT * FROM books ORDER BY title').fetchall()
-    conn.close()
-    return [dict(book) for book in books]
-
-def get_book_by_id(book_id: int) -> Optional[Dict]:
-    """Get a specific book by ID."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE id = ?', (book_id,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
-
-def get_book_by_isbn(isbn: str) -> Optional[Dict]:
-    """Get a specific book by ISBN."""
-    conn = get_db_connection()
-    book = conn.execute('SELECT * FROM books WHERE isbn = ?', (isbn,)).fetchone()
-    conn.close()
-    return dict(book) if book else None
-
-def get_patron_borrowed_books(patron_id: str) -> List[Dict]:
-    """Get currently borrowed books for a patron."""
-    conn = get_db_connection()
-    records = conn.execute('''
-        SELECT br.*, b.title, b.author 
+    with read_connection() as conn:
+        books = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books ORDER BY title').fetchall()
+    return [Book(*book) for book in books]
+
+def get_books_page(limit: int, after: Optional[Tuple[str, int]] = None,
+                   available_only: bool = False) -> Tuple[List[Book], bool]:
+    """
+    Get one page of books ordered by (title, id) using keyset pagination.
+    
+    Args:
+        limit: Maximum number of books to return
+        after: (title, id) of the last book on the previous page, or None for the first page
+        available_only: Only include books with available copies
+        
+    Returns:
+        tuple: (books, has_more)
+    """
+    conditions = []
+    params: list = []
+    if after is not None:
+        conditions.append('(title, id) > (?, ?)')
+        params.extend(after)
+    if available_only:
+        conditions.append('available_copies > 0')
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+    params.append(limit + 1)
+    
+    with read_connection() as conn:
+        books = conn.execute(
+            f'SELECT {BOOK_COLUMNS} FROM books {where} ORDER BY title, id LIMIT ?', params
+        ).fetchall()
+    return [Book(*book) for book in books[:limit]], len(books) > limit
+
+def get_book_by_id(book_id: int) -> Optional[Book]:
+    """Get a specific book by ID (served from the book cache when enabled)."""
+    if BOOK_CACHE_ENABLED:
+        cache = get_book_cache()
+        book = cache.get(book_id)
+        if book is not None:
+            return book
+        version = cache.version
+    with read_connection() as conn:
+        book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone()
+    if book is None:
+        return None
+    book = Book(*book)
+    if BOOK_CACHE_ENABLED:
+        cache.put(book, version)
+    return book
+
+def get_book_by_isbn(isbn: str) -> Optional[Book]:
+    """Get a specific book by ISBN (served from the book cache when enabled)."""
+    if BOOK_CACHE_ENABLED:
+        cache = get_book_cache()
+        book = cache.get_by_isbn(isbn)
+        if book is not None:
+            return book
+        version = cache.version
+    with read_connection() as conn:
+        book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE isbn = ?', (isbn,)).fetchone()
+    if book is None:
+        return None
+    book = Book(*book)
+    if BOOK_CACHE_ENABLED:
+        cache.put(book, version)
+    return book
+
+def search_books(field: str, term: str) -> List[Book]:
+    """
+    Search books by 'title' or 'author' (case-insensitive substring) or 'isbn' (exact).
+    Title/author terms of 3+ characters go through the books_fts trigram index;
+    shorter ones scan the table, matching with Python's str.lower like the
+    original in-memory search. ISBN lookups go through the UNIQUE index.
+    Results are ordered by title.
+    """
+    if field == 'isbn':
+        with read_connection() as conn:
+            book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE isbn = ?', (term,)).fetchone()
+        return [Book(*book)] if book else []
+    
+    if field not in ('title', 'author'):
+        raise ValueError(f'Unsupported search field: {field}')
+    
+    pool = get_pool(readonly=True)
+    with read_connection() as conn:
+        if not pool.has_books_fts:
+            pool.has_books_fts = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+            ).fetchone() is not None
+        if pool.has_books_fts and len(term) >= 3:
+            phrase = '"' + term.replace('"', '""') + '"'
+            books = conn.execute('''
+                SELECT b.id, b.title, b.author, b.isbn, b.total_copies, b.available_copies
+                FROM books_fts
+                JOIN books b ON b.id = books_fts.rowid
+                WHERE books_fts MATCH ?
+                ORDER BY b.title, b.id
+            ''', (f'{field} : {phrase}',)).fetchall()
+        else:
+            # Trigram index cannot serve terms shorter than 3 characters
+            books = conn.execute(
+                f"SELECT {BOOK_COLUMNS} FROM books WHERE instr(py_lower({field}), ?) > 0 ORDER BY title, id",
+                (term.lower(),)
+            ).fetchall()
+    return [Book(*book) for book in books]
+
+def get_patron_borrowed_books(patron_id: str) -> List[Loan]:
+    """Get currently borrowed books for a patron (dates are parsed lazily per Loan)."""
+    with read_connection() as conn:
+        records = conn.execute('''
+            SELECT br.book_id, b.title, b.author, br.borrow_date, br.due_date
+            FROM borrow_records br 
+            JOIN books b ON br.book_id = b.id 
+            WHERE br.patron_id = ? AND br.return_date IS NULL
+            ORDER BY br.borrow_date
+        ''', (patron_id,)).fetchall()
+    
+    now = datetime.now()
+    return [Loan(*record, now) for record in records]
+
+def get_patron_loan_summary(patron_id: str, as_of_day: Optional[int] = None) -> Tuple[List[Dict], int]:
+    """
+    Get a patron's active loans and total borrow history count on one connection.
+    
+    Returns:
+        tuple: (active loans as raw rows with loan_id/book_id/title/author/borrow_date/due_date
+                and the days_overdue/fee_amount materialized for `as_of_day`, or None,
+                number of borrow records ever created for the patron)
+    """
+    with read_connection() as conn:
+        return _query_patron_loans(conn, patron_id, as_of_day)
+
+def _query_patron_loans(conn, patron_id: str, as_of_day: Optional[int]) -> Tuple[List[Dict], int]:
+    records = conn.execute(f'''
+        SELECT br.id AS loan_id, br.book_id, br.borrow_date, br.due_date, b.title, b.author,
+               {LOAN_FEE_COLUMNS}
         FROM borrow_records br 
         JOIN books b ON br.book_id = b.id 
+        LEFT JOIN loan_fees lf ON {LOAN_FEE_JOIN}
         WHERE br.patron_id = ? AND br.return_date IS NULL
         ORDER BY br.borrow_date
-    ''', (patron_id,)).fetchall()
-    conn.close()
-    
-    borrowed_books = []
-    for record in records:
-        borrowed_books.append({
-            'book_id': record['book_id'],
-            'title': record['title'],
-            'author': record['author'],
-            'borrow_date': datetime.fromisoformat(record['borrow_date']),
-            'due_date': datetime.fromisoformat(record['due_date']),
-            'is_overdue': datetime.now() > datetime.fromisoformat(record['due_date'])
-        })
-    
-    return borrowed_books
+    ''', (as_of_day, as_of_day, as_of_day, patron_id)).fetchall()
+    history = conn.execute(
+        'SELECT lifetime_loans FROM patrons WHERE patron_id = ?', (patron_id,)
+    ).fetchone()
+    history_count = history['lifetime_loans'] if history else 0
+    return [dict(record) for record in records], history_count
+
+def get_patron_summary(patron_id: str, as_of_day: int) -> Optional[Dict]:
+    """
+    Get a patron's materialized status report (a primary-key read), or None
+    when there is none or it is not valid on `as_of_day`.
+    """
+    with read_connection() as conn:
+        row = conn.execute('''
+            SELECT report FROM patron_summary
+            WHERE patron_id = ? AND as_of_day <= ? AND (stale_day IS NULL OR stale_day > ?)
+        ''', (patron_id, as_of_day, as_of_day)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def store_patron_summary(patron_id: str, as_of_day: int, build) -> Dict:
+    """
+    Build and store a patron's status report in one write transaction, so no
+    borrow or return can land between reading the loans and saving the result.
+
+    A patron with no borrow history (no patrons row) gets their report built
+    from a read-only connection and nothing is stored, so looking up unknown
+    IDs never writes.
+
+    Args:
+        build: fn(active_loans, history_count) -> (report, stale_day), given the
+               rows get_patron_loan_summary returns
+    
+    Returns:
+        dict: The report that was built
+    """
+    with read_connection() as conn:
+        known = conn.execute('SELECT 1 FROM patrons WHERE patron_id = ?', (patron_id,)).fetchone()
+        if known is None:
+            return build(*_query_patron_loans(conn, patron_id, as_of_day))[0]
+    with transaction() as conn:
+        active, history_count = _query_patron_loans(conn, patron_id, as_of_day)
+        report, stale_day = build(active, history_count)
+        conn.execute('''
+            INSERT OR REPLACE INTO patron_summary (patron_id, report, as_of_day, stale_day, updated_at)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (patron_id, json.dumps(report), as_of_day, stale_day, datetime.now().isoformat()))
+    return report
+
+def get_stale_patron_summaries(as_of_day: int) -> List[str]:
+    """Get the patrons whose stored summary has fees that changed by `as_of_day`."""
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT patron_id FROM patron_summary WHERE stale_day IS NOT NULL AND stale_day <= ?',
+            (as_of_day,))]
+
+def get_patron_summaries(as_of_day: int, after: str = '', limit: int = 1000) -> List[Dict]:
+    """Get (patron_id, report) for up to `limit` summaries valid on `as_of_day`, keyset-paged by patron_id."""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT patron_id, report FROM patron_summary
+            WHERE patron_id > ? AND as_of_day <= ? AND (stale_day IS NULL OR stale_day > ?)
+            ORDER BY patron_id LIMIT ?
+        ''', (after, as_of_day, as_of_day, limit)).fetchall()
+    return [dict(row) for row in rows]
+
+def clear_patron_summaries() -> int:
+    """Drop every materialized patron summary; returns how many were removed."""
+    with transaction() as conn:
+        return conn.execute('DELETE FROM patron_summary').rowcount
+
+def get_patron_ids() -> List[str]:
+    """Get every patron with at least one borrow record."""
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute('SELECT patron_id FROM patrons ORDER BY patron_id')]
+
+@contextmanager
+def stream_connection():
+    """
+    Open a dedicated read-only connection for a long streaming read, outside
+    the pools. An export or bulk fee run can take minutes; on a pooled
+    connection it would hold a slot the request path needs for that long.
+    The connection is closed when the with-block exits.
+    """
+    conn = get_pool(readonly=True)._connect()
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def _iter_batches(sql: str, params: tuple, batch_size: int) -> Iterator[List[sqlite3.Row]]:
+    """Run a read query on a stream_connection() and yield its rows in fetchmany batches."""
+    with stream_connection() as conn:
+        cursor = conn.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield rows
+
+def epoch_day(value: date) -> int:
+    """Convert a date (or datetime) to the integer day number stored in the *_day columns."""
+    if isinstance(value, datetime):
+        value = value.date()
+    return value.toordinal() - EPOCH_ORDINAL
+
+def get_overdue_loans(as_of: Optional[date] = None) -> List[OverdueLoan]:
+    """
+    Get every open loan whose due date is before `as_of` (default: today),
+    most overdue first.
+
+    The range check runs on idx_borrow_records_open_due and days_overdue is
+    computed in SQL, so no date strings are parsed in Python.
+    """
+    today = epoch_day(as_of or date.today())
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT id, patron_id, book_id, due_day, ? - due_day AS days_overdue
+            FROM borrow_records
+            WHERE (return_date IS NULL) = 1 AND due_day < ?
+            ORDER BY due_day, id
+        ''', (today, today)).fetchall()
+    return [OverdueLoan(*row) for row in rows]
+
+def get_fee_sweep_day() -> Optional[int]:
+    """Get the epoch day the last complete fee sweep priced loans for (None before the first)."""
+    with read_connection() as conn:
+        row = conn.execute('SELECT swept_day FROM fee_sweeps WHERE id = 1').fetchone()
+    return row[0] if row else None
+
+def _store_loan_fees(conn, rows: List[sqlite3.Row], today: int, price,
+                     final_fee: Optional[float] = None) -> int:
+    """
+    Price rows (id, patron_id, book_id, due_date, due_day) and upsert the overdue
+    ones into loan_fees. Rows priced at `final_fee` or more are marked final.
+    """
+    days, fees, valid = price([row['due_date'] for row in rows])
+    priced, cleared = [], []
+    for row, d, fee, ok in zip(rows, days, fees, valid):
+        if ok and fee > 0:
+            final = final_fee is not None and fee >= final_fee
+            priced.append((row['id'], row['patron_id'], row['book_id'], row['due_day'], d, fee, today, final))
+        else:
+            cleared.append((row['id'],))
+    conn.executemany('''
+        INSERT INTO loan_fees (borrow_record_id, patron_id, book_id, due_day, days_overdue, fee_amount,
+                               swept_day, final)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (borrow_record_id) DO UPDATE SET
+            patron_id = excluded.patron_id, book_id = excluded.book_id, due_day = excluded.due_day,
+            days_overdue = excluded.days_overdue, fee_amount = excluded.fee_amount,
+            swept_day = excluded.swept_day, final = excluded.final
+    ''', priced)
+    conn.executemany('DELETE FROM loan_fees WHERE borrow_record_id = ?', cleared)
+    return len(rows)
+
+def sweep_loan_fees(as_of: date, price, batch_size: int = 5000,
+                    final_fee: Optional[float] = None) -> Dict:
+    """
+    Bring loan_fees up to date for `as_of`, touching only loans whose fee can
+    have changed since the last sweep. Each batch commits on its own, so
+    borrows and returns are never held up for the whole sweep.
+
+    1. Loans written since the last sweep (queued in loan_fee_changes by
+       triggers, which also drop their stale rows) are repriced if still open.
+    2. On a new day, open loans that fell due since the last swept day are
+       added, paged by (due_day, id) along idx_borrow_records_open_due.
+    3. On a new day, rows priced for an earlier day are repriced, except
+       final ones: a fee at the cap can no longer change.
+
+    Every batch is read inside the write transaction that stores it, so no
+    read cursor is left open across a commit (which would deadlock under the
+    rollback journal, where a reader's SHARED lock blocks the commit).
+
+    Args:
+        as_of: Date fees are assessed on
+        price: fn(due_dates) -> (days_overdue, fee_amount, valid) lists, e.g.
+               fee_engine.price_due_dates with the date bound
+        batch_size: Loans priced per transaction
+        final_fee: Fee that can no longer grow (the cap); rows priced at it
+                   are marked final and skipped by later sweeps
+
+    Returns:
+        dict: changed, newly_overdue and aged loan counts, and the swept day
+    """
+    today = epoch_day(as_of)
+    last = get_fee_sweep_day()
+    report = {'swept_day': today, 'changed': 0, 'newly_overdue': 0, 'aged': 0}
+    loan_sql = '''SELECT id, patron_id, book_id, due_date, due_day FROM borrow_records'''
+
+    while True:
+        with transaction() as conn:
+            ids = [row[0] for row in conn.execute(
+                'SELECT borrow_record_id FROM loan_fee_changes ORDER BY borrow_record_id LIMIT ?',
+                (batch_size,))]
+            if not ids:
+                break
+            marks = ','.join('?' * len(ids))
+            conn.execute(f'DELETE FROM loan_fee_changes WHERE borrow_record_id IN ({marks})', ids)
+            rows = conn.execute(f'{loan_sql} WHERE id IN ({marks}) AND return_date IS NULL', ids).fetchall()
+            _store_loan_fees(conn, rows, today, price, final_fee)
+            report['changed'] += len(ids)
+
+    if last != today:
+        after = (last if last is not None else -(1 << 62), 0)
+        while True:
+            with transaction() as conn:
+                rows = conn.execute(f'''
+                    {loan_sql}
+                    WHERE (return_date IS NULL) = 1 AND due_day < ? AND (due_day, id) > (?, ?)
+                    ORDER BY due_day, id LIMIT ?
+                ''', (today, *after, batch_size)).fetchall()
+                if not rows:
+                    break
+                report['newly_overdue'] += _store_loan_fees(conn, rows, today, price, final_fee)
+            after = (rows[-1]['due_day'], rows[-1]['id'])
+
+        while True:
+            with transaction() as conn:
+                rows = conn.execute('''
+                    SELECT br.id, br.patron_id, br.book_id, br.due_date, br.due_day
+                    FROM loan_fees lf JOIN borrow_records br ON br.id = lf.borrow_record_id
+                    WHERE lf.swept_day < ? AND lf.final = 0 LIMIT ?
+                ''', (today, batch_size)).fetchall()
+                if not rows:
+                    break
+                report['aged'] += _store_loan_fees(conn, rows, today, price, final_fee)
+
+    with transaction() as conn:
+        conn.execute('''
+            INSERT INTO fee_sweeps (id, swept_day, swept_at) VALUES (1, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET swept_day = excluded.swept_day, swept_at = excluded.swept_at
+        ''', (today, datetime.now().isoformat()))
+    return report
+
+def get_active_loan_fee(patron_id: str, book_id: int, as_of_day: int) -> Optional[Dict]:
+    """
+    Get the patron's oldest open loan of a book, with its materialized
+    days_overdue and fee_amount when loan_fees holds a row valid on
+    `as_of_day` (both None otherwise).
+    """
+    with read_connection() as conn:
+        row = conn.execute(f'''
+            SELECT br.id AS loan_id, br.due_date, {LOAN_FEE_COLUMNS}
+            FROM borrow_records br
+            LEFT JOIN loan_fees lf ON {LOAN_FEE_JOIN}
+            WHERE br.patron_id = ? AND br.book_id = ? AND br.return_date IS NULL
+            ORDER BY br.borrow_date LIMIT 1
+        ''', (as_of_day, as_of_day, as_of_day, patron_id, book_id)).fetchone()
+    return dict(row) if row else None
+
+def iter_open_loans(batch_size: int = 10000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Stream every open borrow record in batches via fetchmany, so memory stays
+    bounded however many loans are outstanding.
+    
+    Yields:
+        list: Rows with id, patron_id, book_id and due_date
+    """
+    return _iter_batches('''
+        SELECT id, patron_id, book_id, due_date FROM borrow_records 
+        WHERE return_date IS NULL
+    ''', (), batch_size)
+
+def iter_books(batch_size: int = 10000) -> Iterator[List[sqlite3.Row]]:
+    """Stream the whole books table in id order, in fetchmany batches."""
+    return _iter_batches(
+        'SELECT id, title, author, isbn, total_copies, available_copies FROM books ORDER BY id',
+        (), batch_size
+    )
+
+def iter_borrow_records(batch_size: int = 10000, patron_id: Optional[str] = None) -> Iterator[List[sqlite3.Row]]:
+    """Stream borrow records (optionally one patron's) in id order, in fetchmany batches."""
+    sql = 'SELECT id, patron_id, book_id, borrow_date, due_date, return_date FROM borrow_records'
+    if patron_id is None:
+        return _iter_batches(sql + ' ORDER BY id', (), batch_size)
+    return _iter_batches(sql + ' WHERE patron_id = ? ORDER BY id', (patron_id,), batch_size)
 
 def get_patron_borrow_count(patron_id: str) -> int:
-    """Get the number of books currently borrowed by a patron."""
-    conn = get_db_connection()
-    count = conn.execute('''
-        SELECT COUNT(*) as count FROM borrow_records 
-        WHERE patron_id = ? AND return_date IS NULL
-    ''', (patron_id,)).fetchone()['count']
-    conn.close()
-    return count
+    """Get the number of books currently borrowed by a patron (a patrons primary-key lookup)."""
+    with read_connection() as conn:
+        row = conn.execute(
+            'SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)
+        ).fetchone()
+    return row['active_loans'] if row else 0
 
 def insert_book(title: str, author: str, isbn: str, total_copies: int, available_copies: int) -> bool:
     """Insert a new book into the database."""
-    conn = get_db_connection()
-    try:
-        conn.execute('''
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO books (title, author, isbn, total_copies, available_copies)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (title, author, isbn, total_copies, available_copies))
+            conn.commit()
+            _bump_catalog_version()
+            return True
+        except Exception as e:
+            return False
+
+def insert_books_bulk(rows: List[Tuple[str, str, str, int, int]]) -> int:
+    """
+    Insert many books in one transaction with executemany. Rows whose ISBN is
+    already in the catalog (or earlier in `rows`) are skipped by the UNIQUE
+    index instead of being looked up one by one.
+    
+    Args:
+        rows: (title, author, isbn, total_copies, available_copies) tuples
+        
+    Returns:
+        int: Number of books actually inserted
+    """
+    with transaction() as conn:
+        cursor = conn.executemany('''
             INSERT INTO books (title, author, isbn, total_copies, available_copies)
             VALUES (?, ?, ?, ?, ?)
-        ''', (title, author, isbn, total_copies, available_copies))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+            ON CONFLICT (isbn) DO NOTHING
+        ''', rows)
+        # rowcount sums changes() per row, which leaves out skipped rows and FTS trigger writes
+        inserted = cursor.rowcount
+    if inserted:
+        _bump_catalog_version()
+    return inserted
 
 def insert_borrow_record(patron_id: str, book_id: int, borrow_date: datetime, due_date: datetime) -> bool:
     """Insert a new borrow record into the database."""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
+                VALUES (?, ?, ?, ?)
+            ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
+            conn.commit()
+            return True
+        except Exception as e:
+            return False
+
+def update_book_availability(book_id: int, change: int) -> bool:
+    """
+    Update the available copies of a book by a given amount (+1 for return, -1 for borrow).
+    Returns False, changing nothing, if the result would fall outside 0..total_copies.
+    """
+    with db_connection() as conn:
+        try:
+            cursor = conn.execute('''
+                UPDATE books SET available_copies = available_copies + ?
+                WHERE id = ? AND available_copies + ? BETWEEN 0 AND total_copies
+            ''', (change, book_id, change))
+            conn.commit()
+        except Exception as e:
+            return False
+    if cursor.rowcount != 1:
+        return False
+    _invalidate_book(book_id)
+    return True
+
+def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
+    """Update the return date for a borrow record."""
+    with db_connection() as conn:
+        try:
+            conn.execute('''
+                UPDATE borrow_records 
+                SET return_date = ? 
+                WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ''', (return_date.isoformat(), patron_id, book_id))
+            conn.commit()
+            return True
+        except Exception as e:
+            return False
+
+# Unit-of-work operations (one transaction, one commit)
+
+@retry_on_busy
+def borrow_book_atomic(patron_id: str, book_id: int, borrow_date: datetime,
+                       due_date: datetime, max_borrowed: int) -> Tuple[str, Optional[Book]]:
+    """
+    Check availability and the patron's limit, reserve a copy and insert the
+    borrow record in a single transaction. Retried on SQLITE_BUSY.
+
+    A patron whose hold on the book is ready borrows the copy set aside for
+    them; any live hold the patron had on the book is marked fulfilled.
+
+    Returns:
+        tuple: (status, book) where status is 'ok', 'not_found', 'unavailable'
+        or 'limit_reached' and book is the row as it was before the borrow.
+    """
+    with transaction() as conn:
+        book = conn.execute(f'SELECT {BOOK_COLUMNS} FROM books WHERE id = ?', (book_id,)).fetchone()
+        if book is None:
+            return 'not_found', None
+        book = Book(*book)
+        hold = conn.execute('''
+            SELECT id, status FROM holds
+            WHERE patron_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+        ''', (patron_id, book_id)).fetchone()
+        ready = hold is not None and hold['status'] == 'ready'
+        if not ready and book['available_copies'] <= 0:
+            return 'unavailable', book
+
+        row = conn.execute(
+            'SELECT active_loans FROM patrons WHERE patron_id = ?', (patron_id,)
+        ).fetchone()
+        count = row['active_loans'] if row else 0
+        if count > max_borrowed:
+            return 'limit_reached', book
+
+        # A ready hold's copy is already off the shelf; otherwise take one
+        if not ready and not reserve_copy(conn, book_id):
+            return 'unavailable', book
+        if hold is not None:
+            conn.execute("UPDATE holds SET status = 'fulfilled' WHERE id = ?", (hold['id'],))
         conn.execute('''
             INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date)
             VALUES (?, ?, ?, ?)
         ''', (patron_id, book_id, borrow_date.isoformat(), due_date.isoformat()))
-        conn.commit()
-        conn.close()
-        return True
-    except Exception as e:
-        conn.close()
-        return False
+    _invalidate_book(book_id)
+    return 'ok', book
+
+@retry_on_busy
+def return_book_atomic(patron_id: str, book_id: int, return_date: datetime,
+                       pickup_days: int = 3) -> Tuple[str, Optional[Dict]]:
+    """
+    Close the patron's oldest open borrow record for a book and put the copy
+    back in a single transaction. Retried on SQLITE_BUSY.
+
+    If patrons are waiting for the book, the copy goes to the head of the
+    queue instead: their hold becomes 'ready' for `pickup_days` days.
+
+    Returns:
+        tuple: (status, loan) where status is 'ok', 'not_found' or 'not_borrowed'
+        and loan is the oldest open borrow record that was closed.
+    """
+    with transaction() as conn:
+        book = conn.execute('SELECT id FROM books WHERE id = ?', (book_id,)).fetchone()
+        if book is None:
+            return 'not_found', None
+
+        loan = conn.execute('''
+            SELECT * FROM borrow_records 
+            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+            ORDER BY borrow_date LIMIT 1
+        ''', (patron_id, book_id)).fetchone()
+        if loan is None:
+            return 'not_borrowed', None
 
-def update_book_availability(book_id: int, change: int) -> bool:
-    """Update the available copies of a book by a given amount (+1 for return, -1 for borrow)."""
-    conn = get_db_connection()
-    try:
         conn.execute('''
-            UPDATE books SET available_copies = available_copies + ? WHERE id = ?
-        ''', (change, book_id))
-        conn.commit()
-        conn.close()
+            UPDATE borrow_records SET return_date = ? WHERE id = ? AND return_date IS NULL
+        ''', (return_date.isoformat(), loan['id']))
+        _pass_copy_on(conn, book_id, datetime.now(), pickup_days)
+    _invalidate_book(book_id)
+    return 'ok', dict(loan)
+
+# Holds (waitlist) for unavailable books
+
+def _pass_copy_on(conn, book_id: int, now: datetime, pickup_days: int) -> Optional[str]:
+    """
+    Hand a freed copy to the first waiting hold, or put it back on the shelf.
+
+    Returns:
+        str: The patron whose hold became ready, or None if the copy was shelved
+    """
+    hold = conn.execute('''
+        SELECT id, patron_id FROM holds
+        WHERE book_id = ? AND status = 'waiting'
+        ORDER BY position LIMIT 1
+    ''', (book_id,)).fetchone()
+    if hold is None:
+        release_copy(conn, book_id)
+        return None
+    conn.execute('''
+        UPDATE holds SET status = 'ready', ready_at = ?, expires_at = ? WHERE id = ?
+    ''', (now.isoformat(), (now + timedelta(days=pickup_days)).isoformat(), hold['id']))
+    return hold['patron_id']
+
+@retry_on_busy
+def place_hold_atomic(patron_id: str, book_id: int, now: datetime) -> Tuple[str, Optional[Dict]]:
+    """
+    Add the patron to the end of a book's hold queue.
+
+    Returns:
+        tuple: (status, hold) where status is 'ok', 'not_found', 'available'
+        (a copy is on the shelf), 'already_borrowed' or 'duplicate', and hold
+        has the new hold's id, position and place in the queue.
+    """
+    with transaction() as conn:
+        book = conn.execute('SELECT available_copies FROM books WHERE id = ?', (book_id,)).fetchone()
+        if book is None:
+            return 'not_found', None
+        if book['available_copies'] > 0:
+            return 'available', None
+        if conn.execute('''
+            SELECT 1 FROM holds WHERE patron_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+        ''', (patron_id, book_id)).fetchone():
+            return 'duplicate', None
+        if conn.execute('''
+            SELECT 1 FROM borrow_records WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
+        ''', (patron_id, book_id)).fetchone():
+            return 'already_borrowed', None
+
+        position = conn.execute(
+            'SELECT COALESCE(MAX(position), 0) + 1 FROM holds WHERE book_id = ?', (book_id,)
+        ).fetchone()[0]
+        cursor = conn.execute('''
+            INSERT INTO holds (book_id, patron_id, position, status, created_at)
+            VALUES (?, ?, ?, 'waiting', ?)
+        ''', (book_id, patron_id, position, now.isoformat()))
+        ahead = conn.execute('''
+            SELECT COUNT(*) FROM holds WHERE book_id = ? AND status = 'waiting' AND position < ?
+        ''', (book_id, position)).fetchone()[0]
+    return 'ok', {'id': cursor.lastrowid, 'book_id': book_id, 'patron_id': patron_id,
+                  'position': position, 'queue_position': ahead + 1}
+
+@retry_on_busy
+def cancel_hold_atomic(patron_id: str, book_id: int, now: datetime,
+                       pickup_days: int = 3) -> Tuple[str, Optional[Dict]]:
+    """
+    Cancel the patron's live hold on a book. Cancelling a ready hold passes
+    its set-aside copy to the next waiting patron, or back to the shelf.
+
+    Returns:
+        tuple: (status, hold) where status is 'ok' or 'not_found'
+    """
+    with transaction() as conn:
+        hold = conn.execute('''
+            SELECT * FROM holds WHERE patron_id = ? AND book_id = ? AND status IN ('waiting', 'ready')
+        ''', (patron_id, book_id)).fetchone()
+        if hold is None:
+            return 'not_found', None
+        conn.execute("UPDATE holds SET status = 'cancelled' WHERE id = ?", (hold['id'],))
+        if hold['status'] == 'ready':
+            _pass_copy_on(conn, book_id, now, pickup_days)
+    if hold['status'] == 'ready':
+        _invalidate_book(book_id)
+    return 'ok', dict(hold)
+
+@retry_on_busy
+def expire_ready_holds(now: datetime, pickup_days: int = 3) -> int:
+    """
+    Expire ready holds whose pickup window has passed, passing each set-aside
+    copy on to the next waiting patron or back to the shelf.
+
+    Returns:
+        int: Number of holds expired
+    """
+    with transaction() as conn:
+        expired = conn.execute('''
+            SELECT id, book_id FROM holds WHERE status = 'ready' AND expires_at < ?
+            ORDER BY expires_at
+        ''', (now.isoformat(),)).fetchall()
+        for hold in expired:
+            conn.execute("UPDATE holds SET status = 'expired' WHERE id = ?", (hold['id'],))
+            _pass_copy_on(conn, hold['book_id'], now, pickup_days)
+    for book_id in {hold['book_id'] for hold in expired}:
+        _invalidate_book(book_id)
+    return len(expired)
+
+def get_patron_holds(patron_id: str) -> List[Dict]:
+    """Get a patron's live holds, each with its book title and place in the queue."""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT h.id, h.book_id, b.title, h.status, h.position, h.created_at, h.expires_at,
+                   CASE WHEN h.status = 'waiting' THEN (
+                       SELECT COUNT(*) FROM holds w
+                       WHERE w.book_id = h.book_id AND w.status = 'waiting' AND w.position <= h.position
+                   ) END AS queue_position
+            FROM holds h JOIN books b ON b.id = h.book_id
+            WHERE h.patron_id = ? AND h.status IN ('waiting', 'ready')
+            ORDER BY h.created_at, h.id
+        ''', (patron_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def get_book_holds(book_id: int) -> List[Dict]:
+    """Get the waiting queue for a book, first in line first."""
+    with read_connection() as conn:
+        rows = conn.execute('''
+            SELECT id, patron_id, position, created_at FROM holds
+            WHERE book_id = ? AND status = 'waiting'
+            ORDER BY position
+        ''', (book_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+def insert_payment_allocations(transaction_id: str, patron_id: str, allocations: List[Dict]) -> bool:
+    """
+    Record how a single gateway charge was split across loans.
+    
+    Args:
+        transaction_id: Gateway transaction ID of the charge
+        patron_id: Patron who paid
+        allocations: Dicts with loan_id, book_id and amount
+    """
+    created_at = datetime.now().isoformat()
+    try:
+        with transaction() as conn:
+            conn.executemany('''
+                INSERT INTO payment_allocations 
+                    (transaction_id, patron_id, borrow_record_id, book_id, amount, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', [(transaction_id, patron_id, a['loan_id'], a['book_id'], a['amount'], created_at)
+                  for a in allocations])
         return True
     except Exception as e:
-        conn.close()
         return False
 
-def update_borrow_record_return_date(patron_id: str, book_id: int, return_date: datetime) -> bool:
-    """Update the return date for a borrow record."""
-    conn = get_db_connection()
+def get_payment_allocations(transaction_id: str) -> List[Dict]:
+    """Get the per-loan allocation of a gateway charge."""
+    with db_connection() as conn:
+        rows = conn.execute('''
+            SELECT * FROM payment_allocations WHERE transaction_id = ? ORDER BY id
+        ''', (transaction_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+# Payments ledger
+
+def begin_payment(idempotency_key: str, kind: str, amount: float, patron_id: Optional[str] = None,
+                  book_id: Optional[int] = None, borrow_record_id: Optional[int] = None,
+                  parent_transaction_id: Optional[str] = None,
+                  refund_limit: Optional[float] = None) -> Tuple[bool, Optional[Dict]]:
+    """
+    Claim an idempotency key before calling the gateway.
+    
+    A new key is recorded as 'pending'. A key whose earlier attempt 'failed'
+    or hit an 'error' is claimed again for the retry. A key that is 'pending'
+    or 'completed' is not claimed, and the caller should answer from the row.
+    
+    A key already recorded for a different payment (kind, patron, book,
+    amount or parent transaction) is never claimed or replayed; the caller
+    gets an unsaved entry with status 'conflict' and a message instead.
+    
+    With refund_limit, a refund is also refused when it would take the
+    pending and completed refunds against parent_transaction_id above the
+    limit. The check runs inside the claiming transaction, so two concurrent
+    refunds cannot both pass it.
+    
+    Returns:
+        tuple: (claimed: bool, ledger row, or None when refund_limit refused the claim)
+    """
+    now = datetime.now().isoformat()
+    with transaction() as conn:
+        row = conn.execute('SELECT * FROM payments WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+        if row is not None and (row['kind'], row['patron_id'], row['book_id'], round(row['amount'], 2),
+                                row['parent_transaction_id']) != \
+                (kind, patron_id, book_id, round(amount, 2), parent_transaction_id):
+            return False, {'idempotency_key': idempotency_key, 'status': 'conflict',
+                           'message': 'Idempotency key was already used for a different payment.'}
+        if row is not None and row['status'] not in ('failed', 'error'):
+            return False, dict(row)
+        if refund_limit is not None:
+            already = _refunded_total(conn, parent_transaction_id, idempotency_key)
+            if round(already + amount, 2) > refund_limit:
+                return False, None
+        if row is None:
+            conn.execute('''
+                INSERT INTO payments (idempotency_key, kind, patron_id, book_id, borrow_record_id, amount,
+                                      status, parent_transaction_id, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, 'pending', ?, ?, ?)
+            ''', (idempotency_key, kind, patron_id, book_id, borrow_record_id, amount,
+                  parent_transaction_id, now, now))
+        else:
+            conn.execute('''
+                UPDATE payments SET status = 'pending', message = NULL, updated_at = ? 
+                WHERE idempotency_key = ?
+            ''', (now, idempotency_key))
+        row = conn.execute('SELECT * FROM payments WHERE idempotency_key = ?', (idempotency_key,)).fetchone()
+    return True, dict(row)
+
+def finish_payment(idempotency_key: str, status: str, transaction_id: Optional[str] = None,
+                   message: Optional[str] = None) -> bool:
+    """Record the gateway outcome ('completed', 'failed' or 'error') for a claimed key."""
     try:
-        conn.execute('''
-            UPDATE borrow_records 
-            SET return_date = ? 
-            WHERE patron_id = ? AND book_id = ? AND return_date IS NULL
-        ''', (return_date.isoformat(), patron_id, book_id))
-        conn.commit()
-        conn.close()
+        with transaction() as conn:
+            conn.execute('''
+                UPDATE payments SET status = ?, transaction_id = ?, message = ?, updated_at = ? 
+                WHERE idempotency_key = ?
+            ''', (status, transaction_id, message, datetime.now().isoformat(), idempotency_key))
         return True
     except Exception as e:
-        conn.close()
         return False
+
+def get_payment_by_transaction(transaction_id: str) -> Optional[Dict]:
+    """Get the ledger entry of a completed charge by gateway transaction ID."""
+    with db_connection() as conn:
+        row = conn.execute('''
+            SELECT * FROM payments 
+            WHERE transaction_id = ? AND kind = 'charge' AND status = 'completed'
+        ''', (transaction_id,)).fetchone()
+    return dict(row) if row else None
+
+def get_refunded_total(transaction_id: str, exclude_key: Optional[str] = None) -> float:
+    """Get the total of completed and in-flight refunds against a charge, optionally ignoring one key."""
+    with db_connection() as conn:
+        return _refunded_total(conn, transaction_id, exclude_key)
+
+def get_paid_loan_ids(loan_ids: List[int], exclude_key: Optional[str] = None) -> Set[int]:
+    """
+    Get which of the given loans already have a completed late fee charge,
+    either their own or a share of a pay-all charge, optionally ignoring one key.
+    """
+    if not loan_ids:
+        return set()
+    marks = ','.join('?' * len(loan_ids))
+    with read_connection() as conn:
+        rows = conn.execute(f'''
+            SELECT borrow_record_id FROM payments 
+            WHERE borrow_record_id IN ({marks}) AND kind = 'charge' AND status = 'completed'
+              AND idempotency_key IS NOT ?
+            UNION ALL
+            SELECT pa.borrow_record_id FROM payment_allocations pa 
+            JOIN payments p ON p.transaction_id = pa.transaction_id
+            WHERE pa.borrow_record_id IN ({marks}) AND p.kind = 'charge' AND p.status = 'completed'
+              AND p.idempotency_key IS NOT ?
+        ''', (*loan_ids, exclude_key, *loan_ids, exclude_key)).fetchall()
+    return {row['borrow_record_id'] for row in rows}
+
+def _refunded_total(conn, transaction_id: str, exclude_key: Optional[str]) -> float:
+    total = conn.execute('''
+        SELECT COALESCE(SUM(amount), 0) AS total FROM payments 
+        WHERE parent_transaction_id = ? AND kind = 'refund' AND status IN ('pending', 'completed')
+          AND idempotency_key IS NOT ?
+    ''', (transaction_id, exclude_key)).fetchone()['total']
+    return round(total, 2)
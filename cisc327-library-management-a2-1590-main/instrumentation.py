@@ -0,0 +1,305 @@
+"""
+Request instrumentation for the Library Management System.
+
+SQL side: pooled connections are opened as InstrumentedConnection, whose
+cursors add their statement count, fetched rows and time to the QueryStats of
+the current request (a ContextVar, so threads never mix their numbers). When
+no request is being tracked the overhead is one ContextVar lookup per call.
+
+Web side: init_app() wraps every request to emit a Server-Timing header,
+feed the Prometheus-style counters served at /metrics, and run a sampled
+fraction of requests under cProfile, keeping the profiles of the slow ones.
+"""
+
+import cProfile
+import io
+import pstats
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# Runtime configuration
+PROFILE_SAMPLE_RATE = 0.01      # fraction of requests run under cProfile
+SLOW_REQUEST_SECONDS = 0.5      # sampled requests slower than this keep their profile
+SLOW_PROFILES_KEPT = 20
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+class QueryStats:
+    """Connections, statements, rows and SQL time accumulated for one request."""
+
+    __slots__ = ('checkouts', 'connects', 'queries', 'rows', 'sql_time')
+
+    def __init__(self):
+        self.checkouts = 0     # connections taken from a pool
+        self.connects = 0      # of which newly opened
+        self.queries = 0
+        self.rows = 0
+        self.sql_time = 0.0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar('library_query_stats', default=None)
+
+
+def start_tracking() -> Tuple[QueryStats, object]:
+    """Begin collecting QueryStats in this context; pass the token to stop_tracking()."""
+    stats = QueryStats()
+    return stats, _current.set(stats)
+
+
+def stop_tracking(token) -> None:
+    _current.reset(token)
+
+
+def record_checkout(created: bool) -> None:
+    """Called by the connection pool each time it hands out a connection."""
+    stats = _current.get()
+    if stats is not None:
+        stats.checkouts += 1
+        stats.connects += created
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that charges statements, fetched rows and elapsed time to the current request."""
+
+    def execute(self, sql, parameters=()):
+        stats = _current.get()
+        if stats is None:
+            return super().execute(sql, parameters)
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            stats.queries += 1
+            stats.sql_time += time.perf_counter() - start
+
+    def executemany(self, sql, seq_of_parameters):
+        stats = _current.get()
+        if stats is None:
+            return super().executemany(sql, seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            stats.queries += 1
+            stats.sql_time += time.perf_counter() - start
+
+    def fetchone(self):
+        stats = _current.get()
+        if stats is None:
+            return super().fetchone()
+        start = time.perf_counter()
+        row = super().fetchone()
+        stats.sql_time += time.perf_counter() - start
+        stats.rows += row is not None
+        return row
+
+    def fetchmany(self, size=None):
+        stats = _current.get()
+        if stats is None:
+            return super().fetchmany(self.arraysize if size is None else size)
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        stats.sql_time += time.perf_counter() - start
+        stats.rows += len(rows)
+        return rows
+
+    def fetchall(self):
+        stats = _current.get()
+        if stats is None:
+            return super().fetchall()
+        start = time.perf_counter()
+        rows = super().fetchall()
+        stats.sql_time += time.perf_counter() - start
+        stats.rows += len(rows)
+        return rows
+
+    def __next__(self):
+        row = super().__next__()
+        stats = _current.get()
+        if stats is not None:
+            stats.rows += 1
+        return row
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose shortcut execute methods go through InstrumentedCursor."""
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+class Metrics:
+    """Process-wide request and SQL counters rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        self.durations: Dict[str, List] = {}       # endpoint -> [bucket counts..., count, sum]
+        self.db: Dict[str, Dict[str, float]] = {}  # endpoint -> queries/rows/checkouts/connects/seconds
+        self.slow_profiles = deque(maxlen=SLOW_PROFILES_KEPT)
+
+    def observe(self, endpoint: str, method: str, status: int, seconds: float, stats: QueryStats) -> None:
+        with self._lock:
+            key = (endpoint, method, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            hist = self.durations.get(endpoint)
+            if hist is None:
+                hist = self.durations[endpoint] = [0] * len(DURATION_BUCKETS) + [0, 0.0]
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    hist[i] += 1
+            hist[-2] += 1
+            hist[-1] += seconds
+            db = self.db.get(endpoint)
+            if db is None:
+                db = self.db[endpoint] = {'queries': 0, 'rows': 0, 'checkouts': 0, 'connects': 0,
+                                          'seconds': 0.0}
+            db['queries'] += stats.queries
+            db['rows'] += stats.rows
+            db['checkouts'] += stats.checkouts
+            db['connects'] += stats.connects
+            db['seconds'] += stats.sql_time
+
+    def render(self, gauges: Dict[str, float] = None) -> str:
+        """Render every metric in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            lines += ['# HELP library_requests_total HTTP requests served.',
+                      '# TYPE library_requests_total counter']
+            for (endpoint, method, status), n in sorted(self.requests.items()):
+                lines.append(f'library_requests_total{{endpoint="{endpoint}",method="{method}",'
+                             f'status="{status}"}} {n}')
+
+            lines += ['# HELP library_request_duration_seconds Request wall time.',
+                      '# TYPE library_request_duration_seconds histogram']
+            for endpoint, hist in sorted(self.durations.items()):
+                for bound, n in zip(DURATION_BUCKETS, hist):
+                    lines.append(f'library_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {n}')
+                lines.append(f'library_request_duration_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {hist[-2]}')
+                lines.append(f'library_request_duration_seconds_count{{endpoint="{endpoint}"}} {hist[-2]}')
+                lines.append(f'library_request_duration_seconds_sum{{endpoint="{endpoint}"}} {hist[-1]:.6f}')
+
+            for field, name, help_text in (
+                    ('queries', 'library_db_queries_total', 'SQL statements executed.'),
+                    ('rows', 'library_db_rows_total', 'Rows fetched.'),
+                    ('checkouts', 'library_db_connection_checkouts_total', 'Pooled connections handed out.'),
+                    ('connects', 'library_db_connections_opened_total', 'New SQLite connections opened.'),
+                    ('seconds', 'library_db_seconds_total', 'Time spent executing SQL and fetching rows.')):
+                lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+                for endpoint, db in sorted(self.db.items()):
+                    value = db[field]
+                    lines.append(f'{name}{{endpoint="{endpoint}"}} '
+                                 + (f'{value:.6f}' if field == 'seconds' else str(int(value))))
+
+        for name, value in sorted((gauges or {}).items()):
+            lines += [f'# TYPE {name} gauge', f'{name} {value}']
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def _profile_text(profiler: cProfile.Profile, limit: int = 25) -> str:
+    out = io.StringIO()
+    pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(limit)
+    return out.getvalue()
+
+
+def get_slow_profiles() -> List[Dict]:
+    """Most recent sampled requests that exceeded SLOW_REQUEST_SECONDS, newest last."""
+    with metrics._lock:
+        return list(metrics.slow_profiles)
+
+
+def init_app(app, sample_rate: Optional[float] = None) -> None:
+    """
+    Instrument every request of a Flask app and add the /metrics and
+    /metrics/profiles endpoints.
+    """
+    import random
+    from flask import Response, g, request
+    from database import get_pool_stats, get_book_cache_stats
+
+    rate = PROFILE_SAMPLE_RATE if sample_rate is None else sample_rate
+    sampler = random.Random()
+
+    @app.before_request
+    def _start_request():
+        g._instrument_start = time.perf_counter()
+        g._instrument_stats, g._instrument_token = start_tracking()
+        g._instrument_profiler = None
+        if rate and sampler.random() < rate:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is already active in this thread
+                return
+            g._instrument_profiler = profiler
+
+    @app.after_request
+    def _finish_request(response):
+        start = g.pop('_instrument_start', None)
+        if start is None:
+            return response
+        elapsed = time.perf_counter() - start
+        stats = g.pop('_instrument_stats')
+        stop_tracking(g.pop('_instrument_token'))
+        profiler = g.pop('_instrument_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe(endpoint, request.method, response.status_code, elapsed, stats)
+        response.headers['Server-Timing'] = (
+            f'db;dur={stats.sql_time * 1000:.2f};desc="{stats.queries} queries, {stats.rows} rows, '
+            f'{stats.checkouts} conns", app;dur={(elapsed - stats.sql_time) * 1000:.2f}, '
+            f'total;dur={elapsed * 1000:.2f}'
+        )
+        if profiler is not None and elapsed >= SLOW_REQUEST_SECONDS:
+            entry = {'endpoint': endpoint, 'path': request.full_path, 'seconds': round(elapsed, 4),
+                     'queries': stats.queries, 'profile': _profile_text(profiler)}
+            with metrics._lock:
+                metrics.slow_profiles.append(entry)
+            app.logger.warning('slow request %s took %.3fs (%d queries)', request.full_path, elapsed,
+                               stats.queries)
+        return response
+
+    @app.teardown_request
+    def _abandon_request(exc):
+        # after_request does not run when a view raises; still release the profiler/ContextVar
+        profiler = g.pop('_instrument_profiler', None)
+        if profiler is not None:
+            profiler.disable()
+        token = g.pop('_instrument_token', None)
+        if token is not None:
+            stop_tracking(token)
+
+    def metrics_view():
+        pool = get_pool_stats()
+        reader = get_pool_stats(readonly=True)
+        cache = get_book_cache_stats()
+        gauges = {
+            'library_db_pool_open_connections': pool['open'] + reader['open'],
+            'library_db_pool_waits_total': pool['waits'] + reader['waits'],
+            'library_book_cache_hits_total': cache['hits'],
+            'library_book_cache_misses_total': cache['misses'],
+        }
+        return Response(metrics.render(gauges), mimetype='text/plain; version=0.0.4')
+
+    def profiles_view():
+        text = '\n\n'.join(f"# {p['path']} {p['seconds']}s {p['queries']} queries\n{p['profile']}"
+                           for p in get_slow_profiles())
+        return Response(text or 'no slow requests sampled\n', mimetype='text/plain')
+
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    app.add_url_rule('/metrics/profiles', 'metrics_profiles', profiles_view)
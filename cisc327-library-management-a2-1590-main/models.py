@@ -0,0 +1,121 @@
+"""
+Record types for rows returned by the database helpers.
+
+Each record stores its columns in __slots__ instead of a per-row dict and is
+read-only: neither items nor attributes can be assigned once it is built, so
+the book cache can hand one instance to every caller. Records are also Mappings, so book['title'], book.get('title'),
+dict(book) and comparisons against plain dicts keep working in services,
+templates and tests.
+"""
+
+from collections.abc import Mapping
+from datetime import date, datetime, timedelta
+from typing import Dict, Tuple
+
+# Records bypass their own __setattr__ guard to fill slots in __init__ and lazy properties
+_set = object.__setattr__
+
+
+class Record(Mapping):
+    """Base class: a read-only, dict-compatible view over slot attributes named in _fields."""
+
+    __slots__ = ()
+    _fields: Tuple[str, ...] = ()
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __repr__(self):
+        values = ', '.join(f'{name}={getattr(self, name)!r}' for name in self._fields)
+        return f'{type(self).__name__}({values})'
+
+    def _asdict(self) -> Dict:
+        return {name: getattr(self, name) for name in self._fields}
+
+
+class Book(Record):
+    """One row of the books table."""
+
+    __slots__ = _fields = ('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies')
+
+    def __init__(self, id: int, title: str, author: str, isbn: str,
+                 total_copies: int, available_copies: int):
+        _set(self, 'id', id)
+        _set(self, 'title', title)
+        _set(self, 'author', author)
+        _set(self, 'isbn', isbn)
+        _set(self, 'total_copies', total_copies)
+        _set(self, 'available_copies', available_copies)
+
+
+class Loan(Record):
+    """
+    One active loan as returned by get_patron_borrowed_books.
+
+    Dates are kept as the stored ISO strings and parsed on first access;
+    is_overdue compares against the `now` captured once for the whole query.
+    """
+
+    __slots__ = ('book_id', 'title', 'author', '_borrow_raw', '_due_raw', '_now', '_borrow', '_due')
+    _fields = ('book_id', 'title', 'author', 'borrow_date', 'due_date', 'is_overdue')
+
+    def __init__(self, book_id: int, title: str, author: str, borrow_date: str, due_date: str,
+                 now: datetime):
+        _set(self, 'book_id', book_id)
+        _set(self, 'title', title)
+        _set(self, 'author', author)
+        _set(self, '_borrow_raw', borrow_date)
+        _set(self, '_due_raw', due_date)
+        _set(self, '_now', now)
+        _set(self, '_borrow', None)
+        _set(self, '_due', None)
+
+    @property
+    def borrow_date(self) -> datetime:
+        if self._borrow is None:
+            _set(self, '_borrow', datetime.fromisoformat(self._borrow_raw))
+        return self._borrow
+
+    @property
+    def due_date(self) -> datetime:
+        if self._due is None:
+            _set(self, '_due', datetime.fromisoformat(self._due_raw))
+        return self._due
+
+    @property
+    def is_overdue(self) -> bool:
+        return self._now > self.due_date
+
+
+class OverdueLoan(Record):
+    """One open, overdue loan as returned by get_overdue_loans."""
+
+    __slots__ = ('loan_id', 'patron_id', 'book_id', 'due_day', 'days_overdue')
+    _fields = ('loan_id', 'patron_id', 'book_id', 'due_date', 'days_overdue')
+
+    _EPOCH = date(1970, 1, 1)
+
+    def __init__(self, loan_id: int, patron_id: str, book_id: int, due_day: int, days_overdue: int):
+        _set(self, 'loan_id', loan_id)
+        _set(self, 'patron_id', patron_id)
+        _set(self, 'book_id', book_id)
+        _set(self, 'due_day', due_day)
+        _set(self, 'days_overdue', days_overdue)
+
+    @property
+    def due_date(self) -> date:
+        return self._EPOCH + timedelta(days=self.due_day)
@@ -2,11 +2,67 @@
 API Routes - JSON API endpoints
 """
 
-from flask import Blueprint, jsonify, request
-from library_service import calculate_late_fee_for_book, search_books_in_catalog
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from services.library_service import (
+    calculate_late_fee_for_book, search_books_in_catalog, get_catalog_page, DEFAULT_PAGE_SIZE,
+    place_hold_for_patron, cancel_hold_for_patron, get_holds_for_patron, get_hold_queue,
+    borrow_book_by_patron, return_book_by_patron, get_patron_status_report,
+    pay_late_fees, pay_all_late_fees, get_payment_status, MAX_SQL_INTEGER
+)
+from services.payment_service import PaymentGateway
+from services.catalog_import import import_books_from_binary, detect_format, FORMATS
+from services.catalog_export import export_rows, DATASETS, EXPORT_FORMATS
+from .response_cache import catalog_cached
 
 api_bp = Blueprint('api', __name__, url_prefix='/api')
 
+# Most items one borrow/return/status request may carry
+MAX_BATCH_SIZE = 100
+# Payments each wait on a blocking gateway call (up to ~0.5 s), so a payment
+# batch is kept small enough not to hold a worker for more than a few seconds
+MAX_PAYMENT_BATCH_SIZE = 5
+
+
+def _request_items(limit: int = MAX_BATCH_SIZE):
+    """
+    Read the JSON body as one item (an object) or a batch of up to `limit` (an array of them).
+    
+    Returns:
+        tuple: (items, batched, error response or None)
+    """
+    data = request.get_json(silent=True)
+    if isinstance(data, dict):
+        return [data], False, None
+    if isinstance(data, list) and data:
+        if len(data) > limit:
+            return None, True, (jsonify({'error': f'At most {limit} items per request'}), 400)
+        return data, True, None
+    return None, False, (jsonify({'error': 'Request body must be a JSON object or a non-empty array'}), 400)
+
+
+def _loan_fields(item):
+    """
+    Pull (patron_id, book_id) out of one request item; book_id is None if
+    missing, invalid or outside the range SQLite can store.
+    """
+    if not isinstance(item, dict):
+        return '', None
+    try:
+        book_id = int(item.get('book_id'))
+    except (ValueError, TypeError):
+        book_id = None
+    if book_id is not None and not -MAX_SQL_INTEGER <= book_id <= MAX_SQL_INTEGER:
+        book_id = None
+    return str(item.get('patron_id', '')).strip(), book_id
+
+
+def _batch_response(results, batched):
+    """One result as-is (400 on failure), or a batch wrapped with its success count (always 200)."""
+    if not batched:
+        return jsonify(results[0]), 200 if results[0]['success'] else 400
+    succeeded = sum(1 for r in results if r['success'])
+    return jsonify({'results': results, 'succeeded': succeeded, 'failed': len(results) - succeeded})
+
 @api_bp.route('/late_fee/<patron_id>/<int:book_id>')
 def get_late_fee(patron_id, book_id):
     """
@@ -17,6 +73,7 @@ def get_late_fee(patron_id, book_id):
     return jsonify(result), 501 if 'not implemented' in result.get('status', '') else 200
 
 @api_bp.route('/search')
+@catalog_cached
 def search_books_api():
     """
     Search for books via API endpoint.
@@ -37,3 +94,213 @@ def search_books_api():
         'results': books,
         'count': len(books)
     })
+
+@api_bp.route('/books')
+@catalog_cached
+def list_books_api():
+    """
+    List the catalog one page at a time via API endpoint.
+    Paginated API interface for R2: Book Catalog Display
+    """
+    cursor = request.args.get('cursor', '').strip() or None
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    available_only = request.args.get('available') == '1'
+    
+    page = get_catalog_page(cursor, page_size, available_only)
+    if 'error' in page:
+        return jsonify(page), 400
+    
+    return jsonify({
+        'results': page['books'],
+        'count': len(page['books']),
+        'page_size': page['page_size'],
+        'available_only': available_only,
+        'next_cursor': page['next_cursor']
+    })
+
+@api_bp.route('/books/import', methods=['POST'])
+def import_books_api():
+    """
+    Bulk-load books from a CSV or JSON Lines feed via API endpoint.
+    Bulk interface for R1: Book Catalog Management
+    
+    Accepts a multipart upload in `file` or the raw feed as the request body.
+    The format comes from ?format=, the upload's file name, or the content type.
+    """
+    upload = request.files.get('file')
+    fmt = request.args.get('format', '').lower()
+    if fmt and fmt not in FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 400
+    
+    if upload is not None:
+        fmt = FORMATS[fmt] if fmt else detect_format(upload.filename)
+        stream = upload.stream
+    else:
+        ndjson = request.mimetype in ('application/x-ndjson', 'application/jsonl')
+        fmt = FORMATS[fmt] if fmt else ('jsonl' if ndjson else 'csv')
+        stream = request.stream
+    
+    report = import_books_from_binary(stream, fmt)
+    return jsonify(report)
+
+@api_bp.route('/export/<dataset>.<fmt>')
+def export_api(dataset, fmt):
+    """
+    Stream the whole books table or the loan history via API endpoint.
+    Bulk export for R2: Book Catalog Display and R7: Patron Status Report
+    
+    /api/export/books.csv, /api/export/loans.ndjson?patron_id=123456, ...
+    """
+    if dataset not in DATASETS:
+        return jsonify({'error': f'Unknown export dataset: {dataset}'}), 404
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'error': f'Unsupported format: {fmt}'}), 404
+    
+    patron_id = request.args.get('patron_id', '').strip() or None
+    chunks = export_rows(dataset, fmt, patron_id=patron_id if dataset == 'loans' else None)
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers={
+        'Content-Disposition': f'attachment; filename="{dataset}.{fmt}"'
+    })
+
+@api_bp.route('/holds', methods=['POST'])
+def place_hold_api():
+    """
+    Join the waitlist for an unavailable book via API endpoint.
+    Takes patron_id and book_id as JSON or form fields.
+    """
+    data = request.get_json(silent=True) or request.form
+    patron_id = str(data.get('patron_id', '')).strip()
+    try:
+        book_id = int(data.get('book_id', ''))
+    except (ValueError, TypeError):
+        return jsonify({'success': False, 'message': 'Invalid book ID.'}), 400
+    
+    success, message = place_hold_for_patron(patron_id, book_id)
+    return jsonify({'success': success, 'message': message}), 201 if success else 400
+
+@api_bp.route('/holds/<patron_id>/<int:book_id>', methods=['DELETE'])
+def cancel_hold_api(patron_id, book_id):
+    """Cancel a patron's hold on a book via API endpoint."""
+    success, message = cancel_hold_for_patron(patron_id, book_id)
+    return jsonify({'success': success, 'message': message}), 200 if success else 404
+
+@api_bp.route('/holds/<patron_id>')
+def list_holds_api(patron_id):
+    """List a patron's waiting and ready holds via API endpoint."""
+    holds = get_holds_for_patron(patron_id)
+    return jsonify({'patron_id': patron_id, 'holds': holds, 'count': len(holds)})
+
+@api_bp.route('/books/<int:book_id>/holds')
+def book_holds_api(book_id):
+    """List the waitlist for a book via API endpoint."""
+    queue = get_hold_queue(book_id)
+    return jsonify({'book_id': book_id, 'queue': queue, 'count': len(queue)})
+
+@api_bp.route('/borrow', methods=['POST'])
+def borrow_api():
+    """
+    Borrow one book, or a batch, via API endpoint.
+    JSON interface for R3: Book Borrowing
+    
+    Body: {"patron_id": "123456", "book_id": 1}, or an array of such objects.
+    """
+    items, batched, error = _request_items()
+    if error:
+        return error
+    
+    results = []
+    for item in items:
+        patron_id, book_id = _loan_fields(item)
+        if book_id is None:
+            results.append({'success': False, 'message': 'Invalid book ID.'})
+            continue
+        success, message = borrow_book_by_patron(patron_id, book_id)
+        results.append({'success': success, 'message': message,
+                        'patron_id': patron_id, 'book_id': book_id})
+    return _batch_response(results, batched)
+
+@api_bp.route('/return', methods=['POST'])
+def return_api():
+    """
+    Return one book, or a batch, via API endpoint.
+    JSON interface for R4: Book Return Processing
+    
+    Body: {"patron_id": "123456", "book_id": 1}, or an array of such objects.
+    """
+    items, batched, error = _request_items()
+    if error:
+        return error
+    
+    results = []
+    for item in items:
+        patron_id, book_id = _loan_fields(item)
+        if book_id is None:
+            results.append({'success': False, 'message': 'Invalid book ID.', 'late_fee': 0.0})
+            continue
+        success, message, fee = return_book_by_patron(patron_id, book_id)
+        results.append({'success': success, 'message': message, 'late_fee': fee,
+                        'patron_id': patron_id, 'book_id': book_id})
+    return _batch_response(results, batched)
+
+@api_bp.route('/patrons/<patron_id>/status')
+def patron_status_api(patron_id):
+    """
+    Get a patron's status report via API endpoint.
+    JSON interface for R7: Patron Status Report
+    """
+    report = get_patron_status_report(patron_id)
+    return jsonify(report), 400 if 'error' in report else 200
+
+@api_bp.route('/patrons/status', methods=['POST'])
+def patron_status_batch_api():
+    """
+    Get status reports for many patrons at once via API endpoint.
+    
+    Body: an array of patron IDs; the reports come back in the same order.
+    """
+    patron_ids = request.get_json(silent=True)
+    if not isinstance(patron_ids, list) or not patron_ids:
+        return jsonify({'error': 'Request body must be a non-empty array of patron IDs'}), 400
+    if len(patron_ids) > MAX_BATCH_SIZE:
+        return jsonify({'error': f'At most {MAX_BATCH_SIZE} items per request'}), 400
+    
+    reports = [get_patron_status_report(str(patron_id)) for patron_id in patron_ids]
+    return jsonify({'results': reports, 'count': len(reports)})
+
+@api_bp.route('/payments', methods=['POST'])
+def pay_api():
+    """
+    Pay late fees, for one payment or a batch, via API endpoint.
+    
+    Body: {"patron_id": "123456", "book_id": 1} pays one book's fee; without
+    book_id, every late fee the patron owes is paid in one charge. An optional
+    "idempotency_key" (a non-empty string) makes retries safe. An array of up to
+    MAX_PAYMENT_BATCH_SIZE such objects is a batch.
+    """
+    items, batched, error = _request_items(MAX_PAYMENT_BATCH_SIZE)
+    if error:
+        return error
+    
+    gateway = PaymentGateway()
+    results = []
+    for item in items:
+        patron_id, book_id = _loan_fields(item)
+        key = item.get('idempotency_key') if isinstance(item, dict) else None
+        if key is not None and not (isinstance(key, str) and key):
+            results.append({'success': False, 'message': 'Invalid idempotency key.', 'transaction_id': None})
+            continue
+        if isinstance(item, dict) and item.get('book_id') is not None:
+            if book_id is None:
+                results.append({'success': False, 'message': 'Invalid book ID.', 'transaction_id': None})
+                continue
+            success, message, transaction_id = pay_late_fees(patron_id, book_id, gateway, idempotency_key=key)
+        else:
+            success, message, transaction_id = pay_all_late_fees(patron_id, gateway, idempotency_key=key)
+        results.append({'success': success, 'message': message, 'transaction_id': transaction_id,
+                        'patron_id': patron_id, 'book_id': book_id})
+    return _batch_response(results, batched)
+
+@api_bp.route('/payments/<transaction_id>')
+def payment_status_api(transaction_id):
+    """Check a late fee payment's status via API endpoint."""
+    return jsonify(get_payment_status(transaction_id))
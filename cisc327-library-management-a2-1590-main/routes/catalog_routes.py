@@ -3,8 +3,8 @@ Catalog Routes - Book catalog related endpoints
 """
 
 from flask import Blueprint, render_template, request, redirect, url_for, flash
-from database import get_all_books
-from library_service import add_book_to_catalog
+from services.library_service import add_book_to_catalog, get_catalog_page, DEFAULT_PAGE_SIZE
+from .response_cache import catalog_cached
 
 catalog_bp = Blueprint('catalog', __name__)
 
@@ -14,13 +14,24 @@ def index():
     return redirect(url_for('catalog.catalog'))
 
 @catalog_bp.route('/catalog')
+@catalog_cached
 def catalog():
     """
-    Display all books in the catalog.
+    Display the catalog one page at a time.
     Implements R2: Book Catalog Display
     """
-    books = get_all_books()
-    return render_template('catalog.html', books=books)
+    cursor = request.args.get('cursor', '').strip() or None
+    page_size = request.args.get('page_size', DEFAULT_PAGE_SIZE, type=int)
+    available_only = request.args.get('available') == '1'
+    
+    page = get_catalog_page(cursor, page_size, available_only)
+    if 'error' in page:
+        flash(page['error'], 'error')
+        page = get_catalog_page(None, DEFAULT_PAGE_SIZE, available_only)
+    
+    return render_template('catalog.html', books=page['books'], next_cursor=page['next_cursor'],
+                           page_size=page['page_size'], available_only=available_only,
+                           first_page=cursor is None)
 
 @catalog_bp.route('/add_book', methods=['GET', 'POST'])
 def add_book():
@@ -0,0 +1,139 @@
+"""
+Response Cache - ETags and a bounded cache of rendered catalog/search responses
+
+Catalog and search responses depend only on the request URL and the books
+table, so they are keyed by (URL, catalog version). A request whose
+If-None-Match carries the current version gets a 304, and a repeated request
+is answered from the cached body; neither touches SQLite. Any committed write
+to books bumps the version, so stale entries simply stop matching and age out.
+
+The version only counts writes made by this process. Writes from elsewhere
+(the catalog_import and fee_sweeper CLIs, other WSGI workers) are picked up
+because the key also carries a RENDER_CACHE_TTL time window: cached bodies
+and ETags are never more than that many seconds old.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from typing import Dict, Tuple
+from flask import current_app, make_response, request, session
+from database import get_catalog_version_key
+
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_SIZE = 256    # rendered responses kept, across all URLs and versions
+RENDER_CACHE_TTL = 30.0    # seconds; bounds staleness after another process's write
+
+
+class RenderCache:
+    """LRU of rendered response bodies keyed by (URL, catalog version key)."""
+
+    def __init__(self, max_size: int = RENDER_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: 'OrderedDict[Tuple[str, str], Tuple[bytes, int, str]]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def count_not_modified(self) -> None:
+        with self._lock:
+            self.not_modified += 1
+
+    def put(self, key, entry) -> None:
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            served = self.hits + self.misses + self.not_modified
+            return {
+                'enabled': RENDER_CACHE_ENABLED,
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl': RENDER_CACHE_TTL,
+                'hits': self.hits,
+                'misses': self.misses,
+                'not_modified': self.not_modified,
+                'hit_rate': round((self.hits + self.not_modified) / served, 4) if served else 0.0,
+            }
+
+
+_cache = RenderCache()
+
+
+def configure_render_cache(enabled=None, max_size=None, ttl=None) -> None:
+    """Turn the render cache on/off, resize it or change its TTL; cached responses are dropped."""
+    global RENDER_CACHE_ENABLED, RENDER_CACHE_TTL, _cache
+    if enabled is not None:
+        RENDER_CACHE_ENABLED = enabled
+    if ttl is not None:
+        RENDER_CACHE_TTL = ttl
+    _cache = RenderCache(max_size if max_size is not None else _cache.max_size)
+
+
+def _version_key() -> str:
+    """The catalog version key plus the current RENDER_CACHE_TTL window."""
+    return f'{get_catalog_version_key()}-{int(time.time() // RENDER_CACHE_TTL)}'
+
+
+def get_render_cache_stats() -> Dict:
+    """Get hit/miss/304 statistics for the render cache."""
+    return _cache.stats()
+
+
+def catalog_cached(view):
+    """
+    Serve a GET view that depends only on its URL and the books table with an
+    ETag, from the render cache when possible.
+
+    Requests with pending flash messages bypass the cache in both directions,
+    because the rendered page would include (and consume) those messages.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if not RENDER_CACHE_ENABLED or request.method != 'GET' or session.get('_flashes'):
+            return view(*args, **kwargs)
+
+        version = _version_key()
+        cache = _cache
+        if version in request.if_none_match:
+            cache.count_not_modified()
+            response = current_app.response_class(status=304)
+            response.set_etag(version)
+            return response
+
+        key = (request.full_path, version)
+        entry = cache.get(key)
+        if entry is not None:
+            body, status, content_type = entry
+            response = current_app.response_class(body, status=status, content_type=content_type)
+        else:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.is_streamed:
+                return response
+            cache.put(key, (response.get_data(), response.status_code, response.content_type))
+
+        response.set_etag(version)
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+
+    return wrapper
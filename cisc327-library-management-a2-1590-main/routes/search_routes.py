@@ -3,11 +3,13 @@ Search Routes - Book search functionality
 """
 
 from flask import Blueprint, render_template, request, flash
-from library_service import search_books_in_catalog
+from services.library_service import search_books_in_catalog
+from .response_cache import catalog_cached
 
 search_bp = Blueprint('search', __name__)
 
 @search_bp.route('/search')
+@catalog_cached
 def search_books():
     """
     Search for books in the catalog.
@@ -0,0 +1,186 @@
+"""
+Async Payment Service Module - Concurrent External Payment Gateway Client
+asyncio counterpart of PaymentGateway for callers that need many payments in flight.
+
+One aiohttp session (and its connection pool) is shared by every request made
+through a client. The pool is capped per host, each call has a timeout, and
+transient failures are retried with exponential backoff and full jitter.
+"""
+
+import asyncio
+import random
+import uuid
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+# HTTP statuses worth retrying: rate limiting and server-side failures
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class AsyncPaymentGateway:
+    """
+    Async client for the external payment gateway API.
+    Method signatures and return values mirror PaymentGateway.
+
+    Use as an async context manager so the shared session is closed:
+
+        async with AsyncPaymentGateway() as gateway:
+            results = await asyncio.gather(*(gateway.process_payment(p, 5.0) for p in patrons))
+    """
+
+    def __init__(self, api_key: str = "test_key_12345",
+                 base_url: str = "https://api.payment-gateway.example.com",
+                 limit_per_host: int = 10, timeout: float = 5.0, max_retries: int = 3,
+                 backoff_base: float = 0.1, backoff_max: float = 2.0):
+        """
+        Initialize the client. The HTTP session is opened lazily on first use.
+
+        Args:
+            api_key: API key for authentication (default is test key)
+            base_url: Gateway root URL
+            limit_per_host: Maximum concurrent connections to the gateway host
+            timeout: Total seconds allowed per HTTP attempt
+            max_retries: Extra attempts after a transient failure
+            backoff_base: First backoff ceiling in seconds (doubles per retry)
+            backoff_max: Upper bound on any single backoff ceiling
+        """
+        self.api_key = api_key
+        self.base_url = base_url.rstrip("/")
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session: Optional[aiohttp.ClientSession] = None
+
+    async def __aenter__(self) -> "AsyncPaymentGateway":
+        self._get_session()
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.close()
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit_per_host=self.limit_per_host),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                headers={"Authorization": f"Bearer {self.api_key}"},
+            )
+        return self._session
+
+    async def close(self) -> None:
+        """Close the shared HTTP session and its pooled connections."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff: uniform(0, min(max, base * 2**attempt))."""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def _request(self, method: str, path: str, json: Optional[Dict] = None,
+                       idempotency_key: Optional[str] = None) -> Tuple[int, Dict]:
+        """
+        Send one logical request, retrying transient failures.
+        The same Idempotency-Key is sent on every attempt so a retried charge
+        cannot be applied twice by the gateway.
+
+        Returns:
+            tuple: (HTTP status, decoded JSON body)
+        """
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        session = self._get_session()
+        for attempt in range(self.max_retries + 1):
+            last_attempt = attempt == self.max_retries
+            try:
+                async with session.request(method, f"{self.base_url}{path}",
+                                           json=json, headers=headers) as response:
+                    if response.status in RETRY_STATUSES and not last_attempt:
+                        await asyncio.sleep(self._backoff(attempt))
+                        continue
+                    try:
+                        body = await response.json(content_type=None)
+                    except ValueError:
+                        body = {}
+                    return response.status, body or {}
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                if last_attempt:
+                    raise
+                await asyncio.sleep(self._backoff(attempt))
+        raise RuntimeError("unreachable")  # pragma: no cover
+
+    async def process_payment(self, patron_id: str, amount: float, description: str = "",
+                              idempotency_key: Optional[str] = None) -> Tuple[bool, str, str]:
+        """
+        Process a payment through the external gateway.
+
+        Args:
+            patron_id: 6-digit patron/customer ID
+            amount: Payment amount in dollars
+            description: Payment description
+            idempotency_key: Key the gateway uses to deduplicate retries (random if omitted)
+
+        Returns:
+            tuple: (success: bool, transaction_id: str, message: str)
+        """
+        if amount <= 0:
+            return False, "", "Invalid amount: must be greater than 0"
+
+        status, body = await self._request("POST", "/charges", json={
+            "customer_id": patron_id,
+            "amount": amount,
+            "currency": "usd",
+            "description": description,
+        }, idempotency_key=idempotency_key or str(uuid.uuid4()))
+
+        if status == 200 and body.get("success"):
+            return True, body.get("transaction_id", ""), body.get("message", "")
+        return False, "", body.get("message") or f"Gateway returned HTTP {status}"
+
+    async def refund_payment(self, transaction_id: str, amount: float,
+                             idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        Refund a previous payment.
+
+        Args:
+            transaction_id: Original transaction ID to refund
+            amount: Amount to refund
+            idempotency_key: Key the gateway uses to deduplicate retries (random if omitted)
+
+        Returns:
+            tuple: (success: bool, message: str)
+        """
+        if not transaction_id or not transaction_id.startswith("txn_"):
+            return False, "Invalid transaction ID"
+
+        if amount <= 0:
+            return False, "Invalid refund amount"
+
+        status, body = await self._request("POST", "/refunds", json={
+            "transaction_id": transaction_id,
+            "amount": amount,
+        }, idempotency_key=idempotency_key or str(uuid.uuid4()))
+
+        if status == 200 and body.get("success"):
+            return True, body.get("message", "")
+        return False, body.get("message") or f"Gateway returned HTTP {status}"
+
+    async def verify_payment_status(self, transaction_id: str) -> Dict:
+        """
+        Check the status of a payment transaction.
+
+        Args:
+            transaction_id: Transaction ID to check
+
+        Returns:
+            dict: Payment status information
+        """
+        if not transaction_id or not transaction_id.startswith("txn_"):
+            return {"status": "not_found", "message": "Transaction not found"}
+
+        status, body = await self._request("GET", f"/charges/{transaction_id}")
+        if status == 404:
+            return {"status": "not_found", "message": "Transaction not found"}
+        return body
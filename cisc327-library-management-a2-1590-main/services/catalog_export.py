@@ -0,0 +1,74 @@
+"""
+Catalog Export Module - Streaming Bulk Export
+Turns the books and borrow_records tables into CSV or NDJSON text chunks.
+
+Rows come from fetchmany cursors one batch at a time and each batch becomes
+one chunk, so memory use does not grow with the table. The header (CSV) is
+produced before the first query runs, so a streaming response starts at once.
+Each export reads on its own connection (database.stream_connection), so
+however long a client takes to download, no pooled connection is held.
+"""
+
+import csv
+import io
+import json
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from database import iter_books, iter_borrow_records
+
+EXPORT_BATCH_SIZE = 5000
+EXPORT_FORMATS = {'csv': 'text/csv', 'ndjson': 'application/x-ndjson'}
+
+# dataset -> (columns, batch source)
+DATASETS: Dict[str, Tuple[Sequence[str], Callable[..., Iterator[List]]]] = {
+    'books': (('id', 'title', 'author', 'isbn', 'total_copies', 'available_copies'), iter_books),
+    'loans': (('id', 'patron_id', 'book_id', 'borrow_date', 'due_date', 'return_date'), iter_borrow_records),
+}
+
+
+def _csv_chunks(columns: Sequence[str], batches: Iterator[List]) -> Iterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer, lineterminator='\n')
+    writer.writerow(columns)
+    yield buffer.getvalue()
+    for rows in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(tuple(row) for row in rows)
+        yield buffer.getvalue()
+
+
+def _ndjson_chunks(columns: Sequence[str], batches: Iterator[List]) -> Iterator[str]:
+    encode = json.JSONEncoder(separators=(',', ':'), ensure_ascii=False).encode
+    for rows in batches:
+        yield ''.join(encode(dict(zip(columns, row))) + '\n' for row in rows)
+
+
+def export_rows(dataset: str, fmt: str, batch_size: int = EXPORT_BATCH_SIZE,
+                patron_id: Optional[str] = None) -> Iterator[str]:
+    """
+    Stream a dataset ('books' or 'loans') as CSV or NDJSON text chunks.
+
+    Args:
+        dataset: 'books' or 'loans' (borrow records)
+        fmt: 'csv' or 'ndjson'
+        batch_size: Rows fetched per fetchmany call (and per chunk)
+        patron_id: Only export this patron's borrow records ('loans' only)
+
+    Returns:
+        iterator: Text chunks; the database is not touched until iteration starts
+    """
+    if dataset not in DATASETS:
+        raise ValueError(f'Unknown export dataset: {dataset}')
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f'Unsupported export format: {fmt}')
+    if batch_size < 1:
+        raise ValueError('Batch size must be at least 1.')
+
+    columns, source = DATASETS[dataset]
+    if dataset == 'loans':
+        batches = source(batch_size, patron_id)
+    else:
+        batches = source(batch_size)
+    if fmt == 'csv':
+        return _csv_chunks(columns, batches)
+    return _ndjson_chunks(columns, batches)
@@ -0,0 +1,171 @@
+"""
+Catalog Import Module - Bulk Book Loading
+Streams a CSV or JSON Lines vendor feed into the catalog in large batches.
+
+Each row is validated with the same R1 rules as add_book_to_catalog. Duplicate
+ISBNs are skipped by the UNIQUE index (INSERT ... ON CONFLICT DO NOTHING) rather
+than checked row by row, so memory and round trips stay flat however big the feed is.
+
+Usage:
+    python -m services.catalog_import FILE [--format csv|jsonl] [--batch-size N]
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import time
+from typing import Dict, IO, Iterator, List, Optional, Tuple
+from database import init_database, insert_books_bulk
+from services.library_service import validate_book_fields
+
+IMPORT_BATCH_SIZE = 10000      # rows per executemany transaction
+MAX_REPORTED_REJECTS = 1000    # rejected rows listed in the report (all are counted)
+FORMATS = {'csv': 'csv', 'jsonl': 'jsonl', 'ndjson': 'jsonl'}
+
+
+def detect_format(filename: Optional[str], default: str = 'csv') -> str:
+    """Pick 'csv' or 'jsonl' from a file name's extension."""
+    ext = os.path.splitext(filename or '')[1].lstrip('.').lower()
+    return FORMATS.get(ext, default)
+
+
+def _iter_csv(stream: IO[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    reader = csv.DictReader(stream)
+    for record in reader:
+        yield reader.line_num, record, None
+
+
+def _iter_jsonl(stream: IO[str]) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    for line_no, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield line_no, None, "Invalid JSON."
+            continue
+        if not isinstance(record, dict):
+            yield line_no, None, "Each line must be a JSON object."
+            continue
+        yield line_no, record, None
+
+
+def _text(value) -> str:
+    if value is None:
+        return ''
+    return value if isinstance(value, str) else str(value)
+
+
+def _copies(value):
+    # CSV gives every field as text; JSON may give a number or a numeric string
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return value
+
+
+def iter_book_rows(stream: IO[str], fmt: str = 'csv') -> Iterator[Tuple[int, Optional[Tuple], Optional[str], str]]:
+    """
+    Parse and validate a feed one record at a time.
+
+    Yields:
+        tuple: (line number, (title, author, isbn, copies, copies) or None, error or None, isbn)
+    """
+    if fmt not in ('csv', 'jsonl'):
+        raise ValueError(f'Unsupported import format: {fmt}')
+    records = _iter_csv(stream) if fmt == 'csv' else _iter_jsonl(stream)
+    for line_no, record, error in records:
+        if error:
+            yield line_no, None, error, ''
+            continue
+        title = _text(record.get('title'))
+        author = _text(record.get('author'))
+        isbn = _text(record.get('isbn')).strip()
+        total_copies = _copies(record.get('total_copies'))
+        error = validate_book_fields(title, author, isbn, total_copies)
+        if error:
+            yield line_no, None, error, isbn
+        else:
+            yield line_no, (title.strip(), author.strip(), isbn, total_copies, total_copies), None, isbn
+
+
+def import_books(stream: IO[str], fmt: str = 'csv', batch_size: int = IMPORT_BATCH_SIZE,
+                 max_reported_rejects: int = MAX_REPORTED_REJECTS) -> Dict:
+    """
+    Import a CSV or JSON Lines feed of books (title, author, isbn, total_copies).
+
+    Args:
+        stream: Text stream positioned at the start of the feed
+        fmt: 'csv' (with a header row) or 'jsonl' (one JSON object per line)
+        batch_size: Valid rows written per transaction
+        max_reported_rejects: How many rejected rows to list in the report
+
+    Returns:
+        dict: rows, inserted, duplicates, rejected, rejections, seconds and rows_per_second
+    """
+    if batch_size < 1:
+        raise ValueError('Batch size must be at least 1.')
+    start = time.perf_counter()
+    rows = inserted = valid = rejected = 0
+    rejections: List[Dict] = []
+    batch: List[Tuple] = []
+
+    for line_no, book, error, isbn in iter_book_rows(stream, fmt):
+        rows += 1
+        if error:
+            rejected += 1
+            if len(rejections) < max_reported_rejects:
+                rejections.append({'line': line_no, 'isbn': isbn, 'error': error})
+            continue
+        batch.append(book)
+        if len(batch) >= batch_size:
+            valid += len(batch)
+            inserted += insert_books_bulk(batch)
+            batch = []
+    if batch:
+        valid += len(batch)
+        inserted += insert_books_bulk(batch)
+
+    seconds = time.perf_counter() - start
+    return {
+        'rows': rows,
+        'inserted': inserted,
+        'duplicates': valid - inserted,
+        'rejected': rejected,
+        'rejections': rejections,
+        'seconds': round(seconds, 3),
+        'rows_per_second': round(rows / seconds, 1) if seconds > 0 else float(rows),
+    }
+
+
+def import_books_from_binary(stream: IO[bytes], fmt: str = 'csv', **kwargs) -> Dict:
+    """Import from a byte stream (e.g. an upload), decoding UTF-8 with or without a BOM."""
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    try:
+        return import_books(text, fmt, **kwargs)
+    finally:
+        text.detach()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('file')
+    parser.add_argument('--format', choices=sorted(FORMATS), default=None)
+    parser.add_argument('--batch-size', type=int, default=IMPORT_BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    fmt = FORMATS[args.format] if args.format else detect_format(args.file)
+    init_database()
+    with open(args.file, encoding='utf-8-sig', newline='') as f:
+        report = import_books(f, fmt, args.batch_size)
+
+    for reject in report['rejections']:
+        print(f"line {reject['line']}: {reject['error']} (isbn {reject['isbn']!r})")
+    print(f"{report['rows']} rows: {report['inserted']} inserted, {report['duplicates']} duplicate ISBNs, "
+          f"{report['rejected']} rejected in {report['seconds']}s ({report['rows_per_second']} rows/s)")
+    return report
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Fee Sweeper Module - Background Overdue Sweeps and Fee Accrual
+Keeps the materialized loan_fees table current, so the late fee lookups in
+library_service read stored fees instead of re-deriving them from dates.
+
+Each sweep reprices only the loans written since the previous sweep and, once
+a day, the loans whose fee moved with the date; fees at MAX_FEE are final
+and never repriced (see database.sweep_loan_fees). The same pass rebuilds the stored patron status
+reports whose fees changed and expires unclaimed ready holds.
+SweepScheduler runs the sweep on a daemon thread inside the web process.
+
+Usage:
+    python -m services.fee_sweeper              # one sweep, then exit
+    python -m services.fee_sweeper --interval 300
+"""
+
+import argparse
+import functools
+import logging
+import threading
+from datetime import date, datetime
+from typing import Dict, Optional
+from database import init_database, sweep_loan_fees, expire_ready_holds
+from services.fee_engine import price_due_dates, MAX_FEE
+from services.library_service import HOLD_PICKUP_DAYS, refresh_stale_patron_summaries
+
+logger = logging.getLogger(__name__)
+
+SWEEP_INTERVAL = 300.0   # seconds between sweeps
+SWEEP_BATCH_SIZE = 5000  # loans priced per transaction
+
+
+def run_sweep(as_of: Optional[date] = None, batch_size: int = SWEEP_BATCH_SIZE) -> Dict:
+    """
+    Run one incremental sweep: accrue late fees, rebuild the patron summaries
+    whose fees moved, and expire ready holds.
+
+    Returns:
+        dict: The loan_fees report from sweep_loan_fees, plus the number of
+              summaries rebuilt and holds expired
+    """
+    today = as_of or date.today()
+    report = sweep_loan_fees(today, functools.partial(price_due_dates, today=today), batch_size, MAX_FEE)
+    report['summaries_refreshed'] = refresh_stale_patron_summaries(today)
+    report['holds_expired'] = expire_ready_holds(datetime.now(), HOLD_PICKUP_DAYS)
+    return report
+
+
+class SweepScheduler:
+    """Run run_sweep() every `interval` seconds on a daemon thread."""
+
+    def __init__(self, interval: float = SWEEP_INTERVAL):
+        self.interval = interval
+        self.last_report: Optional[Dict] = None
+        self.failures = 0
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start sweeping; the first sweep runs immediately. A no-op if already running."""
+        if self.running:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='fee-sweeper', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """Ask the thread to finish after its current sweep and wait for it."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self) -> Optional[Dict]:
+        try:
+            self.last_report = run_sweep()
+        except Exception:
+            # A failed sweep leaves its queue in place; the next one picks it up
+            self.failures += 1
+            logger.exception('fee sweep failed')
+            return None
+        return self.last_report
+
+    def _run(self) -> None:
+        while True:
+            self.run_once()
+            if self._stop.wait(self.interval):
+                return
+
+
+_scheduler: Optional[SweepScheduler] = None
+_scheduler_lock = threading.Lock()
+
+
+def start_scheduler(interval: float = SWEEP_INTERVAL) -> SweepScheduler:
+    """Start the process-wide sweep scheduler (once) and return it."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = SweepScheduler(interval)
+        _scheduler.start()
+        return _scheduler
+
+
+def stop_scheduler(timeout: Optional[float] = None) -> None:
+    """Stop the process-wide sweep scheduler, if it was started."""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is not None:
+            _scheduler.stop(timeout)
+            _scheduler = None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--interval', type=float, help='keep sweeping every N seconds')
+    args = parser.parse_args(argv)
+
+    init_database()
+    if not args.interval:
+        report = run_sweep()
+        print(f"fee sweep: {report['changed']} changed, {report['newly_overdue']} newly overdue, "
+              f"{report['aged']} aged, {report['summaries_refreshed']} summaries rebuilt, "
+              f"{report['holds_expired']} holds expired")
+        return 0
+
+    logging.basicConfig(level=logging.INFO)
+    scheduler = SweepScheduler(args.interval)
+    try:
+        scheduler._run()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
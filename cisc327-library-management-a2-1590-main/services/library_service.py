@@ -3,17 +3,36 @@ Library Service Module - Business Logic Functions
 Contains all the core business logic for the Library Management System
 """
 
+import asyncio
+import base64
+import binascii
+import json
 from datetime import datetime, timedelta, date
 from typing import Dict, List, Optional, Tuple
 from database import (
-    get_book_by_id, get_book_by_isbn, get_patron_borrow_count,
-    insert_book, insert_borrow_record, update_book_availability,
-    update_borrow_record_return_date, get_all_books, get_patron_borrowed_books, get_db_connection
+    get_book_by_id, get_book_by_isbn, insert_book,
+    borrow_book_atomic, return_book_atomic, search_books, get_books_page, get_patron_loan_summary,
+    insert_payment_allocations, get_payment_allocations, begin_payment, finish_payment,
+    get_payment_by_transaction, get_refunded_total,
+    place_hold_atomic, cancel_hold_atomic, get_patron_holds, get_book_holds,
+    get_active_loan_fee, epoch_day, get_patron_summary, store_patron_summary,
+    get_stale_patron_summaries, get_paid_loan_ids
 )
+from services.fee_engine import MAX_FEE
 from services.payment_service import PaymentGateway
+from services.async_payment_service import AsyncPaymentGateway
 
+MAX_BORROWED_BOOKS = 5
+LOAN_PERIOD_DAYS = 14
+HOLD_PICKUP_DAYS = 3
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_SQL_INTEGER = 2 ** 63 - 1  # largest integer SQLite can bind
 
-def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+
+def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway: PaymentGateway = None,
+                            idempotency_key: Optional[str] = None,
+                            loan_id: Optional[int] = None) -> Tuple[bool, str]:
     """
     Refund a late fee payment (e.g., if book was returned on time but fees were charged in error).
     
@@ -23,19 +42,22 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         transaction_id: Original transaction ID to refund
         amount: Amount to refund
         payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Ledger key identifying this refund (derived from the inputs if omitted)
+        loan_id: Loan whose fee is refunded (defaults to the loan the charge was for)
         
     Returns:
         tuple: (success: bool, message: str)
     """
     # Validate inputs
-    if not transaction_id or not transaction_id.startswith("txn_"):
-        return False, "Invalid transaction ID."
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error
     
-    if amount <= 0:
-        return False, "Refund amount must be greater than 0."
-    
-    if amount > 15.00:  # Maximum late fee per book
-        return False, "Refund amount exceeds maximum late fee."
+    # Record the refund in the ledger; a repeated request is answered from it
+    claimed, entry = _claim_refund(transaction_id, amount, idempotency_key, loan_id)
+    if not claimed:
+        return _replayed_refund(entry)
+    key = entry["idempotency_key"]
     
     # Use provided gateway or create new one
     if payment_gateway is None:
@@ -47,17 +69,21 @@ def refund_late_fee_payment(transaction_id: str, amount: float, payment_gateway:
         success, message = payment_gateway.refund_payment(transaction_id, amount)
         
         if success:
+            finish_payment(key, "completed", message=message)
             return True, message
         else:
+            finish_payment(key, "failed", message=message)
             return False, f"Refund failed: {message}"
             
     except Exception as e:
+        finish_payment(key, "error", message=str(e))
         return False, f"Refund processing error: {str(e)}"
 
 
 
 
-def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None) -> Tuple[bool, str, Optional[str]]:
+def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway = None,
+                  idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
     """
     Process payment for late fees using external payment gateway.
     
@@ -68,6 +94,8 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         patron_id: 6-digit library card ID
         book_id: ID of the book with late fees
         payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Ledger key identifying this payment. If omitted, the same
+            patron paying the same fee for the same book on the same day counts as a retry
         
     Returns:
         tuple: (success: bool, message: str, transaction_id: Optional[str])
@@ -78,84 +106,390 @@ def pay_late_fees(patron_id: str, book_id: int, payment_gateway: PaymentGateway
         mock_gateway.process_payment.return_value = (True, "txn_123", "Success")
         success, msg, txn = pay_late_fees("123456", 1, mock_gateway)
     """
-    # Validate patron ID
+    # Validate patron ID, calculate the fee and look up the book
+    error, fee_amount, book, loan_id = _prepare_late_fee_payment(patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    # Record the charge in the ledger first; a retry of a settled payment is answered from it
+    key = idempotency_key or _late_fee_key(patron_id, f"book:{book_id}", fee_amount)
+    claimed, entry = begin_payment(key, "charge", fee_amount, patron_id=patron_id, book_id=book_id,
+                                   borrow_record_id=loan_id)
+    if not claimed:
+        return _replayed_charge(entry)
+    
+    # Use provided gateway or create new one
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    # Process payment through external gateway
+    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=fee_amount,
+            description=f"Late fees for '{book['title']}'"
+        )
+    except Exception as e:
+        # Handle payment gateway errors
+        finish_payment(key, "error", message=str(e))
+        return False, f"Payment processing error: {str(e)}", None
+    
+    return _settle_charge(key, success, transaction_id, message)
+
+def pay_all_late_fees(patron_id: str, payment_gateway: PaymentGateway = None,
+                      idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Settle every late fee a patron owes with one gateway charge.
+    
+    The patron's overdue loans are gathered in one query and their fees summed.
+    Loans whose fee another completed charge already paid are skipped. How the
+    charge splits across books is recorded in payment_allocations, so a single
+    book can be refunded later with refund_allocated_late_fee.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        payment_gateway: Payment gateway instance (injectable for testing)
+        idempotency_key: Ledger key identifying this payment (see pay_late_fees)
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits.", None
     
+    active, _ = get_patron_loan_summary(patron_id)
+    today = datetime.today().date()
+    allocations = []
+    for rec in active:
+        fee = late_fee_for_due_date(rec["due_date"], today)["fee_amount"]
+        if fee > 0:
+            allocations.append({"loan_id": rec["loan_id"], "book_id": rec["book_id"],
+                                "title": rec["title"], "amount": fee})
+    
+    if allocations:
+        key = idempotency_key or _late_fee_key(patron_id, "all", round(sum(a["amount"] for a in allocations), 2))
+        # A retry of this key still sees the loans it paid, so it is answered from the ledger below
+        paid = get_paid_loan_ids([a["loan_id"] for a in allocations], exclude_key=key)
+        allocations = [a for a in allocations if a["loan_id"] not in paid]
+    
+    if not allocations:
+        return False, "No late fees to pay.", None
+    
+    total = round(sum(a["amount"] for a in allocations), 2)
+    if len(allocations) == 1:
+        description = f"Late fees for '{allocations[0]['title']}'"
+    else:
+        description = f"Late fees for {len(allocations)} books"
+    
+    # A single-loan charge links to its loan directly; larger ones through payment_allocations
+    claimed, entry = begin_payment(key, "charge", total, patron_id=patron_id,
+                                   borrow_record_id=allocations[0]["loan_id"] if len(allocations) == 1 else None)
+    if not claimed:
+        return _replayed_charge(entry)
+    
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    
+    try:
+        success, transaction_id, message = payment_gateway.process_payment(
+            patron_id=patron_id,
+            amount=total,
+            description=description
+        )
+    except Exception as e:
+        finish_payment(key, "error", message=str(e))
+        return False, f"Payment processing error: {str(e)}", None
+    
+    result = _settle_charge(key, success, transaction_id, message)
+    if not success:
+        return result
+    
+    if not insert_payment_allocations(transaction_id, patron_id, allocations):
+        return True, f"Payment successful! {message} (per-book allocation could not be recorded)", transaction_id
+    
+    return result
+
+def refund_allocated_late_fee(transaction_id: str, book_id: int,
+                              payment_gateway: PaymentGateway = None) -> Tuple[bool, str]:
+    """
+    Refund the share of a combined late fee payment that was allocated to one book.
+    
+    Args:
+        transaction_id: Transaction ID returned by pay_all_late_fees
+        book_id: Book whose share should be refunded
+        payment_gateway: Payment gateway instance (injectable for testing)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    allocation = next((a for a in get_payment_allocations(transaction_id) if a["book_id"] == book_id), None)
+    if allocation is None:
+        return False, "No payment allocation found for this transaction and book."
+    
+    return refund_late_fee_payment(transaction_id, allocation["amount"], payment_gateway,
+                                   idempotency_key=f"refund:{transaction_id}:book:{book_id}",
+                                   loan_id=allocation["borrow_record_id"])
+
+def get_payment_status(transaction_id: str, payment_gateway: PaymentGateway = None) -> Dict:
+    """
+    Check the status of a late fee payment, answering from the payments ledger
+    when the charge is recorded there and asking the gateway otherwise.
+    
+    Args:
+        transaction_id: Transaction ID to check
+        payment_gateway: Payment gateway instance (injectable for testing)
+        
+    Returns:
+        dict: Payment status information
+    """
+    entry = get_payment_by_transaction(transaction_id) if transaction_id else None
+    if entry:
+        return {
+            "transaction_id": transaction_id,
+            "status": entry["status"],
+            "amount": entry["amount"],
+            "refunded_amount": get_refunded_total(transaction_id),
+            "timestamp": entry["updated_at"],
+            "source": "ledger",
+        }
+    
+    if payment_gateway is None:
+        payment_gateway = PaymentGateway()
+    return payment_gateway.verify_payment_status(transaction_id)
+
+def _late_fee_key(patron_id: str, scope: str, amount: float) -> str:
+    """Default idempotency key: the same patron paying the same fee on the same day is a retry."""
+    return f"late_fee:{patron_id}:{scope}:{amount:.2f}:{date.today().isoformat()}"
+
+def _settle_charge(key: str, success: bool, transaction_id: Optional[str],
+                   message: str) -> Tuple[bool, str, Optional[str]]:
+    """Record the gateway's answer to a charge in the ledger and build the caller's result."""
+    if success:
+        finish_payment(key, "completed", transaction_id, message)
+        return True, f"Payment successful! {message}", transaction_id
+    finish_payment(key, "failed", message=message)
+    return False, f"Payment failed: {message}", None
+
+def _replayed_charge(entry: Dict) -> Tuple[bool, str, Optional[str]]:
+    """Answer a repeated charge request from its ledger entry without calling the gateway."""
+    if entry["status"] == "completed":
+        return True, f"Payment successful! {entry['message']}", entry["transaction_id"]
+    if entry["status"] == "conflict":
+        return False, entry["message"], None
+    return False, "A payment for these late fees is already in progress.", None
+
+def _claim_refund(transaction_id: str, amount: float, idempotency_key: Optional[str],
+                  loan_id: Optional[int] = None) -> Tuple[bool, Dict]:
+    """
+    Claim a ledger entry for a refund. Refunds that would exceed the recorded
+    charge are refused with a synthetic 'failed' entry.
+    """
+    key = idempotency_key or f"refund:{transaction_id}:{amount:.2f}"
+    charge = get_payment_by_transaction(transaction_id)
+    claimed, entry = begin_payment(key, "refund", amount,
+                                   patron_id=charge["patron_id"] if charge else None,
+                                   book_id=charge["book_id"] if charge else None,
+                                   borrow_record_id=loan_id or (charge["borrow_record_id"] if charge else None),
+                                   parent_transaction_id=transaction_id,
+                                   refund_limit=charge["amount"] if charge else None)
+    if entry is None:
+        return False, {"status": "failed", "idempotency_key": key,
+                       "message": "Refund amount exceeds amount paid."}
+    return claimed, entry
+
+def _replayed_refund(entry: Dict) -> Tuple[bool, str]:
+    """Answer a repeated or refused refund request from its ledger entry."""
+    if entry["status"] == "completed":
+        return True, entry["message"]
+    if entry["status"] == "pending":
+        return False, "A refund for this payment is already in progress."
+    return False, entry["message"]
+
+def _validate_refund(transaction_id: str, amount: float) -> Optional[str]:
+    """Return an error message if a refund request is invalid, else None."""
+    if not transaction_id or not transaction_id.startswith("txn_"):
+        return "Invalid transaction ID."
+    
+    if amount <= 0:
+        return "Refund amount must be greater than 0."
+    
+    if amount > 15.00:  # Maximum late fee per book
+        return "Refund amount exceeds maximum late fee."
+    
+    return None
+
+def _prepare_late_fee_payment(patron_id: str,
+                              book_id: int) -> Tuple[Optional[str], float, Optional[Dict], Optional[int]]:
+    """
+    Validate a late fee payment and gather what the gateway call needs.
+    
+    Returns:
+        tuple: (error message or None, fee_amount, book, id of the loan the fee is for)
+    """
+    # Validate patron ID
+    if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
+        return "Invalid patron ID. Must be exactly 6 digits.", 0.0, None, None
+    
     # Calculate late fee first
     fee_info = calculate_late_fee_for_book(patron_id, book_id)
     
     # Check if there's a fee to pay
     if not fee_info or 'fee_amount' not in fee_info:
-        return False, "Unable to calculate late fees.", None
+        return "Unable to calculate late fees.", 0.0, None, None
     
     fee_amount = fee_info.get('fee_amount', 0.0)
     
     if fee_amount <= 0:
-        return False, "No late fees to pay for this book.", None
+        return "No late fees to pay for this book.", 0.0, None, None
     
     # Get book details for payment description
     book = get_book_by_id(book_id)
     if not book:
-        return False, "Book not found.", None
+        return "Book not found.", 0.0, None, None
     
-    # Use provided gateway or create new one
-    if payment_gateway is None:
-        payment_gateway = PaymentGateway()
+    # The loan the fee belongs to, so the charge row links to it
+    loan = get_active_loan_fee(patron_id, book_id, epoch_day(datetime.today().date()))
+    return None, fee_amount, book, loan["loan_id"] if loan else None
+
+async def pay_late_fees_async(patron_id: str, book_id: int, payment_gateway: AsyncPaymentGateway = None,
+                              idempotency_key: Optional[str] = None) -> Tuple[bool, str, Optional[str]]:
+    """
+    Async variant of pay_late_fees: the worker is not held during the gateway
+    round trip, so many payments can be in flight at once.
+    
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book with late fees
+        payment_gateway: Shared AsyncPaymentGateway (a temporary one is opened if omitted)
+        idempotency_key: Ledger key identifying this payment (see pay_late_fees); also
+            sent to the gateway so its own retries are deduplicated
+        
+    Returns:
+        tuple: (success: bool, message: str, transaction_id: Optional[str])
+    """
+    # Database lookups are synchronous; keep them off the event loop
+    error, fee_amount, book, loan_id = await asyncio.to_thread(_prepare_late_fee_payment, patron_id, book_id)
+    if error:
+        return False, error, None
+    
+    key = idempotency_key or _late_fee_key(patron_id, f"book:{book_id}", fee_amount)
+    claimed, entry = await asyncio.to_thread(begin_payment, key, "charge", fee_amount,
+                                             patron_id=patron_id, book_id=book_id, borrow_record_id=loan_id)
+    if not claimed:
+        return _replayed_charge(entry)
+    
+    owns_gateway = payment_gateway is None
+    if owns_gateway:
+        payment_gateway = AsyncPaymentGateway()
     
-    # Process payment through external gateway
-    # THIS IS WHAT YOU SHOULD MOCK IN THEIR TESTS!
     try:
-        success, transaction_id, message = payment_gateway.process_payment(
+        success, transaction_id, message = await payment_gateway.process_payment(
             patron_id=patron_id,
             amount=fee_amount,
-            description=f"Late fees for '{book['title']}'"
+            description=f"Late fees for '{book['title']}'",
+            idempotency_key=key
         )
-        
-        if success:
-            return True, f"Payment successful! {message}", transaction_id
-        else:
-            return False, f"Payment failed: {message}", None
-            
     except Exception as e:
-        # Handle payment gateway errors
+        await asyncio.to_thread(finish_payment, key, "error", message=str(e))
         return False, f"Payment processing error: {str(e)}", None
+    finally:
+        if owns_gateway:
+            await payment_gateway.close()
+    
+    return await asyncio.to_thread(_settle_charge, key, success, transaction_id, message)
 
-def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+async def refund_late_fee_payment_async(transaction_id: str, amount: float, payment_gateway: AsyncPaymentGateway = None,
+                                        idempotency_key: Optional[str] = None) -> Tuple[bool, str]:
     """
-    Add a new book to the catalog.
-    Implements R1: Book Catalog Management
+    Async variant of refund_late_fee_payment.
     
     Args:
-        title: Book title (max 200 chars)
-        author: Book author (max 100 chars)
-        isbn: 13-digit ISBN
-        total_copies: Number of copies (positive integer)
+        transaction_id: Original transaction ID to refund
+        amount: Amount to refund
+        payment_gateway: Shared AsyncPaymentGateway (a temporary one is opened if omitted)
+        idempotency_key: Ledger key identifying this refund (see refund_late_fee_payment)
         
     Returns:
         tuple: (success: bool, message: str)
     """
-    # Input validation
+    error = _validate_refund(transaction_id, amount)
+    if error:
+        return False, error
+    
+    claimed, entry = await asyncio.to_thread(_claim_refund, transaction_id, amount, idempotency_key)
+    if not claimed:
+        return _replayed_refund(entry)
+    key = entry["idempotency_key"]
+    
+    owns_gateway = payment_gateway is None
+    if owns_gateway:
+        payment_gateway = AsyncPaymentGateway()
+    
+    try:
+        success, message = await payment_gateway.refund_payment(transaction_id, amount, idempotency_key=key)
+    except Exception as e:
+        await asyncio.to_thread(finish_payment, key, "error", message=str(e))
+        return False, f"Refund processing error: {str(e)}"
+    finally:
+        if owns_gateway:
+            await payment_gateway.close()
+    
+    if success:
+        await asyncio.to_thread(finish_payment, key, "completed", message=message)
+        return True, message
+    await asyncio.to_thread(finish_payment, key, "failed", message=message)
+    return False, f"Refund failed: {message}"
+
+def validate_book_fields(title: str, author: str, isbn: str, total_copies: int) -> Optional[str]:
+    """
+    Check a new book against the R1 catalog rules.
+    Shared by add_book_to_catalog and the bulk importer.
+    
+    Returns:
+        str or None: The first validation error message, or None if the book is valid
+    """
     if not title or not title.strip():
-        return False, "Title is required."
+        return "Title is required."
     
     if len(title.strip()) > 200:
-        return False, "Title must be less than 200 characters."
+        return "Title must be less than 200 characters."
     
     if not author or not author.strip():
-        return False, "Author is required."
+        return "Author is required."
     
     if len(author.strip()) > 100:
-        return False, "Author must be less than 100 characters."
+        return "Author must be less than 100 characters."
     
     if len(isbn) != 13:
-        return False, "ISBN must be exactly 13 digits."
+        return "ISBN must be exactly 13 digits."
     
     if not isinstance(total_copies, int) or total_copies <= 0:
-        return False, "Total copies must be a positive integer."
+        return "Total copies must be a positive integer."
     
     if not (isinstance(isbn, str) and len(isbn) == 13 and isbn.isdigit()):
-        return False, "ISBN must be 13 digits."
+        return "ISBN must be 13 digits."
+    
+    return None
+
+def add_book_to_catalog(title: str, author: str, isbn: str, total_copies: int) -> Tuple[bool, str]:
+    """
+    Add a new book to the catalog.
+    Implements R1: Book Catalog Management
+    
+    Args:
+        title: Book title (max 200 chars)
+        author: Book author (max 100 chars)
+        isbn: 13-digit ISBN
+        total_copies: Number of copies (positive integer)
+        
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    # Input validation
+    error = validate_book_fields(title, author, isbn, total_copies)
+    if error:
+        return False, error
     
     # Check for duplicate ISBN
     existing = get_book_by_isbn(isbn)
@@ -185,32 +519,23 @@ def borrow_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
     if not patron_id or not patron_id.isdigit() or len(patron_id) != 6:
         return False, "Invalid patron ID. Must be exactly 6 digits."
     
-    # Check if book exists and is available
-    book = get_book_by_id(book_id)
-    if not book:
-        return False, "Book not found."
-    
-    if book['available_copies'] <= 0:
-        return False, "This book is currently not available."
-    
-    # Check patron's current borrowed books count
-    current_borrowed = get_patron_borrow_count(patron_id)
-    
-    if current_borrowed > 5:
-        return False, "You have reached the maximum borrowing limit of 5 books."
-    
-    # Create borrow record
     borrow_date = datetime.now()
-    due_date = borrow_date + timedelta(days=14)
+    due_date = borrow_date + timedelta(days=LOAN_PERIOD_DAYS)
     
-    # Insert borrow record and update availability
-    borrow_success = insert_borrow_record(patron_id, book_id, borrow_date, due_date)
-    if not borrow_success:
+    # Availability check, limit check, borrow record and copy count in one transaction
+    try:
+        status, book = borrow_book_atomic(patron_id, book_id, borrow_date, due_date, MAX_BORROWED_BOOKS)
+    except Exception:
         return False, "Database error occurred while creating borrow record."
     
-    availability_success = update_book_availability(book_id, -1)
-    if not availability_success:
-        return False, "Database error occurred while updating book availability."
+    if status == 'not_found':
+        return False, "Book not found."
+    
+    if status == 'unavailable':
+        return False, "This book is currently not available. Place a hold to join the waitlist."
+    
+    if status == 'limit_reached':
+        return False, f"You have reached the maximum borrowing limit of {MAX_BORROWED_BOOKS} books."
     
     return True, f'Successfully borrowed "{book["title"]}". Due date: {due_date.strftime("%Y-%m-%d")}.'
 
@@ -220,27 +545,92 @@ def return_book_by_patron(patron_id: str, book_id: int) -> Tuple[bool, str, floa
     if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
         return False, "Invalid patron ID. Must be exactly 6 digits.", 0.0
 
-    book = get_book_by_id(book_id)
-    if book is None:
-        return False, "Book not found.", 0.0
+    today = datetime.today().date()
+    try:
+        status, loan = return_book_atomic(patron_id, book_id, today, HOLD_PICKUP_DAYS)
+    except Exception:
+        return False, "Database error occurred while returning the book.", 0.0
 
+    if status == 'not_found':
+        return False, "Book not found.", 0.0
 
-    active = get_patron_borrowed_books(patron_id) or []
-    rec = next((r for r in active if r.get("book_id") == book_id), None)
-    if rec is None:
+    if status == 'not_borrowed':
         return False, "No active borrow found for this patron and book.", 0.0
 
+    fee_info = late_fee_for_due_date(loan["due_date"], today)
+    fee = float(fee_info.get("fee_amount", 0.0))
 
-    fee_info = calculate_late_fee_for_book(patron_id, book_id)
-    fee = float(fee_info.get("fee_amount", 0.0)) if isinstance(fee_info, dict) else 0.0
+    msg = "Returned successfully." if fee == 0 else f"Returned with late fee ${fee:.2f}"
+    return True, msg, fee
 
-    today = datetime.today().date()
-    update_borrow_record_return_date(patron_id, book_id, today)
 
-    update_book_availability(book_id, +1)
+def place_hold_for_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Put a patron on the waitlist for a book with no copies on the shelf.
+    When a copy is returned, the first patron in line has it set aside for
+    HOLD_PICKUP_DAYS days and can borrow it as usual.
 
-    msg = "Returned successfully." if fee == 0 else f"Returned with late fee ${fee:.2f}"
-    return True, msg, fee
+    Args:
+        patron_id: 6-digit library card ID
+        book_id: ID of the book to hold
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    try:
+        status, hold = place_hold_atomic(patron_id, book_id, datetime.now())
+    except Exception:
+        return False, "Database error occurred while placing the hold."
+
+    if status == 'not_found':
+        return False, "Book not found."
+    if status == 'available':
+        return False, "This book is available now; borrow it instead of placing a hold."
+    if status == 'already_borrowed':
+        return False, "You already have this book borrowed."
+    if status == 'duplicate':
+        return False, "You already have a hold on this book."
+
+    return True, f"Hold placed. You are number {hold['queue_position']} in line."
+
+
+def cancel_hold_for_patron(patron_id: str, book_id: int) -> Tuple[bool, str]:
+    """
+    Cancel a patron's hold on a book. A copy set aside for the hold passes to
+    the next patron in line, or back to the shelf.
+
+    Returns:
+        tuple: (success: bool, message: str)
+    """
+    if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
+        return False, "Invalid patron ID. Must be exactly 6 digits."
+
+    try:
+        status, _ = cancel_hold_atomic(patron_id, book_id, datetime.now(), HOLD_PICKUP_DAYS)
+    except Exception:
+        return False, "Database error occurred while cancelling the hold."
+
+    if status == 'not_found':
+        return False, "No active hold found for this patron and book."
+    return True, "Hold cancelled."
+
+
+def get_holds_for_patron(patron_id: str) -> List[Dict]:
+    """
+    List a patron's waiting and ready holds. Waiting holds carry their
+    queue_position; ready holds carry the expires_at pickup deadline.
+    """
+    if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
+        return []
+    return get_patron_holds(patron_id)
+
+
+def get_hold_queue(book_id: int) -> List[Dict]:
+    """List the patrons waiting for a book, first in line first."""
+    return get_book_holds(book_id)
 
 
 
@@ -249,16 +639,38 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
     """
     Calculate late fees for a specific book.
 
+    Uses the fee materialized by today's fee sweep when there is one, and
+    prices the due date directly otherwise.
     """
     if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "error: invalid patron id"}
 
-    active = get_patron_borrowed_books(patron_id) or []
-    rec = next((r for r in active if r.get("book_id") == book_id), None)
+    # Ids SQLite cannot hold (or non-integers) match no loan, as with the old in-Python lookup
+    if not isinstance(book_id, int) or not -MAX_SQL_INTEGER <= book_id <= MAX_SQL_INTEGER:
+        return {"fee_amount": 0.0, "days_overdue": 0, "status": "error: active borrow not found"}
+
+    today = datetime.today().date()
+    rec = get_active_loan_fee(patron_id, book_id, epoch_day(today))
     if rec is None:
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "error: active borrow not found"}
 
-    due = rec.get("due_date")
+    if rec["fee_amount"] is not None:
+        return {"fee_amount": rec["fee_amount"], "days_overdue": rec["days_overdue"], "status": "ok"}
+    return late_fee_for_due_date(rec["due_date"], today)
+
+
+def late_fee_for_due_date(due, today: date) -> Dict:
+    """
+    Price a loan from its due date: $0.50/day for the first 7 days overdue,
+    $1.00/day after that, capped at $15.00.
+
+    Args:
+        due: Due date as a date, datetime or ISO string
+        today: Date the fee is assessed on
+
+    Returns:
+        dict: fee_amount, days_overdue and status, as in calculate_late_fee_for_book
+    """
     if due is None:
         return {"fee_amount": 0.0, "days_overdue": 0, "status": "error: due date missing"}
 
@@ -276,7 +688,6 @@ def calculate_late_fee_for_book(patron_id: str, book_id: int) -> Dict:
         except ValueError:
             return {"fee_amount": 0.0, "days_overdue": 0, "status": "error: invalid due date format"}
 
-    today = datetime.today().date()
     days_overdue = max(0, (today - due).days)
 
     first_block = min(days_overdue, 7) * 0.50
@@ -298,64 +709,144 @@ def search_books_in_catalog(search_term: str, search_type: str) -> List[Dict]:
     if stype not in {"title", "author", "isbn"}:
         return []
 
-    books = get_all_books()
-
     if stype == "isbn":
         q = search_term.strip()
         if not (len(q) == 13 and q.isdigit()):
             return []
-        return [b for b in books if b.get("isbn") == q]
+        return search_books("isbn", q)
+
+    return search_books(stype, search_term.strip())
 
-    q = search_term.lower().strip()
-    if stype == "title":
-        return [b for b in books if q in (b.get("title") or "").lower()]
-    else:  # author
-        return [b for b in books if q in (b.get("author") or "").lower()]
+
+def encode_catalog_cursor(book: Dict) -> str:
+    """Encode the (title, id) position of a book as an opaque URL-safe cursor."""
+    raw = json.dumps([book["title"], book["id"]], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_catalog_cursor(cursor: str) -> Optional[Tuple[str, int]]:
+    """Decode a cursor from encode_catalog_cursor; returns None if it is malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        title, book_id = json.loads(raw.decode("utf-8"))
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        return None
+    if not isinstance(title, str) or not isinstance(book_id, int):
+        return None
+    return title, book_id
+
+
+def get_catalog_page(cursor: Optional[str] = None, page_size: int = DEFAULT_PAGE_SIZE,
+                     available_only: bool = False) -> Dict:
+    """
+    Get one page of the catalog ordered by title.
+    Implements R2 for large catalogs with keyset pagination, so every page
+    costs the same regardless of how deep it is.
+
+    Args:
+        cursor: Cursor returned as next_cursor by the previous page (None for the first page)
+        page_size: Books per page (1 to MAX_PAGE_SIZE)
+        available_only: Only list books with copies available
+
+    Returns:
+        dict: books, next_cursor, page_size and available_only, or error
+    """
+    if not isinstance(page_size, int) or not 1 <= page_size <= MAX_PAGE_SIZE:
+        return {"error": f"Page size must be between 1 and {MAX_PAGE_SIZE}."}
+
+    after = None
+    if cursor:
+        after = decode_catalog_cursor(cursor)
+        if after is None:
+            return {"error": "Invalid page cursor."}
+
+    books, has_more = get_books_page(page_size, after, available_only)
+    return {
+        "books": books,
+        "next_cursor": encode_catalog_cursor(books[-1]) if has_more else None,
+        "page_size": page_size,
+        "available_only": available_only,
+    }
 
 
 def get_patron_status_report(patron_id: str) -> Dict:
     """
     Get status report for a patron.
     
-    TODO: Implement R7 as per requirements
+    Served from the patron_summary table with one primary-key read while the
+    stored report is current; otherwise it is rebuilt and stored again. Borrow
+    and return drop the stored report (via triggers), so the next read
+    rebuilds it. Patrons who have never borrowed get an empty report that is
+    not stored.
     """
     if not (isinstance(patron_id, str) and patron_id.isdigit() and len(patron_id) == 6):
         return {"error": "Invalid patron ID. Must be exactly 6 digits."}
 
-    active = get_patron_borrowed_books(patron_id) or []
+    report = get_patron_summary(patron_id, epoch_day(datetime.today().date()))
+    if report is not None:
+        return report
+    return refresh_patron_summary(patron_id)
+
+
+def refresh_patron_summary(patron_id: str) -> Dict:
+    """Rebuild a patron's status report from their loans and store it in patron_summary (if they have any)."""
+    today = datetime.today().date()
+    return store_patron_summary(patron_id, epoch_day(today),
+                                lambda active, history: _summarize_loans(patron_id, active, history, today))
+
+
+def refresh_stale_patron_summaries(as_of: Optional[date] = None) -> int:
+    """
+    Rebuild every stored summary whose fees have moved on since it was built.
+    Run by the fee sweep; returns the number of summaries rebuilt.
+    """
+    patron_ids = get_stale_patron_summaries(epoch_day(as_of or datetime.today().date()))
+    for patron_id in patron_ids:
+        refresh_patron_summary(patron_id)
+    return len(patron_ids)
+
+
+def build_patron_status_report(patron_id: str) -> Dict:
+    """Build a patron's status report from their loans, bypassing patron_summary."""
+    today = datetime.today().date()
+    active, history_count = get_patron_loan_summary(patron_id, epoch_day(today))
+    return _summarize_loans(patron_id, active, history_count, today)[0]
+
 
+def _summarize_loans(patron_id: str, active: List[Dict], history_count: int,
+                     today: date) -> Tuple[Dict, Optional[int]]:
+    """
+    Price a patron's active loans into the status report.
+
+    Returns:
+        tuple: (report, stale_day) where stale_day is the first epoch day on
+        which one of the report's fees changes, or None if all are capped
+    """
+    # Fees swept for today are used as stored; other loans are priced from their due date
     items: List[Dict] = []
     total_fees = 0.0
+    stale_day = None
     for rec in active:
-        book_id = rec["book_id"]
-
-        fee_info = calculate_late_fee_for_book(patron_id, book_id)
-        if isinstance(fee_info, dict) and fee_info.get("status") == "ok":
-            fee = float(fee_info.get("fee_amount", 0.0))
-            due_iso = fee_info.get("due_date") or rec["due_date"].isoformat()
-        else:
-            fee = 0.0
-            due_iso = rec["due_date"].isoformat()
+        due = datetime.fromisoformat(rec["due_date"])
+        fee = rec["fee_amount"]
+        if fee is None:
+            fee = late_fee_for_due_date(due, today)["fee_amount"]
+        if fee < MAX_FEE:
+            changes = max(epoch_day(today), epoch_day(due)) + 1
+            stale_day = changes if stale_day is None else min(stale_day, changes)
 
         total_fees += fee
         items.append({
-            "book_id": book_id,
-            "due_date": due_iso,
+            "book_id": rec["book_id"],
+            "due_date": due.isoformat(),
             "late_fee_accrued": round(fee, 2),
         })
 
-    conn = get_db_connection()
-    row = conn.execute(
-        "SELECT COUNT(*) AS c FROM borrow_records WHERE patron_id = ?",
-        (patron_id,)
-    ).fetchone()
-    conn.close()
-    history_count = row["c"] if row else 0
-
-    return {
+    report = {
         "patron_id": patron_id,
         "currently_borrowed": items,
         "total_late_fees_owed": round(total_fees, 2),
         "number_currently_borrowed": len(active),
         "borrowing_history_count": history_count,
-    }
\ No newline at end of file
+    }
+    return report, stale_day
@@ -0,0 +1,96 @@
+"""
+Maintenance Module - Consistency Checks for Denormalized Data
+Verifies (and optionally rebuilds) tables that are kept in step with
+borrow_records: the per-patron loan counters and the stored patron status
+reports (patron_summary).
+
+Usage:
+    python -m services.maintenance check
+    python -m services.maintenance rebuild
+"""
+
+import argparse
+import json
+from datetime import date
+from typing import Dict, List
+from database import (
+    init_database, check_patron_counters, rebuild_patron_counters, epoch_day,
+    get_patron_summaries, clear_patron_summaries, get_patron_ids
+)
+from services.library_service import build_patron_status_report, refresh_patron_summary
+
+
+def check_patron_summaries() -> List[Dict]:
+    """
+    Compare every current patron_summary row with a report built from the loans.
+
+    Returns:
+        list: One dict per patron whose stored report differs, with both versions
+    """
+    mismatches = []
+    today = epoch_day(date.today())
+    rows = get_patron_summaries(today)
+    while rows:
+        for row in rows:
+            stored = json.loads(row['report'])
+            actual = build_patron_status_report(row['patron_id'])
+            if stored != actual:
+                mismatches.append({'patron_id': row['patron_id'], 'stored': stored, 'actual': actual})
+        rows = get_patron_summaries(today, after=rows[-1]['patron_id'])
+    return mismatches
+
+
+def rebuild_patron_summaries() -> int:
+    """Drop every stored patron report and rebuild one per patron; returns how many were built."""
+    clear_patron_summaries()
+    patron_ids = get_patron_ids()
+    for patron_id in patron_ids:
+        refresh_patron_summary(patron_id)
+    return len(patron_ids)
+
+
+def check() -> Dict:
+    """Recount borrow_records and report every patron whose counters or summary drifted."""
+    mismatches = check_patron_counters()
+    summaries = check_patron_summaries()
+    return {
+        'patron_counters': {'ok': not mismatches, 'mismatches': mismatches},
+        'patron_summary': {'ok': not summaries, 'mismatches': summaries},
+    }
+
+
+def rebuild() -> Dict:
+    """Recompute every patron's counters, then their stored status reports, from borrow_records."""
+    return {
+        'patron_counters': {'patrons': rebuild_patron_counters()},
+        'patron_summary': {'patrons': rebuild_patron_summaries()},
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('command', choices=('check', 'rebuild'))
+    args = parser.parse_args(argv)
+
+    init_database()
+    if args.command == 'rebuild':
+        report = rebuild()
+        print(f"patron counters: rebuilt {report['patron_counters']['patrons']} patrons")
+        print(f"patron summary: rebuilt {report['patron_summary']['patrons']} patrons")
+        return 0
+
+    report = check()
+    counters = report['patron_counters']
+    for m in counters['mismatches']:
+        print(f"patron {m['patron_id']}: active {m['stored_active']} != {m['actual_active']}, "
+              f"lifetime {m['stored_lifetime']} != {m['actual_lifetime']}")
+    print(f"patron counters: {'ok' if counters['ok'] else str(len(counters['mismatches'])) + ' mismatched'}")
+    summaries = report['patron_summary']
+    for m in summaries['mismatches']:
+        print(f"patron {m['patron_id']}: stored summary {m['stored']} != {m['actual']}")
+    print(f"patron summary: {'ok' if summaries['ok'] else str(len(summaries['mismatches'])) + ' mismatched'}")
+    return 0 if counters['ok'] and summaries['ok'] else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,177 @@
+"""
+Tests for AsyncPaymentGateway and the async late-fee payment/refund paths
+Runs against a local stub gateway served by aiohttp on 127.0.0.1
+"""
+
+import os
+import asyncio
+import time
+import pytest
+from datetime import date, timedelta
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from database import init_database, insert_book, insert_borrow_record
+from services.async_payment_service import AsyncPaymentGateway
+from services.library_service import pay_late_fees_async, refund_late_fee_payment_async
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+class StubGateway:
+    """In-process fake of the payment gateway HTTP API."""
+
+    def __init__(self, delay=0.0, fail_first=0, fail_status=503):
+        self.delay = delay
+        self.fail_first = fail_first
+        self.fail_status = fail_status
+        self.requests = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def app(self):
+        app = web.Application()
+        app.router.add_post('/charges', self.charge)
+        app.router.add_post('/refunds', self.refund)
+        app.router.add_get('/charges/{txn}', self.status)
+        return app
+
+    async def _enter(self, request):
+        self.requests.append(request)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        if len(self.requests) <= self.fail_first:
+            return web.json_response({'message': 'try again'}, status=self.fail_status)
+        return None
+
+    async def charge(self, request):
+        failure = await self._enter(request)
+        if failure:
+            return failure
+        body = await request.json()
+        key = request.headers.get('Idempotency-Key', '')
+        return web.json_response({'success': True, 'transaction_id': f"txn_{body['customer_id']}_{key[:8]}",
+                                  'message': f"Payment of ${body['amount']:.2f} processed successfully"})
+
+    async def refund(self, request):
+        failure = await self._enter(request)
+        if failure:
+            return failure
+        body = await request.json()
+        return web.json_response({'success': True,
+                                  'message': f"Refund of ${body['amount']:.2f} processed successfully"})
+
+    async def status(self, request):
+        await self._enter(request)
+        txn = request.match_info['txn']
+        if txn == 'txn_missing':
+            return web.json_response({'status': 'not_found'}, status=404)
+        return web.json_response({'transaction_id': txn, 'status': 'completed'})
+
+
+def run_with_stub(stub, scenario, **gateway_kwargs):
+    """Start the stub server, run scenario(gateway), and shut everything down."""
+    async def main():
+        async with TestServer(stub.app(), host='127.0.0.1') as server:
+            gateway_kwargs.setdefault('backoff_base', 0.001)
+            async with AsyncPaymentGateway(base_url=str(server.make_url('')), **gateway_kwargs) as gateway:
+                return await scenario(gateway)
+    return asyncio.run(main())
+
+
+def _overdue_loan(book_id=1, patron_id="123456", days=10):
+    insert_book(f"Book {book_id}", "Author", f"{book_id:013d}", 1, 0)
+    insert_borrow_record(patron_id, book_id, date.today() - timedelta(days=14 + days),
+                         date.today() - timedelta(days=days))
+
+
+def test_process_payment_against_stub():
+    stub = StubGateway()
+    ok, txn, msg = run_with_stub(stub, lambda g: g.process_payment("123456", 6.5, "Late fees"))
+    assert ok and txn.startswith("txn_123456_") and "$6.50" in msg
+    assert stub.requests[0].headers['Authorization'] == 'Bearer test_key_12345'
+
+
+def test_retries_transient_errors_with_same_idempotency_key():
+    """5xx responses are retried; every attempt carries the same Idempotency-Key"""
+    stub = StubGateway(fail_first=2)
+    ok, _, _ = run_with_stub(stub, lambda g: g.process_payment("123456", 5.0))
+    assert ok
+    assert len(stub.requests) == 3
+    assert len({r.headers['Idempotency-Key'] for r in stub.requests}) == 1
+
+
+def test_gives_up_after_max_retries():
+    stub = StubGateway(fail_first=10)
+    ok, txn, msg = run_with_stub(stub, lambda g: g.process_payment("123456", 5.0), max_retries=2)
+    assert not ok and txn == "" and "try again" in msg
+    assert len(stub.requests) == 3
+
+
+def test_client_errors_are_not_retried():
+    stub = StubGateway(fail_first=1, fail_status=402)
+    ok, _, _ = run_with_stub(stub, lambda g: g.process_payment("123456", 5.0))
+    assert not ok and len(stub.requests) == 1
+
+
+def test_timeout_surfaces_as_payment_processing_error():
+    """A gateway slower than the timeout fails the payment after retrying"""
+    _overdue_loan()
+    stub = StubGateway(delay=0.5)
+    ok, msg, txn = run_with_stub(stub, lambda g: pay_late_fees_async("123456", 1, g),
+                                 timeout=0.05, max_retries=1)
+    assert not ok and txn is None and "Payment processing error" in msg
+    assert len(stub.requests) == 2
+
+
+def test_many_payments_in_flight_respect_per_host_limit():
+    """Concurrent payments overlap, capped at limit_per_host connections"""
+    for i in range(1, 21):
+        _overdue_loan(book_id=i, patron_id=f"{100000 + i:06d}")
+    stub = StubGateway(delay=0.1)
+
+    async def scenario(gateway):
+        return await asyncio.gather(*(pay_late_fees_async(f"{100000 + i:06d}", i, gateway)
+                                      for i in range(1, 21)))
+
+    start = time.perf_counter()
+    results = run_with_stub(stub, scenario, limit_per_host=5)
+    elapsed = time.perf_counter() - start
+
+    assert all(ok for ok, _, _ in results)
+    assert stub.max_in_flight == 5
+    assert elapsed < 20 * 0.1  # far less than running them one after another
+
+
+def test_pay_late_fees_async_validation_skips_gateway():
+    stub = StubGateway()
+    ok, msg, txn = run_with_stub(stub, lambda g: pay_late_fees_async("12345", 1, g))
+    assert not ok and "Invalid patron ID" in msg
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    ok, msg, txn = run_with_stub(stub, lambda g: pay_late_fees_async("123456", 1, g))
+    assert not ok and "No late fees" in msg
+    assert stub.requests == []
+
+
+def test_refund_async_and_status_checks():
+    stub = StubGateway()
+    ok, msg = run_with_stub(stub, lambda g: refund_late_fee_payment_async("txn_123456_1", 5.0, g))
+    assert ok and "Refund of $5.00" in msg
+
+    ok, msg = run_with_stub(stub, lambda g: refund_late_fee_payment_async("bad", 5.0, g))
+    assert not ok and msg == "Invalid transaction ID."
+    ok, msg = run_with_stub(stub, lambda g: refund_late_fee_payment_async("txn_1", 20.0, g))
+    assert not ok and "exceeds maximum" in msg
+
+    assert run_with_stub(stub, lambda g: g.verify_payment_status("txn_1"))['status'] == 'completed'
+    assert run_with_stub(stub, lambda g: g.verify_payment_status("txn_missing"))['status'] == 'not_found'
+    assert len(stub.requests) == 3
@@ -0,0 +1,43 @@
+"""
+Smoke tests for the benchmark suite (benchmarks/suite.py, benchmarks/datagen.py)
+"""
+
+import json
+import os
+import pytest
+import database
+from database import init_database, check_patron_counters, get_all_books
+from benchmarks import datagen, suite
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def test_generator_keeps_availability_and_counters_consistent():
+    summary = datagen.generate(books=50, loans=400, patrons=20)
+    assert summary['books'] == 50 and len(summary['patrons']) == 20
+    with database.db_connection() as conn:
+        open_loans = conn.execute('SELECT COUNT(*) FROM borrow_records WHERE return_date IS NULL').fetchone()[0]
+        on_shelf = conn.execute('SELECT SUM(total_copies - available_copies) FROM books').fetchone()[0]
+    assert open_loans == on_shelf == summary['open_loans']
+    assert all(0 <= b['available_copies'] <= b['total_copies'] for b in get_all_books())
+    assert check_patron_counters() == []
+
+
+def test_suite_writes_json_and_flags_regressions(tmp_path):
+    out = tmp_path / "results.json"
+    assert suite.main(['--books', '30', '--loans', '60', '--patrons', '5', '--iterations', '3',
+                       '--case', 'search_title', '--case', 'route_api_books', '--output', str(out)]) == 0
+    results = json.loads(out.read_text())
+    assert set(results['cases']) == {'search_title', 'route_api_books'}
+    assert results['meta']['books'] == 30
+
+    baseline = {'cases': {name: dict(r, p50_ms=r['p50_ms'] / 10) for name, r in results['cases'].items()}}
+    rows = suite.compare(results, baseline, threshold=0.25, min_delta_ms=0)
+    assert all(row['regression'] for row in rows)
+    assert not any(row['regression'] for row in suite.compare(results, results))
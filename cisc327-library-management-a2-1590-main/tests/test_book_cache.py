@@ -0,0 +1,109 @@
+"""
+Tests for the read-through book cache behind get_book_by_id / get_book_by_isbn
+"""
+
+import os
+import time
+import pytest
+from database import (
+    init_database, insert_book, get_book_by_id, get_book_by_isbn, update_book_availability,
+    get_book_cache, get_book_cache_stats, configure_book_cache, db_connection
+)
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database and an empty, enabled cache for each test."""
+    os.chdir(tmp_path)
+    configure_book_cache(enabled=True, max_size=1024, ttl=60.0)
+    init_database()
+    yield
+    configure_book_cache(enabled=True, max_size=1024, ttl=60.0)
+
+
+def test_repeat_lookups_hit_cache_by_id_and_isbn():
+    insert_book("Book", "Author", "1234567890123", 2, 2)
+    assert get_book_by_id(1)['title'] == "Book"
+    assert get_book_by_id(1)['title'] == "Book"
+    assert get_book_by_isbn("1234567890123")['id'] == 1
+
+    stats = get_book_cache_stats()
+    assert stats['misses'] == 1 and stats['hits'] == 2
+    assert stats['hit_rate'] == round(2 / 3, 4)
+
+
+def test_cached_rows_are_read_only():
+    """Cached Book records are shared between callers, so they must not be mutable"""
+    insert_book("Book", "Author", "1234567890123", 2, 2)
+    with pytest.raises(TypeError):
+        get_book_by_id(1)['title'] = "Mutated"
+    with pytest.raises(AttributeError):
+        get_book_by_id(1).available_copies = -99
+    with pytest.raises(AttributeError):
+        del get_book_by_id(1).title
+    assert get_book_by_id(1) == {'id': 1, 'title': "Book", 'author': "Author",
+                                 'isbn': "1234567890123", 'total_copies': 2, 'available_copies': 2}
+
+
+def test_availability_writes_invalidate():
+    """update_book_availability and the borrow/return paths never leave stale counts"""
+    insert_book("Book", "Author", "1234567890123", 3, 3)
+    assert get_book_by_id(1)['available_copies'] == 3
+
+    update_book_availability(1, -1)
+    assert get_book_by_id(1)['available_copies'] == 2
+
+    svc.borrow_book_by_patron("123456", 1)
+    assert get_book_by_isbn("1234567890123")['available_copies'] == 1
+
+    svc.return_book_by_patron("123456", 1)
+    assert get_book_by_id(1)['available_copies'] == 2
+
+
+def test_stale_read_cannot_repopulate_after_invalidation():
+    """A row read before a write commits is discarded by put()"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    cache = get_book_cache()
+    version = cache.version
+    with db_connection() as conn:
+        stale = dict(conn.execute("SELECT * FROM books WHERE id = 1").fetchone())
+    update_book_availability(1, -1)
+    cache.put(stale, version)
+    assert get_book_by_id(1)['available_copies'] == 0
+
+
+def test_lru_eviction_and_ttl_expiry():
+    configure_book_cache(max_size=2, ttl=0.05)
+    for i in range(1, 4):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+        get_book_by_id(i)
+    stats = get_book_cache_stats()
+    assert stats['size'] == 2 and stats['evictions'] == 1
+
+    time.sleep(0.06)
+    get_book_by_id(3)
+    assert get_book_cache_stats()['hits'] == 0
+
+
+def test_cache_can_be_disabled_for_tests():
+    configure_book_cache(enabled=False)
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    get_book_by_id(1)
+    with db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'Edited' WHERE id = 1")
+        conn.commit()
+    assert get_book_by_id(1)['title'] == "Edited"
+    assert get_book_cache_stats()['hits'] == 0 and get_book_cache_stats()['enabled'] is False
+
+
+def test_cache_is_per_database_file(tmp_path):
+    insert_book("First DB", "Author", "1234567890123", 1, 1)
+    assert get_book_by_id(1)['title'] == "First DB"
+
+    other = tmp_path / "other"
+    other.mkdir()
+    os.chdir(other)
+    init_database()
+    insert_book("Second DB", "Author", "1234567890123", 1, 1)
+    assert get_book_by_id(1)['title'] == "Second DB"
@@ -0,0 +1,114 @@
+"""
+Tests for the streaming export (services/catalog_export.py, /api/export/<dataset>.<fmt>)
+"""
+
+import csv
+import io
+import json
+import os
+import pytest
+from datetime import datetime, timedelta
+import database
+from app import create_app
+from database import (
+    init_database, insert_book, insert_borrow_record, update_borrow_record_return_date,
+    configure_pool, get_all_books
+)
+from services import catalog_export
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _seed_loans():
+    insert_book("Book, with comma", "Author \"Q\"", "1234567890123", 2, 2)
+    now = datetime(2024, 3, 1, 10, 0)
+    insert_borrow_record("111111", 1, now, now + timedelta(days=14))
+    insert_borrow_record("222222", 1, now, now + timedelta(days=14))
+    update_borrow_record_return_date("111111", 1, now + timedelta(days=2))
+
+
+def test_books_csv_round_trips():
+    insert_book("Book, with comma", "Author \"Q\"", "1234567890123", 2, 1)
+    text = ''.join(catalog_export.export_rows('books', 'csv'))
+    rows = list(csv.DictReader(io.StringIO(text)))
+    assert rows == [{'id': '1', 'title': "Book, with comma", 'author': 'Author "Q"',
+                     'isbn': '1234567890123', 'total_copies': '2', 'available_copies': '1'}]
+
+
+def test_loans_ndjson_includes_open_and_returned_loans():
+    _seed_loans()
+    lines = ''.join(catalog_export.export_rows('loans', 'ndjson')).splitlines()
+    loans = [json.loads(line) for line in lines]
+    assert [(l['patron_id'], l['return_date'] is None) for l in loans] == [("111111", False), ("222222", True)]
+    assert loans[0]['borrow_date'] == "2024-03-01T10:00:00"
+
+
+def test_export_is_lazy_and_chunked_per_batch():
+    """Nothing is read until iteration; each fetchmany batch becomes one chunk"""
+    chunks = catalog_export.export_rows('books', 'csv', batch_size=2)
+    for i in range(5):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+    chunks = list(chunks)
+    assert chunks[0] == "id,title,author,isbn,total_copies,available_copies\n"
+    assert [chunk.count("\n") for chunk in chunks[1:]] == [2, 2, 1]
+
+
+def test_patron_filter_and_validation():
+    _seed_loans()
+    lines = ''.join(catalog_export.export_rows('loans', 'ndjson', patron_id="222222")).splitlines()
+    assert len(lines) == 1
+    with pytest.raises(ValueError):
+        catalog_export.export_rows('patrons', 'csv')
+    with pytest.raises(ValueError):
+        catalog_export.export_rows('books', 'xml')
+
+
+def test_export_endpoint_streams(client):
+    _seed_loans()
+    response = client.get('/api/export/loans.csv?patron_id=111111')
+    assert response.status_code == 200
+    assert response.is_streamed
+    assert response.mimetype == 'text/csv'
+    assert 'attachment; filename="loans.csv"' == response.headers['Content-Disposition']
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert [r['patron_id'] for r in rows] == ["111111"]
+
+    response = client.get('/api/export/books.ndjson')
+    assert response.mimetype == 'application/x-ndjson'
+    isbns = [json.loads(line)['isbn'] for line in response.get_data(as_text=True).splitlines()]
+    assert "1234567890123" in isbns
+
+
+def test_export_endpoint_rejects_unknown_dataset_or_format(client):
+    assert client.get('/api/export/patrons.csv').status_code == 404
+    assert client.get('/api/export/books.xml').status_code == 404
+
+
+def test_open_exports_do_not_hold_pooled_connections():
+    """Exports stream on their own connections, so page reads never wait behind them"""
+    _seed_loans()
+    size, timeout = database.POOL_SIZE, database.POOL_TIMEOUT
+    configure_pool(size=1, timeout=0.05)
+    try:
+        exports = [catalog_export.export_rows('loans', 'ndjson', batch_size=1) for _ in range(3)]
+        for export in exports:
+            next(export)
+        assert [book['title'] for book in get_all_books()] == ["Book, with comma"]
+        assert database.get_pool_stats(readonly=True)['open'] == 1
+        for export in exports:
+            export.close()
+    finally:
+        configure_pool(size=size, timeout=timeout)
@@ -0,0 +1,126 @@
+"""
+Tests for the streaming bulk catalog import (services/catalog_import.py, /api/books/import)
+"""
+
+import io
+import json
+import os
+import pytest
+from app import create_app
+from database import init_database, insert_book, get_book_by_isbn, get_all_books, search_books
+from services import catalog_import
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+CSV_FEED = (
+    "title,author,isbn,total_copies\n"
+    "Dune,Frank Herbert,9780441172719,3\n"
+    ",No Title,9780000000001,1\n"
+    "Neuromancer,William Gibson,12345,2\n"
+    "Emma,Jane Austen,9780141439587,zero\n"
+    "Dune Again,Frank Herbert,9780441172719,1\n"
+    "Persuasion,Jane Austen,9780141439686,1\n"
+)
+
+
+def test_csv_import_inserts_valid_rows_and_reports_rejects():
+    report = catalog_import.import_books(io.StringIO(CSV_FEED), 'csv')
+
+    assert report['rows'] == 6
+    assert report['inserted'] == 2
+    assert report['duplicates'] == 1
+    assert report['rejected'] == 3
+    assert [(r['line'], r['error']) for r in report['rejections']] == [
+        (3, "Title is required."),
+        (4, "ISBN must be exactly 13 digits."),
+        (5, "Total copies must be a positive integer."),
+    ]
+    assert report['rows_per_second'] > 0
+
+    dune = get_book_by_isbn("9780441172719")
+    assert dune['title'] == "Dune" and dune['available_copies'] == 3
+
+
+def test_rejections_match_add_book_to_catalog_messages():
+    """Bulk validation is the R1 validation, message for message"""
+    cases = [("", "A", "1234567890123", 1), ("T" * 201, "A", "1234567890123", 1),
+             ("T", "", "1234567890123", 1), ("T", "A" * 101, "1234567890123", 1),
+             ("T", "A", "123", 1), ("T", "A", "1234567890123", 0), ("T", "A", "12345678901ab", 1)]
+    for title, author, isbn, copies in cases:
+        expected = svc.add_book_to_catalog(title, author, isbn, copies)[1]
+        line = json.dumps({"title": title, "author": author, "isbn": isbn, "total_copies": copies})
+        report = catalog_import.import_books(io.StringIO(line + "\n"), 'jsonl')
+        assert report['rejections'][0]['error'] == expected
+
+
+def test_existing_isbns_are_skipped_not_overwritten():
+    insert_book("Original", "Author", "1234567890123", 1, 1)
+    feed = "\n".join(json.dumps({"title": f"Book {i}", "author": "Author",
+                                 "isbn": f"{1234567890120 + i}", "total_copies": "2"})
+                     for i in range(6))
+    report = catalog_import.import_books(io.StringIO(feed), 'jsonl', batch_size=2)
+
+    assert report['inserted'] == 5 and report['duplicates'] == 1
+    assert get_book_by_isbn("1234567890123")['title'] == "Original"
+    assert len(get_all_books()) == 6
+
+
+def test_jsonl_bad_lines_are_rejected_and_blank_lines_skipped():
+    feed = '{"title": "A", "author": "B", "isbn": "1234567890123", "total_copies": 1}\n\nnot json\n[1, 2]\n'
+    report = catalog_import.import_books(io.StringIO(feed), 'jsonl')
+    assert report['inserted'] == 1
+    assert [(r['line'], r['error']) for r in report['rejections']] == [
+        (3, "Invalid JSON."), (4, "Each line must be a JSON object.")]
+
+
+def test_imported_books_are_searchable():
+    """The FTS triggers still fire for executemany inserts"""
+    catalog_import.import_books(io.StringIO(CSV_FEED), 'csv')
+    assert [b['title'] for b in search_books('author', 'austen')] == ["Persuasion"]
+
+
+def test_reported_rejections_are_capped():
+    feed = "title,author,isbn,total_copies\n" + ",,,\n" * 20
+    report = catalog_import.import_books(io.StringIO(feed), 'csv', max_reported_rejects=5)
+    assert report['rejected'] == 20 and len(report['rejections']) == 5
+
+
+def test_cli_imports_file(tmp_path, capsys):
+    path = tmp_path / "feed.csv"
+    path.write_text(CSV_FEED)
+    report = catalog_import.main([str(path)])
+    assert report['inserted'] == 2
+    assert "2 inserted, 1 duplicate ISBNs, 3 rejected" in capsys.readouterr().out
+
+
+def test_api_import_multipart_upload(client):
+    data = {'file': (io.BytesIO(CSV_FEED.encode('utf-8-sig')), 'feed.csv')}
+    response = client.post('/api/books/import', data=data, content_type='multipart/form-data')
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 2
+
+
+def test_api_import_raw_ndjson_body(client):
+    body = json.dumps({"title": "Dune", "author": "Frank Herbert",
+                       "isbn": "9780441172719", "total_copies": 2}) + "\n"
+    response = client.post('/api/books/import', data=body, content_type='application/x-ndjson')
+    assert response.status_code == 200
+    assert response.get_json()['inserted'] == 1
+
+    response = client.post('/api/books/import?format=xml', data=body)
+    assert response.status_code == 400
@@ -0,0 +1,113 @@
+"""
+Tests for keyset pagination of the catalog (/catalog and /api/books)
+"""
+
+import os
+import pytest
+from app import create_app
+from database import init_database, insert_book, db_connection
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _seed(n, duplicate_titles=False):
+    for i in range(n):
+        title = "Same Title" if duplicate_titles else f"Book {i:03d}"
+        insert_book(title, "Author", f"{i:013d}", 1, 0 if i % 3 == 0 else 1)
+
+
+def _walk(page_size, available_only=False):
+    seen, cursor = [], None
+    while True:
+        page = svc.get_catalog_page(cursor, page_size, available_only)
+        seen.extend(b['id'] for b in page['books'])
+        cursor = page['next_cursor']
+        if cursor is None:
+            return seen
+
+
+def test_pages_cover_catalog_in_title_order_without_gaps():
+    """Walking every page yields each book exactly once, ordered by (title, id)"""
+    _seed(23, duplicate_titles=True)
+    insert_book("Aardvark", "Author", "9999999999999", 1, 1)
+    with db_connection() as conn:
+        expected = [r['id'] for r in conn.execute("SELECT id FROM books ORDER BY title, id")]
+    assert _walk(5) == expected
+    assert _walk(100) == expected
+
+
+def test_available_only_filter():
+    """available_only skips books with no copies left"""
+    _seed(10)
+    ids = _walk(3, available_only=True)
+    assert len(ids) == 6
+    with db_connection() as conn:
+        rows = conn.execute(f"SELECT available_copies FROM books WHERE id IN ({','.join('?' * len(ids))})",
+                            ids).fetchall()
+    assert all(r['available_copies'] > 0 for r in rows)
+
+
+def test_invalid_page_size_and_cursor():
+    """Bad page sizes and cursors are rejected with an error"""
+    assert "error" in svc.get_catalog_page(None, 0)
+    assert "error" in svc.get_catalog_page(None, svc.MAX_PAGE_SIZE + 1)
+    assert "error" in svc.get_catalog_page("not-a-cursor!", 10)
+    assert svc.decode_catalog_cursor(svc.encode_catalog_cursor({"title": "Ü \"x\"", "id": 7})) == ("Ü \"x\"", 7)
+
+
+def test_page_query_seeks_index():
+    """Deep pages seek the (title, id) index instead of scanning and skipping"""
+    with db_connection() as conn:
+        for available in ("", "AND available_copies > 0"):
+            plan = [r['detail'] for r in conn.execute(
+                f"EXPLAIN QUERY PLAN SELECT * FROM books WHERE (title, id) > (?, ?) {available} "
+                "ORDER BY title, id LIMIT ?", ("m", 1, 51))]
+            assert any('USING INDEX idx_books_title_id' in d for d in plan), plan
+            assert not [d for d in plan if 'TEMP B-TREE' in d], plan
+
+
+def test_catalog_route_renders_one_page_with_next_link(client):
+    """/catalog renders page_size rows and links to the next page"""
+    _seed(7)
+    resp = client.get('/catalog?page_size=3')
+    assert resp.status_code == 200
+    html = resp.get_data(as_text=True)
+    assert html.count('<tr>') == 4  # header + 3 books
+    assert 'Next page' in html
+
+    cursor = svc.get_catalog_page(None, 6)['next_cursor']
+    html = client.get(f'/catalog?page_size=6&cursor={cursor}').get_data(as_text=True)
+    assert 'Book 006' in html and 'Next page' not in html
+
+
+def test_catalog_route_bad_cursor_falls_back_to_first_page(client):
+    """A malformed cursor flashes an error and shows the first page"""
+    _seed(2)
+    html = client.get('/catalog?cursor=%%%').get_data(as_text=True)
+    assert 'Invalid page cursor.' in html and 'Book 000' in html
+
+
+def test_api_books_endpoint(client):
+    """/api/books returns JSON pages with a next_cursor"""
+    _seed(5)
+    data = client.get('/api/books?page_size=2&available=1').get_json()
+    assert data['count'] == 2 and data['available_only'] is True
+    assert all(b['available_copies'] > 0 for b in data['results'])
+    assert data['next_cursor']
+
+    resp = client.get('/api/books?page_size=0')
+    assert resp.status_code == 400 and 'error' in resp.get_json()
@@ -0,0 +1,195 @@
+"""
+Tests for the pooled SQLite connection manager in database.py
+"""
+
+import os
+import threading
+import pytest
+import sqlite3
+import database
+from database import (
+    init_database, insert_book, get_book_by_id, get_patron_borrow_count, get_db_connection,
+    db_connection, read_connection, get_pool, get_pool_stats, configure_pool, configure_storage,
+    close_pools
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database and pool for each test."""
+    os.chdir(tmp_path)
+    size, timeout = database.POOL_SIZE, database.POOL_TIMEOUT
+    configure_pool(size=size, timeout=timeout)
+    init_database()
+    yield
+    configure_storage('wal')
+    configure_pool(size=size, timeout=timeout)
+
+
+def test_helpers_reuse_pooled_connection():
+    """Sequential helper calls should reuse one connection instead of reconnecting"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    for _ in range(10):
+        assert get_patron_borrow_count("123456") == 0
+
+    stats = get_pool_stats()
+    assert stats['misses'] == 1
+    assert stats['hits'] >= 1
+    assert stats['open'] == 1
+
+    stats = get_pool_stats(readonly=True)
+    assert stats['misses'] == 1
+    assert stats['hits'] == 9
+    assert stats['open'] == 1
+
+
+def test_pragmas_applied_on_connect():
+    """Pooled connections should carry the configured pragmas"""
+    with db_connection() as conn:
+        timeout = conn.execute('PRAGMA busy_timeout').fetchone()[0]
+    assert timeout == database.PRAGMAS['busy_timeout']
+
+
+def test_get_db_connection_close_returns_to_pool():
+    """close() on a legacy connection hands it back rather than closing it"""
+    conn = get_db_connection()
+    conn.execute('SELECT 1')
+    conn.close()
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+    assert get_pool_stats()['idle'] == 1
+
+
+def test_uncommitted_work_rolled_back_on_release():
+    """A connection returned mid-transaction must not leak its writes"""
+    with db_connection() as conn:
+        conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                     "VALUES ('X', 'Y', '1234567890123', 1, 1)")
+    assert get_book_by_id(1) is None
+
+
+def test_pool_waits_then_times_out_when_exhausted():
+    """Callers wait for a free connection and fail after the timeout"""
+    configure_pool(size=1, timeout=0.05)
+    held = get_db_connection()
+    with pytest.raises(sqlite3.OperationalError):
+        get_db_connection()
+    held.close()
+
+    configure_pool(size=1, timeout=2.0)
+    held = get_db_connection()
+    releaser = threading.Timer(0.05, held.close)
+    releaser.start()
+    with db_connection() as conn:
+        assert conn.execute('SELECT 1').fetchone()[0] == 1
+    releaser.join()
+    assert get_pool_stats()['waits'] == 1
+
+
+def test_pool_is_per_database_path(tmp_path):
+    """Changing directory must not hand out connections to another database"""
+    first = get_pool()
+    other = tmp_path / "other"
+    other.mkdir()
+    os.chdir(other)
+    assert get_pool() is not first
+    assert get_pool().path == str(other / "library.db")
+
+
+def test_concurrent_helpers_share_bounded_pool():
+    """Many threads share at most POOL_SIZE connections"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    errors = []
+
+    def worker():
+        try:
+            for _ in range(20):
+                assert get_book_by_id(1) is not None
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(12)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert errors == []
+    assert get_pool_stats(readonly=True)['open'] <= database.POOL_SIZE
+
+
+def test_wal_profile_is_applied():
+    """The default storage profile puts the file in WAL mode with relaxed fsync"""
+    with db_connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+        assert conn.execute('PRAGMA synchronous').fetchone()[0] == 1  # NORMAL
+    with read_connection() as conn:
+        assert conn.execute('PRAGMA cache_size').fetchone()[0] == database.PRAGMAS['cache_size']
+
+
+def test_read_connections_cannot_write():
+    """Read helpers run on mode=ro connections"""
+    with read_connection() as conn:
+        with pytest.raises(sqlite3.OperationalError):
+            conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                         "VALUES ('X', 'Y', '1234567890123', 1, 1)")
+
+
+def test_readers_not_blocked_by_open_write_transaction():
+    """Under WAL a reader sees the last committed state while a writer holds the lock"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    with database.transaction() as conn:
+        conn.execute('UPDATE books SET available_copies = 0 WHERE id = 1')
+        with read_connection() as reader:
+            row = reader.execute('SELECT available_copies FROM books WHERE id = 1').fetchone()
+        assert row[0] == 1
+    assert get_patron_borrow_count("123456") == 0
+
+
+def test_rollback_profile_restores_defaults():
+    """configure_storage switches the journal mode back for new connections"""
+    configure_storage('rollback')
+    with db_connection() as conn:
+        assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'delete'
+    with pytest.raises(ValueError):
+        configure_storage('turbo')
+
+
+def test_get_db_connection_as_context_manager():
+    """with get_db_connection() commits on success and hands the connection back"""
+    with get_db_connection() as conn:
+        conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                     "VALUES ('X', 'Y', '1234567890123', 1, 1)")
+    assert get_book_by_id(1) is not None
+    with pytest.raises(sqlite3.ProgrammingError):
+        conn.execute('SELECT 1')
+
+    with pytest.raises(RuntimeError):
+        with get_db_connection() as conn:
+            conn.execute("UPDATE books SET title = 'Z'")
+            raise RuntimeError
+    assert get_book_by_id(1)['title'] == 'X'
+    assert get_pool_stats()['idle'] == get_pool_stats()['open']
+
+
+def test_leaked_connections_return_to_pool():
+    """A proxy dropped without close() gives its connection back when collected"""
+    configure_pool(size=2, timeout=0.05)
+    for _ in range(5):
+        conn = get_db_connection()
+        conn.execute('SELECT 1')
+        del conn
+    with db_connection() as conn:
+        assert conn.execute('SELECT 1').fetchone()[0] == 1
+    assert get_pool_stats()['open'] <= 2
+
+
+def test_connections_released_after_close_pools_are_closed():
+    """A connection checked out across close_pools() is closed on release, not orphaned"""
+    pool = get_pool()
+    held = get_db_connection()
+    close_pools()
+    held.close()
+    assert pool.stats()['open'] == 0 and pool.stats()['idle'] == 0
+    assert get_pool() is not pool
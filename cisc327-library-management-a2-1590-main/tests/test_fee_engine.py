@@ -0,0 +1,68 @@
+"""
+Tests for the bulk late-fee engine (services/fee_engine.py)
+Bulk prices must agree with calculate_late_fee_for_book
+"""
+
+import os
+import pytest
+from datetime import date, datetime, timedelta
+from database import init_database, insert_book, insert_borrow_record, update_borrow_record_return_date
+from services import fee_engine
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def test_price_due_dates_matches_scalar_rule():
+    """Every overdue length from 0 to 40 days prices exactly like late_fee_for_due_date"""
+    today = date(2024, 3, 1)
+    dues = [(today - timedelta(days=d)).isoformat() for d in range(-5, 41)]
+    dues += [(datetime(2024, 2, 1, 15, 30) + timedelta(days=d)).isoformat() for d in range(5)]
+    days, fees, valid = fee_engine.price_due_dates(dues, today)
+    for due, d, fee, ok in zip(dues, days, fees, valid):
+        expected = svc.late_fee_for_due_date(due, today)
+        assert ok and (d, fee) == (expected['days_overdue'], expected['fee_amount']), due
+
+
+def test_invalid_due_dates_are_flagged_not_charged():
+    """Malformed dates price at 0 and are marked invalid, like the scalar function"""
+    days, fees, valid = fee_engine.price_due_dates(["2024-01-01", "garbage!!!", "2024-13-01"],
+                                                   date(2024, 1, 20))
+    assert valid == [True, False, False]
+    assert fees == [15.0, 0.0, 0.0] and days[1:] == [0, 0]
+
+
+def test_iter_late_fees_streams_open_overdue_loans():
+    """Streaming over borrow_records agrees with calculate_late_fee_for_book per loan"""
+    today = date.today()
+    for i in range(1, 31):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+        patron = f"{100000 + i % 4:06d}"
+        insert_borrow_record(patron, i, today - timedelta(days=14 + i), today - timedelta(days=i - 3))
+    update_borrow_record_return_date("100001", 1, today)
+
+    fees = list(fee_engine.iter_late_fees(batch_size=7))
+    assert all(f['fee_amount'] > 0 for f in fees)
+    assert 1 not in [f['book_id'] for f in fees]
+    for f in fees:
+        assert f['fee_amount'] == svc.calculate_late_fee_for_book(f['patron_id'], f['book_id'])['fee_amount']
+
+    everything = list(fee_engine.iter_late_fees(overdue_only=False, batch_size=7))
+    assert len(everything) == 29
+
+    summary = fee_engine.summarize_late_fees(batch_size=7)
+    assert summary['open_loans'] == 29
+    assert summary['overdue_loans'] == len(fees)
+    assert summary['total_fees'] == round(sum(f['fee_amount'] for f in fees), 2)
+
+
+def test_missing_due_dates_are_invalid():
+    assert fee_engine.price_due_dates([], date(2024, 1, 10)) == ([], [], [])
+    assert fee_engine.price_due_dates(["2024-01-01", None], date(2024, 1, 10)) == \
+        ([9, 0], [5.5, 0.0], [True, False])
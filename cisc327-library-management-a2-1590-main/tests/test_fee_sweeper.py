@@ -0,0 +1,155 @@
+"""
+Tests for the incremental fee sweep, the materialized late fee lookups and the sweep scheduler
+"""
+
+import os
+import time
+from datetime import date, datetime, timedelta
+import pytest
+from app import create_app
+from database import (
+    init_database, insert_book, insert_borrow_record, update_borrow_record_return_date,
+    get_fee_sweep_day, epoch_day, read_connection, db_connection, configure_storage,
+    get_active_loan_fee
+)
+from services import fee_sweeper
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database with a patron holding an overdue, a due-soon and an on-time loan."""
+    os.chdir(tmp_path)
+    init_database()
+    now = datetime.now()
+    for i in range(1, 4):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+    insert_borrow_record("123456", 1, now - timedelta(days=30), now - timedelta(days=16))
+    insert_borrow_record("123456", 2, now - timedelta(days=14), now + timedelta(days=1))
+    insert_borrow_record("123456", 3, now - timedelta(days=2), now + timedelta(days=12))
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _loan_fees():
+    with read_connection() as conn:
+        return {row['book_id']: (row['days_overdue'], row['fee_amount'], row['swept_day'])
+                for row in conn.execute('SELECT * FROM loan_fees')}
+
+
+def test_sweep_materializes_overdue_loans():
+    report = fee_sweeper.run_sweep()
+    today = epoch_day(date.today())
+    assert report['swept_day'] == today and get_fee_sweep_day() == today
+    assert _loan_fees() == {1: (16, 12.5, today)}
+
+
+def test_same_day_sweep_only_touches_changed_loans():
+    fee_sweeper.run_sweep()
+    assert fee_sweeper.run_sweep()['changed'] == 0
+
+    insert_book("Book 4", "Author", "0000000000004", 1, 1)
+    insert_borrow_record("123456", 4, datetime.now() - timedelta(days=20), datetime.now() - timedelta(days=3))
+    update_borrow_record_return_date("123456", 1, datetime.now())
+    assert 1 not in _loan_fees()  # a returned loan loses its fee row at once
+
+    report = fee_sweeper.run_sweep()
+    assert (report['changed'], report['newly_overdue'], report['aged']) == (2, 0, 0)
+    assert _loan_fees() == {4: (3, 1.5, epoch_day(date.today()))}
+
+
+def test_next_day_sweep_ages_fees_and_adds_newly_overdue():
+    fee_sweeper.run_sweep()
+    tomorrow = date.today() + timedelta(days=1)
+    report = fee_sweeper.run_sweep(as_of=tomorrow)
+    assert (report['changed'], report['newly_overdue'], report['aged']) == (0, 0, 1)
+
+    later = date.today() + timedelta(days=3)
+    report = fee_sweeper.run_sweep(as_of=later)
+    assert (report['newly_overdue'], report['aged']) == (1, 1)
+    assert _loan_fees() == {1: (19, 15.0, epoch_day(later)), 2: (2, 1.0, epoch_day(later))}
+
+
+def test_capped_fees_are_final_and_not_repriced():
+    later = date.today() + timedelta(days=3)
+    fee_sweeper.run_sweep(as_of=later)
+    with read_connection() as conn:
+        final = {row[0]: row[1] for row in conn.execute('SELECT book_id, final FROM loan_fees')}
+    assert final == {1: 1, 2: 0}
+
+    even_later = later + timedelta(days=5)
+    report = fee_sweeper.run_sweep(as_of=even_later)
+    assert (report['newly_overdue'], report['aged']) == (0, 1)
+    assert _loan_fees()[1] == (19, 15.0, epoch_day(later))
+
+    # Readers accept a final row whatever day it was priced, with days overdue still counting
+    fee = get_active_loan_fee("123456", 1, epoch_day(even_later))
+    assert (fee['days_overdue'], fee['fee_amount']) == (24, 15.0)
+    assert get_active_loan_fee("123456", 1, epoch_day(later) - 1)['fee_amount'] is None
+
+
+def test_sweep_pages_newly_overdue_loans_under_rollback_journal():
+    """No read cursor stays open across a batch commit, so the rollback journal cannot deadlock"""
+    configure_storage('rollback')
+    try:
+        today = datetime.now()
+        for i in range(4, 34):
+            insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+            insert_borrow_record("654321", i, today - timedelta(days=14), today)
+        fee_sweeper.run_sweep()
+
+        report = fee_sweeper.run_sweep(as_of=date.today() + timedelta(days=1), batch_size=7)
+        assert report['newly_overdue'] == 30
+        assert len(_loan_fees()) == 31
+    finally:
+        configure_storage('wal')
+
+
+def test_unrepresentable_book_id_is_not_found(client):
+    response = client.get('/api/late_fee/123456/99999999999999999999')
+    assert response.status_code == 200
+    assert response.get_json()['status'] == 'error: active borrow not found'
+
+
+def test_lookups_read_swept_fees(mocker):
+    fee_sweeper.run_sweep()
+    pricing = mocker.patch('services.library_service.late_fee_for_due_date',
+                           wraps=svc.late_fee_for_due_date)
+
+    assert svc.calculate_late_fee_for_book("123456", 1) == \
+        {"fee_amount": 12.5, "days_overdue": 16, "status": "ok"}
+    pricing.assert_not_called()
+    assert svc.get_patron_status_report("123456")['total_late_fees_owed'] == 12.5
+    assert pricing.call_count == 2  # only the two loans that are not overdue
+
+
+def test_lookups_fall_back_when_the_sweep_is_stale():
+    fee_sweeper.run_sweep(as_of=date.today() - timedelta(days=1))
+    assert svc.calculate_late_fee_for_book("123456", 1)['fee_amount'] == 12.5
+
+    fee_sweeper.run_sweep()
+    with db_connection() as conn:
+        conn.execute('UPDATE borrow_records SET due_date = ? WHERE book_id = 1',
+                     ((datetime.now() - timedelta(days=2)).isoformat(),))
+        conn.commit()
+    assert svc.calculate_late_fee_for_book("123456", 1) == \
+        {"fee_amount": 1.0, "days_overdue": 2, "status": "ok"}
+
+
+def test_scheduler_sweeps_in_the_background():
+    scheduler = fee_sweeper.SweepScheduler(interval=60)
+    scheduler.start()
+    try:
+        deadline = time.monotonic() + 5
+        while scheduler.last_report is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        scheduler.stop(timeout=5)
+    assert not scheduler.running
+    assert (scheduler.last_report['changed'], scheduler.last_report['newly_overdue']) == (3, 1)
+    assert scheduler.failures == 0
@@ -0,0 +1,121 @@
+"""
+Tests for the hold queue: placing, cancelling, promotion on return and pickup expiry
+"""
+
+import os
+from datetime import datetime, timedelta
+import pytest
+from app import create_app
+from database import (
+    init_database, insert_book, get_book_by_id, get_book_holds, get_patron_holds,
+    expire_ready_holds, read_connection
+)
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database with one single-copy book, already on loan."""
+    os.chdir(tmp_path)
+    init_database()
+    insert_book("Dune", "Frank Herbert", "9780441172719", 1, 1)
+    assert svc.borrow_book_by_patron("100000", 1)[0]
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def _hold_status(patron_id):
+    with read_connection() as conn:
+        return [row[0] for row in conn.execute(
+            'SELECT status FROM holds WHERE patron_id = ? ORDER BY id', (patron_id,))]
+
+
+def test_holds_queue_in_order():
+    assert svc.place_hold_for_patron("200000", 1) == (True, "Hold placed. You are number 1 in line.")
+    assert svc.place_hold_for_patron("300000", 1) == (True, "Hold placed. You are number 2 in line.")
+    assert [h['patron_id'] for h in get_book_holds(1)] == ["200000", "300000"]
+    assert get_patron_holds("300000")[0]['queue_position'] == 2
+
+
+def test_place_hold_refusals():
+    assert svc.place_hold_for_patron("200000", 99) == (False, "Book not found.")
+    assert not svc.place_hold_for_patron("100000", 1)[0]
+    assert svc.place_hold_for_patron("200000", 1)[0]
+    assert svc.place_hold_for_patron("200000", 1) == (False, "You already have a hold on this book.")
+    insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    assert "available now" in svc.place_hold_for_patron("200000", 2)[1]
+
+
+def test_unavailable_borrow_suggests_a_hold():
+    success, message = svc.borrow_book_by_patron("200000", 1)
+    assert not success
+    assert "not available" in message and "hold" in message
+
+
+def test_return_promotes_next_patron_and_sets_copy_aside():
+    svc.place_hold_for_patron("200000", 1)
+    svc.place_hold_for_patron("300000", 1)
+    assert svc.return_book_by_patron("100000", 1)[0]
+
+    assert get_book_by_id(1)['available_copies'] == 0
+    ready = get_patron_holds("200000")[0]
+    assert ready['status'] == 'ready' and ready['expires_at']
+    assert not svc.borrow_book_by_patron("300000", 1)[0]
+
+    assert svc.borrow_book_by_patron("200000", 1)[0]
+    assert _hold_status("200000") == ['fulfilled']
+    assert get_book_by_id(1)['available_copies'] == 0
+    assert [h['patron_id'] for h in get_book_holds(1)] == ["300000"]
+
+
+def test_return_without_holds_shelves_the_copy():
+    svc.return_book_by_patron("100000", 1)
+    assert get_book_by_id(1)['available_copies'] == 1
+
+
+def test_cancelling_a_ready_hold_passes_the_copy_on():
+    svc.place_hold_for_patron("200000", 1)
+    svc.place_hold_for_patron("300000", 1)
+    svc.return_book_by_patron("100000", 1)
+
+    assert svc.cancel_hold_for_patron("200000", 1) == (True, "Hold cancelled.")
+    assert get_patron_holds("300000")[0]['status'] == 'ready'
+    assert svc.cancel_hold_for_patron("300000", 1)[0]
+    assert get_book_by_id(1)['available_copies'] == 1
+    assert not svc.cancel_hold_for_patron("300000", 1)[0]
+
+
+def test_expired_pickup_moves_down_the_queue():
+    svc.place_hold_for_patron("200000", 1)
+    svc.place_hold_for_patron("300000", 1)
+    svc.return_book_by_patron("100000", 1)
+
+    assert expire_ready_holds(datetime.now()) == 0
+    later = datetime.now() + timedelta(days=svc.HOLD_PICKUP_DAYS + 1)
+    assert expire_ready_holds(later) == 1
+    assert _hold_status("200000") == ['expired']
+    assert get_patron_holds("300000")[0]['status'] == 'ready'
+
+
+def test_holds_api(client):
+    response = client.post('/api/holds', json={'patron_id': '200000', 'book_id': 1})
+    assert response.status_code == 201
+    assert client.post('/api/holds', json={'patron_id': '200000', 'book_id': 1}).status_code == 400
+
+    holds = client.get('/api/holds/200000').get_json()
+    assert holds['count'] == 1 and holds['holds'][0]['title'] == "Dune"
+    assert client.get('/api/books/1/holds').get_json()['queue'][0]['patron_id'] == '200000'
+
+    assert client.delete('/api/holds/200000/1').status_code == 200
+    assert client.delete('/api/holds/200000/1').status_code == 404
+    assert client.get('/api/holds/200000').get_json()['count'] == 0
+
+
+def test_hold_form_on_catalog(client):
+    response = client.post('/hold', data={'patron_id': '200000', 'book_id': '1'}, follow_redirects=True)
+    assert "You are number 1 in line" in response.get_data(as_text=True)
@@ -0,0 +1,86 @@
+"""
+Tests for per-request SQL instrumentation, Server-Timing, /metrics and slow-request profiling
+"""
+
+import os
+import re
+import pytest
+import instrumentation
+from app import create_app
+from database import init_database, insert_book, get_book_by_id, get_all_books, configure_book_cache
+from routes import response_cache
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+    configure_book_cache(enabled=True)
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_tracking_counts_checkouts_queries_and_rows():
+    configure_book_cache(enabled=False)
+    for i in range(3):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+    get_book_by_id(1)  # open the read-only pool's connection (and its PRAGMAs) up front
+
+    stats, token = instrumentation.start_tracking()
+    try:
+        get_book_by_id(1)
+        get_all_books()
+    finally:
+        instrumentation.stop_tracking(token)
+
+    assert (stats.checkouts, stats.connects, stats.queries, stats.rows) == (2, 0, 2, 4)
+    assert stats.sql_time > 0
+
+
+def test_nothing_is_counted_outside_a_tracked_request():
+    stats, token = instrumentation.start_tracking()
+    instrumentation.stop_tracking(token)
+    get_all_books()
+    assert stats.queries == 0
+
+
+def test_server_timing_header_reports_sql(client):
+    response = client.get('/api/late_fee/123456/3')
+    timing = response.headers['Server-Timing']
+    match = re.match(r'db;dur=[\d.]+;desc="(\d+) queries, (\d+) rows, (\d+) conns", '
+                     r'app;dur=-?[\d.]+, total;dur=[\d.]+$', timing)
+    assert match, timing
+    assert int(match.group(1)) >= 1 and int(match.group(3)) >= 1
+
+
+def test_metrics_endpoint_exposes_prometheus_text(client):
+    client.get('/api/late_fee/123456/3')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert re.search(r'^library_requests_total\{endpoint="/api/late_fee/<patron_id>/<int:book_id>",'
+                     r'method="GET",status="200"\} \d+$', body, re.M)
+    assert 'library_request_duration_seconds_bucket{endpoint="/api/late_fee/<patron_id>/<int:book_id>",le="+Inf"}' in body
+    assert re.search(r'^library_db_queries_total\{endpoint="/api/late_fee/<patron_id>/<int:book_id>"\} [1-9]', body, re.M)
+    assert '# TYPE library_db_pool_open_connections gauge' in body
+
+
+def test_sampled_slow_requests_keep_a_profile(monkeypatch):
+    monkeypatch.setattr(instrumentation, 'SLOW_REQUEST_SECONDS', 0.0)
+    monkeypatch.setattr(instrumentation, 'PROFILE_SAMPLE_RATE', 1.0)
+    profiled = create_app().test_client()
+    response_cache.configure_render_cache(enabled=False)
+    try:
+        profiled.get('/catalog')
+    finally:
+        response_cache.configure_render_cache(enabled=True)
+
+    slow = instrumentation.get_slow_profiles()[-1]
+    assert slow['path'].startswith('/catalog')
+    assert 'function calls' in slow['profile']
+    assert '/catalog' in profiled.get('/metrics/profiles').get_data(as_text=True)
@@ -0,0 +1,175 @@
+"""
+Tests for the JSON borrow, return, patron status and payment endpoints
+"""
+
+import os
+from datetime import datetime, timedelta
+from unittest.mock import Mock
+import pytest
+import app as app_module
+from app import create_app
+from database import init_database, insert_book, insert_borrow_record, get_book_by_isbn
+from routes import api_routes, response_cache
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+@pytest.fixture
+def books():
+    """Two extra single-copy titles, by id."""
+    insert_book("Dune", "Frank Herbert", "9780441172719", 1, 1)
+    insert_book("Emma", "Jane Austen", "9780141439587", 1, 1)
+    return get_book_by_isbn("9780441172719")['id'], get_book_by_isbn("9780141439587")['id']
+
+
+@pytest.fixture
+def gateway(mocker):
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123", "Approved")
+    mocker.patch('routes.api_routes.PaymentGateway', return_value=gateway)
+    return gateway
+
+
+def test_borrow_one_book(client, books):
+    response = client.post('/api/borrow', json={'patron_id': '123456', 'book_id': books[0]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body['success'] is True and 'Dune' in body['message']
+
+    response = client.post('/api/borrow', json={'patron_id': '654321', 'book_id': books[0]})
+    assert response.status_code == 400
+    assert 'not available' in response.get_json()['message']
+
+
+def test_borrow_and_return_in_batches(client, books):
+    response = client.post('/api/borrow', json=[
+        {'patron_id': '123456', 'book_id': books[0]},
+        {'patron_id': '123456', 'book_id': books[1]},
+        {'patron_id': '123456', 'book_id': 'x'},
+    ])
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['succeeded'], body['failed']) == (2, 1)
+    assert body['results'][2] == {'success': False, 'message': 'Invalid book ID.'}
+
+    body = client.post('/api/return', json=[
+        {'patron_id': '123456', 'book_id': books[0]},
+        {'patron_id': '123456', 'book_id': books[1]},
+    ]).get_json()
+    assert body['succeeded'] == 2
+    assert [r['late_fee'] for r in body['results']] == [0.0, 0.0]
+
+
+def test_batches_are_bounded(client):
+    batch = [{'patron_id': '123456', 'book_id': 1}] * (api_routes.MAX_BATCH_SIZE + 1)
+    response = client.post('/api/borrow', json=batch)
+    assert response.status_code == 400
+    assert client.post('/api/return', data='nope').status_code == 400
+
+
+def test_payment_batches_are_capped_lower(client, gateway):
+    batch = [{'patron_id': '123456'}] * (api_routes.MAX_PAYMENT_BATCH_SIZE + 1)
+    response = client.post('/api/payments', json=batch)
+    assert response.status_code == 400
+    gateway.process_payment.assert_not_called()
+
+
+def test_out_of_range_ids_and_bad_keys_are_rejected(client, books, gateway):
+    response = client.post('/api/borrow', json={'patron_id': '123456', 'book_id': 2 ** 70})
+    assert response.status_code == 400
+    assert response.get_json() == {'success': False, 'message': 'Invalid book ID.'}
+
+    body = client.post('/api/payments', json=[
+        {'patron_id': '123456', 'idempotency_key': ['k1']},
+        {'patron_id': '123456', 'idempotency_key': ''},
+        {'patron_id': '123456', 'book_id': -2 ** 64},
+    ]).get_json()
+    assert [r['message'] for r in body['results']] == \
+        ['Invalid idempotency key.', 'Invalid idempotency key.', 'Invalid book ID.']
+    gateway.process_payment.assert_not_called()
+
+
+def test_patron_status_single_and_batch(client, books):
+    client.post('/api/borrow', json={'patron_id': '222222', 'book_id': books[0]})
+    report = client.get('/api/patrons/222222/status').get_json()
+    assert report['number_currently_borrowed'] == 1
+    assert client.get('/api/patrons/12/status').status_code == 400
+
+    body = client.post('/api/patrons/status', json=['222222', '654321']).get_json()
+    assert [r['number_currently_borrowed'] for r in body['results']] == [1, 0]
+    assert client.post('/api/patrons/status', json={'patron_id': '222222'}).status_code == 400
+
+
+def test_payments_charge_and_report_status(client, books, gateway):
+    now = datetime.now()
+    insert_borrow_record("123456", books[0], now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("654321", books[1], now - timedelta(days=20), now - timedelta(days=2))
+
+    response = client.post('/api/payments', json=[
+        {'patron_id': '123456', 'book_id': books[0]},
+        {'patron_id': '654321'},
+        {'patron_id': '111111'},
+    ])
+    body = response.get_json()
+    assert (body['succeeded'], body['failed']) == (2, 1)
+    assert [c.kwargs['amount'] for c in gateway.process_payment.call_args_list] == [3.0, 1.0]
+    assert body['results'][0]['transaction_id'] == 'txn_123'
+    assert body['results'][2]['message'] == 'No late fees to pay.'
+
+    status = client.get('/api/payments/txn_123').get_json()
+    assert status['source'] == 'ledger' and status['status'] == 'completed'
+
+
+def test_payment_key_reused_by_another_patron_is_a_conflict(client, books, gateway):
+    now = datetime.now()
+    insert_borrow_record("111111", books[0], now - timedelta(days=20), now - timedelta(days=6))
+    insert_borrow_record("222222", books[1], now - timedelta(days=20), now - timedelta(days=6))
+    first = client.post('/api/payments', json={'patron_id': '111111', 'idempotency_key': 'k1'})
+    assert first.get_json()['transaction_id'] == 'txn_123'
+
+    second = client.post('/api/payments', json={'patron_id': '222222', 'idempotency_key': 'k1'})
+    assert second.status_code == 400
+    assert second.get_json()['success'] is False and second.get_json()['transaction_id'] is None
+    gateway.process_payment.assert_called_once()
+
+
+def test_responses_are_compact_with_and_without_orjson(client, books, monkeypatch):
+    client.post('/api/borrow', json={'patron_id': '123456', 'book_id': books[0]})
+    fast = client.get('/api/patrons/123456/status')
+    monkeypatch.setattr(app_module, 'orjson', None)
+    plain = client.get('/api/patrons/123456/status')
+
+    assert fast.get_data() == plain.get_data()
+    assert b': ' not in plain.get_data() and b', ' not in plain.get_data()
+    assert fast.mimetype == 'application/json'
+
+
+def test_non_ascii_responses_match_the_standard_encoder(client, monkeypatch):
+    monkeypatch.setattr(response_cache, 'RENDER_CACHE_ENABLED', False)
+    insert_book("Café Society", "Zoë Heller", "9780000000017", 1, 1)
+    fast = client.get('/api/search?q=caf')
+    monkeypatch.setattr(app_module, 'orjson', None)
+    plain = client.get('/api/search?q=caf')
+
+    assert fast.get_data() == plain.get_data()
+    assert b'Caf\\u00e9' in fast.get_data()
+
+
+def test_bodies_orjson_cannot_encode_fall_back(client):
+    app = client.application
+    with app.test_request_context():
+        response = app.json.response({'book_id': 2 ** 70})
+    assert response.get_data() == b'{"book_id":1180591620717411303424}\n'
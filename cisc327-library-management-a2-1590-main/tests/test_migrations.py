@@ -0,0 +1,142 @@
+"""
+Tests for the schema migration runner and the borrow_records indexes
+EXPLAIN QUERY PLAN checks, run on the SQL the hot helpers actually execute,
+fail if a hot query falls back to a table scan
+"""
+
+import os
+import re
+from datetime import date, datetime, timedelta
+from unittest import mock
+import pytest
+import database
+from database import (
+    init_database, db_connection, get_schema_version, run_migrations, insert_book,
+    insert_borrow_record, close_pools
+)
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def _seed():
+    """One single-copy book out on loan (overdue) with a patron waiting, and a spare book."""
+    now = datetime.now()
+    insert_book("Held", "Author", "0000000000001", 1, 0)
+    insert_book("Spare", "Author", "0000000000002", 2, 2)
+    insert_borrow_record("123456", 1, now - timedelta(days=20), now - timedelta(days=6))
+    database.place_hold_atomic("654321", 1, now)
+
+
+def _price(due_dates):
+    return [1] * len(due_dates), [0.5] * len(due_dates), [True] * len(due_dates)
+
+
+# The real helpers behind every borrow_records/holds/loan_fees/patrons/payments hot path;
+# each is traced and every statement it runs against those tables is checked
+HOT_PATHS = {
+    'get_patron_borrowed_books': lambda: database.get_patron_borrowed_books("123456"),
+    'get_patron_borrow_count': lambda: database.get_patron_borrow_count("123456"),
+    'get_patron_loan_summary': lambda: database.get_patron_loan_summary("123456", 0),
+    'update_borrow_record_return_date':
+        lambda: database.update_borrow_record_return_date("123456", 1, datetime.now()),
+    'borrow_book_atomic':
+        lambda: database.borrow_book_atomic("123456", 2, datetime.now(), datetime.now(), 5),
+    'return_book_atomic': lambda: database.return_book_atomic("123456", 1, datetime.now()),
+    'place_hold_atomic': lambda: database.place_hold_atomic("111111", 1, datetime.now()),
+    'cancel_hold_atomic': lambda: database.cancel_hold_atomic("654321", 1, datetime.now()),
+    'expire_ready_holds': lambda: database.expire_ready_holds(datetime.now() + timedelta(days=30)),
+    'get_book_holds': lambda: database.get_book_holds(1),
+    'get_overdue_loans': lambda: database.get_overdue_loans(),
+    'sweep_loan_fees': lambda: (database.sweep_loan_fees(date.today() - timedelta(days=1), _price),
+                                database.sweep_loan_fees(date.today(), _price)),
+    'get_active_loan_fee':
+        lambda: database.get_active_loan_fee("123456", 1, database.epoch_day(date.today())),
+    'get_paid_loan_ids': lambda: database.get_paid_loan_ids([1, 2]),
+    'patron_summary': lambda: (
+        database.store_patron_summary("123456", 0, lambda active, history: ({}, 1)),
+        database.get_patron_summary("123456", 0),
+        database.get_stale_patron_summaries(1),
+    ),
+}
+
+HOT_TABLES = re.compile(r'\b(FROM|JOIN|UPDATE)\s+(borrow_records|holds|loan_fees|patrons|patron_summary|payment_allocations)\b',
+                        re.IGNORECASE)
+
+
+def _traced(fn):
+    """Run fn with every pooled connection tracing its SQL; returns the hot-table statements."""
+    statements = []
+    acquire = database.ConnectionPool.acquire
+
+    def traced_acquire(pool):
+        conn = acquire(pool)
+        conn.set_trace_callback(statements.append)
+        return conn
+
+    close_pools()
+    with mock.patch.object(database.ConnectionPool, 'acquire', traced_acquire):
+        fn()
+    close_pools()  # drop the traced connections
+    # Trigger programs re-report their outer statement; keep each statement once
+    return [sql for sql in dict.fromkeys(statements)
+            if sql.lstrip().split(None, 1)[0].upper() in ('SELECT', 'UPDATE', 'DELETE')
+            and HOT_TABLES.search(sql)]
+
+
+def _plan(sql):
+    with db_connection() as conn:
+        return [row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql)]
+
+
+@pytest.mark.parametrize('name', sorted(HOT_PATHS))
+def test_hot_query_uses_index(name):
+    """Every statement a hot path runs must SEARCH an index, never SCAN a table or sort in a temp b-tree"""
+    _seed()
+    statements = _traced(HOT_PATHS[name])
+    assert statements, f'{name} ran no borrow_records/holds/loan_fees/patrons queries'
+    for sql in statements:
+        plan = _plan(sql)
+        assert not [d for d in plan if d.startswith('SCAN')], (sql, plan)
+        assert not [d for d in plan if 'TEMP B-TREE' in d], (sql, plan)
+        assert any('INDEX' in d or 'PRIMARY KEY' in d for d in plan), (sql, plan)
+
+
+def test_init_database_migrates_to_latest():
+    """A fresh database is stamped with the latest schema version"""
+    assert get_schema_version() == database.MIGRATIONS[-1][0]
+
+
+def test_run_migrations_is_idempotent():
+    """Running migrations again applies nothing and keeps the version"""
+    version = get_schema_version()
+    assert run_migrations() == version
+    init_database()
+    assert get_schema_version() == version
+
+
+def test_migrations_apply_in_order_from_zero():
+    """A legacy database at version 0 is upgraded step by step"""
+    with db_connection() as conn:
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' "
+                                    "AND name LIKE 'idx_%'").fetchall():
+            conn.execute(f'DROP INDEX {name}')
+        conn.execute('PRAGMA user_version = 0')
+        conn.commit()
+
+    assert run_migrations(target=0) == 0
+    assert run_migrations() == database.MIGRATIONS[-1][0]
+    with db_connection() as conn:
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert 'idx_borrow_records_patron_active' in names
+
+
+def test_migration_versions_strictly_increase():
+    """Migration numbers must be unique and ordered"""
+    numbers = [number for number, _, _ in database.MIGRATIONS]
+    assert numbers == sorted(set(numbers))
@@ -0,0 +1,84 @@
+"""
+Tests for the integer epoch-day columns (migration 6) and get_overdue_loans
+"""
+
+import os
+import pytest
+from datetime import date, datetime, timedelta
+import database
+from database import (
+    init_database, insert_book, insert_borrow_record, update_borrow_record_return_date,
+    db_connection, run_migrations, get_overdue_loans, epoch_day
+)
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def _loan(patron_id, due):
+    insert_borrow_record(patron_id, 1, due - timedelta(days=14), due)
+
+
+def test_day_columns_match_python_dates():
+    insert_book("Book", "Author", "1234567890123", 5, 5)
+    due = datetime(2024, 3, 15, 23, 59, 59, 999999)
+    _loan("123456", due)
+    update_borrow_record_return_date("123456", 1, datetime(2024, 3, 20, 0, 0, 1))
+    with db_connection() as conn:
+        row = conn.execute('SELECT borrow_day, due_day, return_day FROM borrow_records').fetchone()
+    assert tuple(row) == (epoch_day(date(2024, 3, 1)), epoch_day(due), epoch_day(date(2024, 3, 20)))
+    assert epoch_day(date(1970, 1, 2)) == 1
+
+
+def test_get_overdue_loans_range_and_order():
+    insert_book("Book", "Author", "1234567890123", 5, 5)
+    as_of = date(2024, 4, 1)
+    _loan("111111", datetime(2024, 3, 31, 18, 0))      # 1 day overdue
+    _loan("222222", datetime(2024, 3, 10, 9, 0))       # 22 days overdue
+    _loan("333333", datetime(2024, 4, 1, 9, 0))        # due today: not overdue
+    _loan("444444", datetime(2024, 3, 1, 9, 0))        # returned
+    update_borrow_record_return_date("444444", 1, datetime(2024, 3, 2))
+
+    loans = get_overdue_loans(as_of)
+    assert [(l['patron_id'], l['days_overdue']) for l in loans] == [("222222", 22), ("111111", 1)]
+    assert loans[0]['due_date'] == date(2024, 3, 10)
+    assert loans[0]['loan_id'] == 2
+
+
+def test_overdue_days_agree_with_fee_rule():
+    """days_overdue from SQL equals the days the R5 fee rule charges for"""
+    insert_book("Book", "Author", "1234567890123", 50, 50)
+    as_of = date(2024, 4, 1)
+    for d in range(1, 30):
+        _loan(f"{d:06d}", datetime(2024, 4, 1, 12, 0) - timedelta(days=d))
+    for loan in get_overdue_loans(as_of):
+        expected = svc.late_fee_for_due_date(loan['due_date'], as_of)['days_overdue']
+        assert loan['days_overdue'] == expected
+
+
+def test_malformed_due_dates_are_never_overdue():
+    insert_book("Book", "Author", "1234567890123", 5, 5)
+    with db_connection() as conn:
+        conn.execute("INSERT INTO borrow_records (patron_id, book_id, borrow_date, due_date) "
+                     "VALUES ('123456', 1, 'garbage', 'not a date')")
+        conn.commit()
+    assert get_overdue_loans(date(2030, 1, 1)) == []
+
+
+def test_migration_backfills_existing_rows():
+    """Rows written before migration 6 get day values as soon as it runs"""
+    insert_book("Book", "Author", "1234567890123", 5, 5)
+    _loan("123456", datetime(2024, 3, 10, 9, 0))
+    with db_connection() as conn:
+        conn.execute('DROP INDEX idx_borrow_records_open_due')
+        conn.execute('PRAGMA user_version = 5')
+        conn.commit()
+
+    assert run_migrations() == database.MIGRATIONS[-1][0]
+    assert [l['days_overdue'] for l in get_overdue_loans(date(2024, 3, 12))] == [2]
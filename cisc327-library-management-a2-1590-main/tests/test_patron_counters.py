@@ -0,0 +1,105 @@
+"""
+Tests for the per-patron loan counters (patrons table, migration 7)
+"""
+
+import os
+import pytest
+from datetime import datetime, timedelta
+import database
+from database import (
+    init_database, insert_book, insert_borrow_record, update_borrow_record_return_date,
+    get_patron_borrow_count, get_patron_loan_summary, db_connection, run_migrations,
+    check_patron_counters, rebuild_patron_counters
+)
+from services import library_service as svc
+from services import maintenance
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    insert_book("Book", "Author", "1234567890123", 10, 10)
+    yield
+
+
+def _counters(patron_id):
+    with db_connection() as conn:
+        row = conn.execute('SELECT active_loans, lifetime_loans FROM patrons WHERE patron_id = ?',
+                           (patron_id,)).fetchone()
+    return tuple(row) if row else None
+
+
+def test_borrow_and_return_move_counters_in_same_transaction():
+    insert_book("Other", "Author", "1234567890124", 1, 1)
+    assert svc.borrow_book_by_patron("123456", 1)[0] is True
+    assert svc.borrow_book_by_patron("123456", 2)[0] is True
+    assert _counters("123456") == (2, 2)
+
+    assert svc.return_book_by_patron("123456", 1)[0] is True
+    assert _counters("123456") == (1, 2)
+    assert get_patron_borrow_count("123456") == 1
+    assert get_patron_loan_summary("123456")[1] == 2
+    assert check_patron_counters() == []
+
+
+def test_failed_borrow_rolls_counters_back():
+    """A borrow rejected for the limit leaves the counters untouched"""
+    for _ in range(svc.MAX_BORROWED_BOOKS + 1):
+        svc.borrow_book_by_patron("123456", 1)
+    before = _counters("123456")
+    assert svc.borrow_book_by_patron("123456", 1)[0] is False
+    assert _counters("123456") == before
+
+
+def test_legacy_helpers_and_deletes_keep_counters_consistent():
+    now = datetime.now()
+    insert_borrow_record("111111", 1, now, now + timedelta(days=14))
+    insert_borrow_record("111111", 1, now, now + timedelta(days=14))
+    update_borrow_record_return_date("111111", 1, now)
+    assert _counters("111111") == (0, 2)
+
+    with db_connection() as conn:
+        conn.execute("UPDATE borrow_records SET patron_id = '222222', return_date = NULL WHERE id = 1")
+        conn.execute("DELETE FROM borrow_records WHERE id = 2")
+        conn.commit()
+    assert _counters("111111") == (0, 0)
+    assert _counters("222222") == (1, 1)
+    assert check_patron_counters() == []
+
+
+def test_unknown_patron_counts_zero():
+    assert get_patron_borrow_count("999999") == 0
+    assert get_patron_loan_summary("999999") == ([], 0)
+
+
+def test_check_detects_drift_and_rebuild_repairs_it():
+    svc.borrow_book_by_patron("123456", 1)
+    with db_connection() as conn:
+        conn.execute("UPDATE patrons SET active_loans = 7 WHERE patron_id = '123456'")
+        conn.execute("INSERT INTO patrons VALUES ('555555', 1, 1)")
+        conn.commit()
+
+    mismatches = check_patron_counters()
+    assert [(m['patron_id'], m['stored_active'], m['actual_active']) for m in mismatches] == [
+        ("123456", 7, 1), ("555555", 1, 0)]
+    assert maintenance.main(['check']) == 1
+
+    assert rebuild_patron_counters() == 1
+    assert check_patron_counters() == []
+    assert maintenance.main(['check']) == 0
+
+
+def test_migration_backfills_counters_from_history():
+    now = datetime.now()
+    insert_borrow_record("123456", 1, now, now)
+    insert_borrow_record("123456", 1, now, now)
+    update_borrow_record_return_date("123456", 1, now)
+    with db_connection() as conn:
+        conn.execute('DROP TABLE patrons')
+        conn.execute('PRAGMA user_version = 6')
+        conn.commit()
+
+    assert run_migrations() == database.MIGRATIONS[-1][0]
+    assert _counters("123456") == (0, 2)
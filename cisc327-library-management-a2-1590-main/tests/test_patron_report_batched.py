@@ -0,0 +1,67 @@
+"""
+Tests for the batched get_patron_status_report path
+"""
+
+import os
+import pytest
+from datetime import date, timedelta
+from database import (
+    init_database, insert_book, insert_borrow_record, update_borrow_record_return_date,
+    get_patron_loan_summary
+)
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def _seed_patron(history=30):
+    today = date.today()
+    for i in range(1, 5):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 1, 1)
+    for i in range(history):
+        insert_borrow_record("123456", 4, today - timedelta(days=100 + i), today - timedelta(days=86 + i))
+        update_borrow_record_return_date("123456", 4, today - timedelta(days=80))
+    insert_borrow_record("123456", 1, today - timedelta(days=30), today - timedelta(days=16))
+    insert_borrow_record("123456", 2, today - timedelta(days=18), today - timedelta(days=4))
+    insert_borrow_record("123456", 3, today - timedelta(days=2), today + timedelta(days=12))
+
+
+def test_loan_summary_returns_active_loans_and_history():
+    """One call returns the active loans in borrow order and the history count"""
+    _seed_patron(history=10)
+    active, history = get_patron_loan_summary("123456")
+    assert [r['book_id'] for r in active] == [1, 2, 3]
+    assert history == 13
+    assert get_patron_loan_summary("999999") == ([], 0)
+
+
+def test_report_does_not_requery_per_loan(mocker):
+    """The report prices loans without calling the per-book fee lookup"""
+    _seed_patron()
+    per_book = mocker.patch('services.library_service.calculate_late_fee_for_book')
+    per_patron = mocker.patch('database.get_patron_borrowed_books')
+
+    report = svc.get_patron_status_report("123456")
+
+    per_book.assert_not_called()
+    per_patron.assert_not_called()
+    assert report['number_currently_borrowed'] == 3
+    assert report['borrowing_history_count'] == 33
+
+
+def test_report_fees_match_scalar_fee_function():
+    """Per-loan fees equal calculate_late_fee_for_book for every active loan"""
+    _seed_patron()
+    report = svc.get_patron_status_report("123456")
+    for item in report['currently_borrowed']:
+        expected = svc.calculate_late_fee_for_book("123456", item['book_id'])['fee_amount']
+        assert item['late_fee_accrued'] == expected
+    assert report['total_late_fees_owed'] == 12.5 + 2.0 + 0.0
+    assert report['currently_borrowed'][0]['due_date'] == \
+        (date.today() - timedelta(days=16)).isoformat() + "T00:00:00"
@@ -0,0 +1,123 @@
+"""
+Tests for the materialized patron status reports (patron_summary, migration 10)
+"""
+
+import json
+import os
+from datetime import date, datetime, timedelta
+import pytest
+from database import (
+    init_database, insert_book, insert_borrow_record, epoch_day, db_connection, read_connection
+)
+from services import fee_sweeper, maintenance
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database with three books."""
+    os.chdir(tmp_path)
+    init_database()
+    for i in range(1, 4):
+        insert_book(f"Book {i}", "Author", f"{i:013d}", 2, 2)
+
+
+def _summary(patron_id):
+    with read_connection() as conn:
+        row = conn.execute('SELECT report, as_of_day, stale_day FROM patron_summary WHERE patron_id = ?',
+                           (patron_id,)).fetchone()
+    return (json.loads(row['report']), row['as_of_day'], row['stale_day']) if row else None
+
+
+def test_report_is_stored_then_served_by_primary_key(mocker):
+    svc.borrow_book_by_patron("123456", 1)
+    expected = svc.build_patron_status_report("123456")
+    assert svc.get_patron_status_report("123456") == expected
+    assert _summary("123456")[0] == expected
+
+    rebuild = mocker.patch('services.library_service.store_patron_summary')
+    loans = mocker.patch('services.library_service.get_patron_loan_summary')
+    assert svc.get_patron_status_report("123456") == expected
+    rebuild.assert_not_called()
+    loans.assert_not_called()
+
+
+def test_borrow_and_return_drop_the_summary_for_the_next_read(mocker):
+    svc.borrow_book_by_patron("123456", 1)
+    svc.borrow_book_by_patron("123456", 2)
+    assert svc.get_patron_status_report("123456")['number_currently_borrowed'] == 2
+
+    store = mocker.patch('services.library_service.store_patron_summary',
+                         wraps=svc.store_patron_summary)
+    svc.return_book_by_patron("123456", 1)
+    store.assert_not_called()  # the return commits once; no second write for the summary
+    assert _summary("123456") is None
+
+    report = svc.get_patron_status_report("123456")
+    assert report['number_currently_borrowed'] == 1
+    assert report['borrowing_history_count'] == 2
+    assert _summary("123456")[0] == report
+
+
+def test_unknown_patrons_are_not_stored():
+    for patron_id in ("111111", "222222", "333333"):
+        report = svc.get_patron_status_report(patron_id)
+        assert report['number_currently_borrowed'] == 0 and report['borrowing_history_count'] == 0
+    with read_connection() as conn:
+        assert conn.execute('SELECT COUNT(*) FROM patron_summary').fetchone()[0] == 0
+
+
+def test_any_loan_write_drops_the_summary():
+    svc.borrow_book_by_patron("123456", 1)
+    now = datetime.now()
+    insert_borrow_record("123456", 2, now - timedelta(days=20), now - timedelta(days=6))
+    assert _summary("123456") is None
+
+    report = svc.get_patron_status_report("123456")
+    assert report['total_late_fees_owed'] == 3.0
+    assert _summary("123456")[0] == report
+
+
+def test_stale_day_is_the_first_day_a_fee_changes():
+    now = datetime.now()
+    today = epoch_day(date.today())
+    insert_borrow_record("111111", 1, now, now + timedelta(days=5))
+    svc.get_patron_status_report("111111")
+    assert _summary("111111")[2] == today + 6
+
+    insert_borrow_record("111111", 2, now - timedelta(days=20), now - timedelta(days=3))
+    svc.get_patron_status_report("111111")
+    assert _summary("111111")[2] == today + 1
+
+    insert_borrow_record("222222", 3, now - timedelta(days=60), now - timedelta(days=40))
+    svc.get_patron_status_report("222222")
+    assert _summary("222222")[2] is None
+
+
+def test_fee_sweep_rebuilds_only_stale_summaries():
+    now = datetime.now()
+    insert_borrow_record("111111", 1, now - timedelta(days=20), now - timedelta(days=3))
+    insert_borrow_record("222222", 2, now - timedelta(days=60), now - timedelta(days=40))
+    svc.get_patron_status_report("111111")
+    svc.get_patron_status_report("222222")
+
+    assert fee_sweeper.run_sweep()['summaries_refreshed'] == 0
+    report = fee_sweeper.run_sweep(as_of=date.today() + timedelta(days=1))
+    assert report['summaries_refreshed'] == 1
+
+
+def test_maintenance_detects_and_repairs_summary_drift():
+    svc.borrow_book_by_patron("123456", 1)
+    svc.get_patron_status_report("123456")
+    assert maintenance.check()['patron_summary']['ok']
+
+    with db_connection() as conn:
+        conn.execute("UPDATE patron_summary SET report = json_set(report, '$.total_late_fees_owed', 99.0)")
+        conn.commit()
+    drift = maintenance.check()['patron_summary']
+    assert [m['patron_id'] for m in drift['mismatches']] == ["123456"]
+    assert maintenance.main(['check']) == 1
+
+    assert maintenance.rebuild()['patron_summary'] == {'patrons': 1}
+    assert maintenance.main(['check']) == 0
+    assert svc.get_patron_status_report("123456")['total_late_fees_owed'] == 0.0
@@ -0,0 +1,135 @@
+"""
+Tests for pay_all_late_fees() and refund_allocated_late_fee()
+The payment gateway is mocked; loans come from a real temporary database
+"""
+
+import os
+import pytest
+from datetime import date, timedelta
+from unittest.mock import Mock
+from database import (
+    init_database, insert_book, insert_borrow_record, get_payment_allocations, db_connection
+)
+from services.library_service import pay_all_late_fees, pay_late_fees, refund_allocated_late_fee
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def _loan(book_id, days_overdue, patron_id="123456"):
+    insert_book(f"Book {book_id}", "Author", f"{book_id:013d}", 1, 0)
+    insert_borrow_record(patron_id, book_id, date.today() - timedelta(days=14 + days_overdue),
+                         date.today() - timedelta(days=days_overdue))
+
+
+def test_pay_all_charges_once_for_every_overdue_book():
+    """Three overdue books and one on-time book settle in a single gateway call"""
+    _loan(1, 3)     # $1.50
+    _loan(2, 10)    # $6.50
+    _loan(3, 40)    # $15.00
+    _loan(4, -2)    # not overdue
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123456_1", "Payment of $23.00 processed successfully")
+
+    success, message, txn_id = pay_all_late_fees("123456", gateway)
+
+    assert success is True and txn_id == "txn_123456_1"
+    gateway.process_payment.assert_called_once_with(
+        patron_id="123456", amount=23.0, description="Late fees for 3 books"
+    )
+    allocations = get_payment_allocations("txn_123456_1")
+    assert [(a['book_id'], a['amount']) for a in allocations] == [(3, 15.0), (2, 6.5), (1, 1.5)]
+    assert all(a['patron_id'] == "123456" for a in allocations)
+
+
+def test_pay_all_single_book_uses_title_in_description():
+    _loan(1, 5)
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_1", "ok")
+    pay_all_late_fees("123456", gateway)
+    gateway.process_payment.assert_called_once_with(
+        patron_id="123456", amount=2.5, description="Late fees for 'Book 1'"
+    )
+
+
+def test_pay_all_nothing_owed_does_not_call_gateway():
+    _loan(1, -3)
+    gateway = Mock(spec=PaymentGateway)
+    success, message, txn_id = pay_all_late_fees("123456", gateway)
+    assert success is False and "No late fees" in message and txn_id is None
+    gateway.process_payment.assert_not_called()
+
+
+def test_pay_all_invalid_patron_and_gateway_failures():
+    gateway = Mock(spec=PaymentGateway)
+    assert pay_all_late_fees("12ab56", gateway)[0] is False
+    gateway.process_payment.assert_not_called()
+
+    _loan(1, 5)
+    gateway.process_payment.return_value = (False, "", "Card declined")
+    success, message, txn_id = pay_all_late_fees("123456", gateway)
+    assert success is False and "Card declined" in message
+
+    gateway.process_payment.side_effect = ConnectionError("timeout")
+    success, message, _ = pay_all_late_fees("123456", gateway)
+    assert success is False and "Payment processing error" in message
+    assert get_payment_allocations("txn_1") == []
+
+
+def test_refund_allocated_late_fee_refunds_only_that_books_share():
+    _loan(1, 3)
+    _loan(2, 10)
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_123456_9", "ok")
+    pay_all_late_fees("123456", gateway)
+
+    gateway.refund_payment.return_value = (True, "Refund of $6.50 processed successfully")
+    success, message = refund_allocated_late_fee("txn_123456_9", 2, gateway)
+    assert success is True
+    gateway.refund_payment.assert_called_once_with("txn_123456_9", 6.5)
+
+    success, message = refund_allocated_late_fee("txn_123456_9", 99, gateway)
+    assert success is False and "No payment allocation" in message
+
+
+def _ledger_links():
+    with db_connection() as conn:
+        return [tuple(row) for row in conn.execute(
+            'SELECT kind, borrow_record_id, transaction_id FROM payments ORDER BY id')]
+
+
+def test_pay_all_skips_loans_already_paid_one_by_one():
+    """A fee paid through pay_late_fees is not charged again by pay_all_late_fees"""
+    _loan(1, 10)    # $6.50, paid on its own first
+    _loan(2, 3)     # $1.50
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.side_effect = [(True, "txn_single", "ok"), (True, "txn_rest", "ok")]
+
+    assert pay_late_fees("123456", 1, gateway)[0] is True
+    success, message, txn_id = pay_all_late_fees("123456", gateway)
+
+    assert success is True and txn_id == "txn_rest"
+    assert gateway.process_payment.call_args.kwargs['amount'] == 1.5
+    assert [a['book_id'] for a in get_payment_allocations("txn_rest")] == [2]
+    assert pay_all_late_fees("123456", gateway)[2] == "txn_rest"
+    assert gateway.process_payment.call_count == 2
+    assert _ledger_links() == [('charge', 1, 'txn_single'), ('charge', 2, 'txn_rest')]
+
+
+def test_allocated_refunds_link_to_their_loan():
+    _loan(1, 3)
+    _loan(2, 10)
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, "txn_batch", "ok")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    pay_all_late_fees("123456", gateway)
+
+    assert pay_all_late_fees("123456", gateway)[2] == "txn_batch"
+    assert refund_allocated_late_fee("txn_batch", 2, gateway)[0] is True
+    assert _ledger_links() == [('charge', None, 'txn_batch'), ('refund', 2, None)]
@@ -0,0 +1,178 @@
+"""
+Tests for the idempotent payments ledger
+Retries and status checks must be answered locally instead of re-calling the gateway
+"""
+
+import os
+import threading
+import pytest
+from datetime import date, timedelta
+from unittest.mock import Mock
+from database import (
+    init_database, insert_book, insert_borrow_record, db_connection, begin_payment,
+    get_payment_by_transaction, get_refunded_total
+)
+from services.library_service import (
+    pay_late_fees, pay_all_late_fees, refund_late_fee_payment, refund_allocated_late_fee,
+    get_payment_status
+)
+from services.payment_service import PaymentGateway
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+@pytest.fixture
+def overdue_loan():
+    """Book 1 is 10 days overdue for patron 123456 ($6.50)"""
+    insert_book("Clean Code", "Martin", "1234567890123", 1, 0)
+    insert_borrow_record("123456", 1, date.today() - timedelta(days=24), date.today() - timedelta(days=10))
+
+
+def _gateway(txn="txn_123456_1"):
+    gateway = Mock(spec=PaymentGateway)
+    gateway.process_payment.return_value = (True, txn, "Payment of $6.50 processed successfully")
+    gateway.refund_payment.return_value = (True, "Refund processed")
+    return gateway
+
+
+def test_retry_after_success_is_answered_from_ledger(overdue_loan):
+    gateway = _gateway()
+    first = pay_late_fees("123456", 1, gateway)
+    second = pay_late_fees("123456", 1, gateway)
+
+    assert first == second
+    assert first[0] is True and first[2] == "txn_123456_1"
+    gateway.process_payment.assert_called_once()
+
+    entry = get_payment_by_transaction("txn_123456_1")
+    assert entry['kind'] == 'charge' and entry['amount'] == 6.5 and entry['book_id'] == 1
+
+
+def test_failed_or_errored_attempt_can_be_retried(overdue_loan):
+    gateway = _gateway()
+    gateway.process_payment.side_effect = [TimeoutError("gateway timeout"),
+                                           (False, "", "Card declined"),
+                                           (True, "txn_ok", "Payment processed")]
+    assert "Payment processing error" in pay_late_fees("123456", 1, gateway)[1]
+    assert "Card declined" in pay_late_fees("123456", 1, gateway)[1]
+    assert pay_late_fees("123456", 1, gateway) == (True, "Payment successful! Payment processed", "txn_ok")
+    assert gateway.process_payment.call_count == 3
+
+    with db_connection() as conn:
+        rows = conn.execute("SELECT status FROM payments").fetchall()
+    assert [r['status'] for r in rows] == ['completed']
+
+
+def test_in_flight_payment_is_not_charged_twice(overdue_loan):
+    gateway = _gateway()
+    begin_payment("key-1", "charge", 6.5, patron_id="123456", book_id=1)
+    success, message, txn = pay_late_fees("123456", 1, gateway, idempotency_key="key-1")
+    assert success is False and "already in progress" in message
+    gateway.process_payment.assert_not_called()
+
+
+def test_explicit_idempotency_keys_distinguish_payments(overdue_loan):
+    gateway = _gateway()
+    pay_late_fees("123456", 1, gateway, idempotency_key="a")
+    pay_late_fees("123456", 1, gateway, idempotency_key="b")
+    assert gateway.process_payment.call_count == 2
+
+
+def test_key_reused_for_a_different_payment_is_refused(overdue_loan):
+    insert_borrow_record("222222", 1, date.today() - timedelta(days=24), date.today() - timedelta(days=10))
+    gateway = _gateway()
+    assert pay_late_fees("123456", 1, gateway, idempotency_key="k1")[0] is True
+
+    success, message, txn = pay_late_fees("222222", 1, gateway, idempotency_key="k1")
+    assert success is False and txn is None and "different payment" in message
+    gateway.process_payment.assert_called_once()
+    assert get_payment_by_transaction("txn_123456_1")['patron_id'] == "123456"
+
+
+def test_refunds_are_idempotent_and_capped_by_charge(overdue_loan):
+    gateway = _gateway()
+    pay_late_fees("123456", 1, gateway)
+
+    assert refund_late_fee_payment("txn_123456_1", 4.0, gateway) == (True, "Refund processed")
+    assert refund_late_fee_payment("txn_123456_1", 4.0, gateway) == (True, "Refund processed")
+    gateway.refund_payment.assert_called_once_with("txn_123456_1", 4.0)
+    assert get_refunded_total("txn_123456_1") == 4.0
+
+    success, message = refund_late_fee_payment("txn_123456_1", 3.0, gateway)
+    assert success is False and "exceeds amount paid" in message
+    assert refund_late_fee_payment("txn_123456_1", 2.5, gateway)[0] is True
+    assert gateway.refund_payment.call_count == 2
+
+
+def test_concurrent_refunds_cannot_exceed_charge(overdue_loan):
+    """The cap is checked inside the claiming transaction, so racing refunds cannot both pass it"""
+    gateway = _gateway()
+    pay_late_fees("123456", 1, gateway)
+    start = threading.Barrier(4)
+    results = []
+
+    def refund(key):
+        start.wait()
+        results.append(refund_late_fee_payment("txn_123456_1", 4.0, gateway, idempotency_key=key))
+
+    threads = [threading.Thread(target=refund, args=(f"refund-{i}",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert [r[0] for r in results].count(True) == 1
+    assert gateway.refund_payment.call_count == 1
+    assert get_refunded_total("txn_123456_1") == 4.0
+
+
+def test_refund_of_unknown_transaction_still_goes_to_gateway():
+    gateway = _gateway()
+    assert refund_late_fee_payment("txn_external", 5.0, gateway)[0] is True
+    gateway.refund_payment.assert_called_once()
+
+
+def test_allocated_refunds_link_to_batch_charge():
+    for book_id, days in ((1, 10), (2, 3)):
+        insert_book(f"Book {book_id}", "Author", f"{book_id:013d}", 1, 0)
+        insert_borrow_record("123456", book_id, date.today() - timedelta(days=14 + days),
+                             date.today() - timedelta(days=days))
+    gateway = _gateway("txn_batch")
+    pay_all_late_fees("123456", gateway)
+    assert pay_all_late_fees("123456", gateway)[2] == "txn_batch"
+    gateway.process_payment.assert_called_once()
+
+    assert refund_allocated_late_fee("txn_batch", 1, gateway)[0] is True
+    assert refund_allocated_late_fee("txn_batch", 2, gateway)[0] is True
+    assert refund_allocated_late_fee("txn_batch", 2, gateway)[0] is True
+    assert gateway.refund_payment.call_count == 2
+    assert get_refunded_total("txn_batch") == 8.0
+
+
+def test_status_check_answered_locally(overdue_loan):
+    gateway = _gateway()
+    pay_late_fees("123456", 1, gateway)
+    refund_late_fee_payment("txn_123456_1", 1.5, gateway)
+
+    status = get_payment_status("txn_123456_1", gateway)
+    assert status['status'] == 'completed' and status['source'] == 'ledger'
+    assert status['amount'] == 6.5 and status['refunded_amount'] == 1.5
+    gateway.verify_payment_status.assert_not_called()
+
+    gateway.verify_payment_status.return_value = {"status": "completed", "transaction_id": "txn_other"}
+    assert get_payment_status("txn_other", gateway)['transaction_id'] == "txn_other"
+    gateway.verify_payment_status.assert_called_once_with("txn_other")
+
+
+def test_transaction_lookup_uses_index():
+    with db_connection() as conn:
+        plan = [r['detail'] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM payments WHERE transaction_id = ? "
+            "AND kind = 'charge' AND status = 'completed'", ("txn_1",))]
+    assert any('idx_payments_txn' in d for d in plan), plan
@@ -0,0 +1,77 @@
+"""
+Tests for the compact Book/Loan records returned by the database helpers (models.py)
+"""
+
+import os
+import pytest
+from datetime import datetime, timedelta
+from flask import render_template_string
+from app import create_app
+from database import (
+    init_database, insert_book, insert_borrow_record, get_all_books, get_book_by_id,
+    get_patron_borrowed_books, search_books
+)
+from models import Book, Loan
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def test_book_is_slotted_and_dict_compatible():
+    insert_book("Dune", "Frank Herbert", "9780441172719", 3, 2)
+    book = get_all_books()[0]
+
+    assert isinstance(book, Book)
+    assert not hasattr(book, '__dict__')
+    assert book.title == book['title'] == book.get('title') == "Dune"
+    assert book.get('missing', 'x') == 'x'
+    assert dict(book) == book == {'id': 1, 'title': "Dune", 'author': "Frank Herbert",
+                                  'isbn': "9780441172719", 'total_copies': 3, 'available_copies': 2}
+    assert 'isbn' in book and 'due_date' not in book
+    with pytest.raises(KeyError):
+        book['missing']
+    with pytest.raises(AttributeError):
+        book.title = "Other"
+
+
+def test_every_book_helper_returns_records():
+    insert_book("Dune", "Frank Herbert", "9780441172719", 3, 2)
+    assert isinstance(get_book_by_id(1), Book)
+    assert all(isinstance(b, Book) for b in search_books('title', 'dun'))
+    assert all(isinstance(b, Book) for b in search_books('author', 'He'))
+
+
+def test_loan_parses_dates_lazily_against_one_now():
+    now = datetime(2024, 3, 20, 12, 0)
+    loan = Loan(1, "Dune", "Frank Herbert", "2024-03-01T10:00:00", "2024-03-15T10:00:00", now)
+    assert loan._due is None
+    assert loan.is_overdue is True
+    assert loan.due_date == datetime(2024, 3, 15, 10, 0)
+    assert loan.due_date is loan['due_date']
+    assert loan._borrow is None
+    assert loan['borrow_date'] == datetime(2024, 3, 1, 10, 0)
+
+
+def test_patron_loans_share_one_now_snapshot():
+    insert_book("Dune", "Frank Herbert", "9780441172719", 3, 3)
+    for days in (-3, 5):
+        insert_borrow_record("123456", 1, datetime.now() - timedelta(days=10),
+                             datetime.now() + timedelta(days=days))
+    loans = get_patron_borrowed_books("123456")
+    assert len({id(loan._now) for loan in loans}) == 1
+    assert [loan['is_overdue'] for loan in loans] == [True, False]
+    assert set(loans[0]) == {'book_id', 'title', 'author', 'borrow_date', 'due_date', 'is_overdue'}
+
+
+def test_records_render_and_serialize_like_dicts():
+    app = create_app()
+    insert_book("Dune", "Frank Herbert", "9780441172719", 3, 2)
+    book = search_books('isbn', "9780441172719")[0]
+    with app.app_context():
+        assert render_template_string("{{ b.title }}/{{ b['isbn'] }}", b=book) == "Dune/9780441172719"
+        assert app.json.loads(app.json.dumps([book])) == [dict(book)]
@@ -0,0 +1,128 @@
+"""
+Tests for catalog version ETags and the rendered-response cache (routes/response_cache.py)
+"""
+
+import os
+import types
+import pytest
+from app import create_app
+from database import (
+    init_database, insert_book, update_book_availability, get_catalog_version, get_catalog_version_key,
+    db_connection
+)
+from routes import response_cache
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def clock(monkeypatch):
+    """Freeze the clock the render cache's TTL windows are cut from."""
+    now = types.SimpleNamespace(value=1_000_000.0)
+    monkeypatch.setattr(response_cache, 'time', types.SimpleNamespace(time=lambda: now.value))
+    return now
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database and an empty render cache for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    response_cache.configure_render_cache(enabled=True, max_size=response_cache.RENDER_CACHE_SIZE)
+    yield
+    response_cache.configure_render_cache(enabled=True, max_size=response_cache.RENDER_CACHE_SIZE)
+
+
+@pytest.fixture
+def client():
+    app = create_app()
+    app.config['TESTING'] = True
+    return app.test_client()
+
+
+def test_catalog_writes_bump_version():
+    start = get_catalog_version()
+    insert_book("Dune", "Frank Herbert", "9780441172719", 2, 2)
+    update_book_availability(1, -1)
+    svc.borrow_book_by_patron("123456", 1)
+    svc.return_book_by_patron("123456", 1)
+    assert get_catalog_version() == start + 4
+    assert not insert_book("Dupe", "Author", "9780441172719", 1, 1)
+    assert get_catalog_version() == start + 4
+
+
+def test_version_key_is_per_database_file(tmp_path):
+    key = get_catalog_version_key()
+    other = tmp_path / "other"
+    other.mkdir()
+    os.chdir(other)
+    assert get_catalog_version_key() != key
+
+
+def test_repeat_requests_served_from_cache(client, mocker):
+    search = mocker.patch('routes.api_routes.search_books_in_catalog',
+                          wraps=svc.search_books_in_catalog)
+    first = client.get('/api/search?q=gatsby')
+    second = client.get('/api/search?q=gatsby')
+
+    assert search.call_count == 1
+    assert first.get_data() == second.get_data()
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert second.headers['Cache-Control'] == 'no-cache'
+    assert response_cache.get_render_cache_stats()['hits'] == 1
+
+    client.get('/api/search?q=mockingbird')
+    assert search.call_count == 2
+
+
+def test_if_none_match_returns_304_until_catalog_changes(client):
+    etag = client.get('/catalog').headers['ETag']
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.get_data() == b''
+
+    insert_book("Dune", "Frank Herbert", "9780441172719", 2, 2)
+    response = client.get('/catalog', headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert b"Dune" in response.get_data()
+
+
+def test_availability_change_refreshes_cached_page(client):
+    assert "3/3 Available" in client.get('/search?q=gatsby&type=title').get_data(as_text=True)
+    update_book_availability(1, -3)
+    assert "Not Available" in client.get('/search?q=gatsby&type=title').get_data(as_text=True)
+
+
+def test_pending_flash_bypasses_cache(client):
+    client.get('/catalog')
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Flashed once')]
+    assert "Flashed once" in client.get('/catalog').get_data(as_text=True)
+    assert "Flashed once" not in client.get('/catalog').get_data(as_text=True)
+
+
+def test_cache_is_bounded_and_can_be_disabled(client, mocker):
+    response_cache.configure_render_cache(max_size=2)
+    for q in ("a", "b", "c"):
+        client.get(f'/api/search?q={q}')
+    assert response_cache.get_render_cache_stats()['size'] == 2
+
+    response_cache.configure_render_cache(enabled=False)
+    search = mocker.patch('routes.api_routes.search_books_in_catalog', return_value=[])
+    client.get('/api/search?q=x')
+    client.get('/api/search?q=x')
+    assert search.call_count == 2
+    assert 'ETag' not in client.get('/api/search?q=x').headers
+
+
+def test_writes_from_other_processes_show_up_within_the_ttl(client, clock):
+    """A write this process never saw (e.g. a CLI import) is served once the TTL window passes"""
+    etag = client.get('/catalog').headers['ETag']
+    with db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'Renamed Elsewhere' WHERE id = 1")
+        conn.commit()
+    assert b"Renamed Elsewhere" not in client.get('/catalog').get_data()
+
+    clock.value += response_cache.RENDER_CACHE_TTL
+    assert client.get('/catalog', headers={'If-None-Match': etag}).status_code == 200
+    assert b"Renamed Elsewhere" in client.get('/catalog').get_data()
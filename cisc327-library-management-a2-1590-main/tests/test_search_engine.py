@@ -0,0 +1,118 @@
+"""
+Tests for the SQL-side search backend (books_fts trigram index + ISBN index)
+"""
+
+import os
+import random
+import pytest
+import database
+from database import init_database, insert_book, db_connection, search_books
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def _legacy_search(books, term, field):
+    """The original in-Python filter, kept as the reference semantics"""
+    q = term.lower().strip()
+    return [b for b in books if q in (b.get(field) or "").lower()]
+
+
+def test_fts_index_created_by_migration():
+    """Migration 2 creates the FTS table and its sync triggers"""
+    with db_connection() as conn:
+        names = {r[0] for r in conn.execute("SELECT name FROM sqlite_master")}
+    assert {'books_fts', 'books_fts_insert', 'books_fts_delete', 'books_fts_update'} <= names
+
+
+def test_triggers_keep_index_in_sync():
+    """Inserts, title edits and deletes are reflected in search results"""
+    insert_book("The Pragmatic Programmer", "Hunt", "1234567890123", 1, 1)
+    assert len(search_books("title", "pragmatic")) == 1
+
+    with db_connection() as conn:
+        conn.execute("UPDATE books SET title = 'Refactoring' WHERE id = 1")
+        conn.commit()
+    assert search_books("title", "pragmatic") == []
+    assert search_books("title", "factor")[0]['id'] == 1
+
+    with db_connection() as conn:
+        conn.execute("DELETE FROM books WHERE id = 1")
+        conn.commit()
+    assert search_books("title", "factor") == []
+
+
+def test_availability_update_does_not_touch_index():
+    """Borrow/return updates only change available_copies and keep the book searchable"""
+    insert_book("Clean Code", "Martin", "1234567890123", 2, 2)
+    svc.borrow_book_by_patron("123456", 1)
+    res = svc.search_books_in_catalog("clean", "title")
+    assert len(res) == 1 and res[0]['available_copies'] == 1
+
+
+def test_short_terms_and_special_characters():
+    """Terms under 3 chars and terms with quotes or LIKE wildcards still match literally"""
+    insert_book('He said "Hi"', "O'Brien", "1234567890123", 1, 1)
+    insert_book("100% Pure_Fun", "Al", "1234567890124", 1, 1)
+
+    assert [b['id'] for b in svc.search_books_in_catalog('"hi"', "title")] == [1]
+    assert [b['id'] for b in svc.search_books_in_catalog("o'b", "author")] == [1]
+    assert [b['id'] for b in svc.search_books_in_catalog("0%", "title")] == [2]
+    assert [b['id'] for b in svc.search_books_in_catalog("e_", "title")] == [2]
+    assert [b['id'] for b in svc.search_books_in_catalog("al", "author")] == [2]
+
+
+def test_short_terms_fold_non_ascii_case():
+    """Short terms match case-insensitively beyond ASCII, like the old str.lower filter"""
+    insert_book("Ça ira", "Émile Zola", "1234567890123", 1, 1)
+    assert [b['id'] for b in svc.search_books_in_catalog("ça", "title")] == [1]
+    assert [b['id'] for b in svc.search_books_in_catalog("éM", "author")] == [1]
+
+
+def test_fts_lookup_is_cached_per_pool():
+    """The sqlite_master probe runs once per pool, not on every search"""
+    insert_book("Clean Code", "Martin", "1234567890123", 1, 1)
+    search_books("title", "clean")
+    pool = database.get_pool(readonly=True)
+    assert pool.has_books_fts is True
+
+    trace = []
+    with database.read_connection() as conn:
+        conn.set_trace_callback(trace.append)
+    search_books("title", "clean")
+    search_books("title", "cl")
+    with database.read_connection() as conn:
+        conn.set_trace_callback(None)
+    assert trace and not [sql for sql in trace if 'sqlite_master' in sql]
+
+
+def test_isbn_lookup_uses_unique_index():
+    """ISBN search is an index SEARCH, not a table scan"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    assert search_books("isbn", "1234567890123")[0]['title'] == "Book"
+    with db_connection() as conn:
+        plan = [r['detail'] for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM books WHERE isbn = ?", ("1234567890123",))]
+    assert any('USING INDEX' in d for d in plan), plan
+
+
+def test_matches_legacy_filter_semantics():
+    """FTS results equal the old in-Python filter, in the same title order"""
+    rng = random.Random(327)
+    words = ["Great", "gatsby", "Code", "clean", "Pro", "gram", "mer", "The", "art", "ART"]
+    for i in range(200):
+        title = " ".join(rng.choice(words) for _ in range(3))
+        author = " ".join(rng.choice(words) for _ in range(2))
+        insert_book(title, author, f"{i:013d}", 1, 1)
+
+    with db_connection() as conn:
+        books = [dict(b) for b in conn.execute("SELECT * FROM books ORDER BY title, id")]
+    for term in ["great", "e c", "ART", "gram mer", "pro", "x", "a", "de cl"]:
+        for field in ("title", "author"):
+            assert svc.search_books_in_catalog(term, field) == _legacy_search(books, term, field), (term, field)
@@ -0,0 +1,107 @@
+"""
+Tests for the single-transaction borrow and return paths
+"""
+
+import os
+import pytest
+import sqlite3
+from datetime import datetime, date, timedelta
+from database import (
+    init_database, insert_book, insert_borrow_record, get_book_by_id,
+    get_patron_borrow_count, transaction, borrow_book_atomic, return_book_atomic
+)
+from services import library_service as svc
+
+
+@pytest.fixture(autouse=True)
+def fresh_db(tmp_path):
+    """Create a fresh database for each test."""
+    os.chdir(tmp_path)
+    init_database()
+    yield
+
+
+def test_transaction_commits_once_on_success():
+    """Writes inside the unit of work are visible after the block"""
+    with transaction() as conn:
+        assert conn.in_transaction
+        conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                     "VALUES ('X', 'Y', '1234567890123', 1, 1)")
+    assert get_book_by_id(1)['title'] == 'X'
+
+
+def test_transaction_rolls_back_on_error():
+    """An exception inside the unit of work discards every write"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    with pytest.raises(sqlite3.IntegrityError):
+        with transaction() as conn:
+            conn.execute("UPDATE books SET available_copies = 0 WHERE id = 1")
+            conn.execute("INSERT INTO books (title, author, isbn, total_copies, available_copies) "
+                         "VALUES ('Dup', 'Y', '1234567890123', 1, 1)")
+    assert get_book_by_id(1)['available_copies'] == 1
+
+
+def test_borrow_atomic_statuses():
+    """borrow_book_atomic reports why a borrow was refused"""
+    now = datetime.now()
+    due = now + timedelta(days=14)
+    assert borrow_book_atomic("123456", 1, now, due, 5) == ('not_found', None)
+
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    status, book = borrow_book_atomic("123456", 1, now, due, 5)
+    assert status == 'ok' and book['title'] == "Book"
+    assert get_book_by_id(1)['available_copies'] == 0
+    assert get_patron_borrow_count("123456") == 1
+
+    status, _ = borrow_book_atomic("654321", 1, now, due, 5)
+    assert status == 'unavailable'
+
+
+def test_borrow_atomic_limit_leaves_no_partial_write():
+    """A refused borrow must not insert a record or change availability"""
+    insert_book("Book", "Author", "1234567890123", 1, 1)
+    status, _ = borrow_book_atomic("123456", 1, datetime.now(), datetime.now(), 0)
+    assert status == 'ok'
+
+    insert_book("Other", "Author", "1234567890124", 1, 1)
+    status, _ = borrow_book_atomic("123456", 2, datetime.now(), datetime.now(), 0)
+    assert status == 'limit_reached'
+    assert get_book_by_id(2)['available_copies'] == 1
+    assert get_patron_borrow_count("123456") == 1
+
+
+def test_return_atomic_closes_loan_and_restores_copy():
+    """return_book_atomic closes the loan and returns the closed record"""
+    insert_book("Book", "Author", "1234567890123", 1, 0)
+    insert_borrow_record("123456", 1, date.today() - timedelta(days=20), date.today() - timedelta(days=6))
+
+    assert return_book_atomic("123456", 2, date.today()) == ('not_found', None)
+    assert return_book_atomic("654321", 1, date.today()) == ('not_borrowed', None)
+
+    status, loan = return_book_atomic("123456", 1, date.today())
+    assert status == 'ok'
+    assert loan['due_date'] == (date.today() - timedelta(days=6)).isoformat()
+    assert get_book_by_id(1)['available_copies'] == 1
+    assert get_patron_borrow_count("123456") == 0
+
+
+def test_service_borrow_then_return_round_trip():
+    """The service layer uses the atomic paths end to end"""
+    insert_book("Book", "Author", "1234567890123", 2, 2)
+    ok, msg = svc.borrow_book_by_patron("123456", 1)
+    assert ok and "Successfully borrowed" in msg
+    assert get_book_by_id(1)['available_copies'] == 1
+
+    ok, msg, fee = svc.return_book_by_patron("123456", 1)
+    assert ok and fee == 0.0
+    assert get_book_by_id(1)['available_copies'] == 2
+
+
+def test_late_fee_for_due_date_tiers():
+    """The shared fee rule matches the R5 tiers and cap"""
+    today = date(2024, 1, 31)
+    assert svc.late_fee_for_due_date(date(2024, 1, 31), today)['fee_amount'] == 0.0
+    assert svc.late_fee_for_due_date("2024-01-26T10:00:00", today)['fee_amount'] == 2.5
+    assert svc.late_fee_for_due_date(datetime(2024, 1, 21), today)['fee_amount'] == 6.5
+    assert svc.late_fee_for_due_date("2023-12-01", today)['fee_amount'] == 15.0
+    assert svc.late_fee_for_due_date("not a date", today)['status'].startswith("error")